@@ -14,7 +14,7 @@ class ModelManager:
         except requests.exceptions.ConnectionError:
             return False
 
-    def generate_response(self, model: str, messages: list, system_prompt: str = None, stream: bool = False, options: dict = None):
+    def generate_response(self, model: str, messages: list, system_prompt: str = None, stream: bool = False, options: dict = None, timeout=None):
         """
         Generate a response from the Ollama model.
         
@@ -22,8 +22,9 @@ class ModelManager:
             model (str): allowed models like 'gemma:latest', 'gemma:2b'
             messages (list): list of dicts {'role': 'user', 'content': '...'}
             system_prompt (str): Optional system prompt to prepend.
-            stream (bool): Whether to stream the response (not fully implemented in frontend yet).
+            stream (bool): Whether to stream the response (read it with iter_stream).
             options (dict): Ollama options (temperature, etc.)
+            timeout: requests timeout; with stream=True the read timeout applies between chunks.
         """
         
         payload_messages = []
@@ -45,7 +46,7 @@ class ModelManager:
             payload["options"] = options
 
         try:
-            response = requests.post(self.api_chat, json=payload, stream=stream)
+            response = requests.post(self.api_chat, json=payload, stream=stream, timeout=timeout)
             response.raise_for_status()
             
             if stream:
@@ -58,5 +59,11 @@ class ModelManager:
             print(f"Error communicating with Ollama: {e}")
             return {"error": str(e)}
 
+    def iter_stream(self, response):
+        """Yield the JSON chunks of a streamed /api/chat response as they arrive."""
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
 # Singleton instance
 model_manager = ModelManager()
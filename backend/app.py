@@ -1,5 +1,6 @@
-from flask import Flask, request, jsonify, send_from_directory, render_template
-from flask_socketio import SocketIO, emit, join_room, leave_room
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context
+from werkzeug.utils import safe_join
+from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
 from flask_cors import CORS
 import base64
 import smtplib
@@ -12,11 +13,28 @@ import shutil
 import random
 import urllib.request
 import urllib.error
-import requests
 import ssl
 import uuid
+import threading
 from typing import List, Dict
 import chat_handler
+from message_log import MessageLog, import_legacy
+from dm_store import DMStore, import_legacy as import_legacy_dms
+from user_store import UserRepository
+from blob_store import BlobStore
+from cloud_uploads import ChunkedUploads, MAX_CHUNK_BYTES, data_url_to_file, stream_to_file
+from zip_stream import iter_zip
+from thumbnails import Thumbnailer
+from media import send_media
+from static_assets import StaticAssets
+from icon_cache import IconCache
+from link_preview import PreviewCache
+from session_store import MemoryBackend, SQLiteBackend, SessionStore
+from session_tokens import KeyRing, RevocationList, SignedSessions
+from presence import PresenceRegistry
+from typing_indicators import TypingTracker
+import persistence
+from persistence import JsonStore
 
 
 # Initialize Flask app and SocketIO
@@ -32,97 +50,93 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     print(f"Client disconnected: {request.sid}")
-    # Find and remove user from online_users
-    username_to_remove = None
-    for uname, sid in online_users.items():
+    for (sid, _), cancelled in list(ai_streams.items()):
         if sid == request.sid:
-            username_to_remove = uname
-            break
-    if username_to_remove:
-        del online_users[username_to_remove]
-        
-        # Update last_active in persistent storage
-        try:
-            users = load_users()
-            for u in users:
-                if u['username'] == username_to_remove:
-                    u['last_active'] = int(__import__('time').time())
-                    break
-            save_users(users)
-        except Exception as e:
-            print(f"Error updating last_active: {e}")
-
-        # Broadcast offline status
-        socketio.emit('user_status_change', {
-            'username': username_to_remove, 
+            cancelled.set()
+    typer = presence.username_for(request.sid)
+    if typer:
+        for target in typing_tracker.stop_all(typer):
+            _emit_stop_typing(typer, target)
+    # Only the user's last open tab takes them offline
+    username = presence.disconnect(request.sid)
+    if username:
+        _emit_presence(username, {
+            'username': username,
             'status': 'offline',
-            'last_active': int(__import__('time').time())
+            'last_active': presence.last_active(username) or int(_time.time())
         })
 
 @socketio.on('update_status')
 def handle_update_status(data):
-    username = data.get('username')
-    status = data.get('status') # 'online', 'away'
+    # A socket can only report the status of the user it registered as
+    username = presence.username_for(request.sid)
+    status = (data or {}).get('status') # 'online', 'away'
     
-    if username and username in online_users:
-        socketio.emit('user_status_change', {
+    if username and status in ('online', 'away'):
+        _emit_presence(username, {
             'username': username,
             'status': status
         })
 
-# In-memory online users: { username: sid }
-online_users = {}
+def _save_last_active(pending):
+    users = []
+    for username, ts in pending.items():
+        u = user_repo.get(username)
+        if u:
+            u['last_active'] = ts
+            users.append(u)
+    if users:
+        user_repo.save(*users)
+
+# Online users by socket, with last_active written in batches (see presence.py)
+presence = PresenceRegistry(_save_last_active)
+presence.start()
+
+def _emit_presence(username, payload):
+    """Send a status change to the user's own tabs and to online friends and group peers."""
+    try:
+        u = user_repo.get(username)
+        audience = set((u or {}).get('friends') or []) | database.group_peers(username)
+    except Exception as e:
+        print(f"Presence audience lookup failed for {username}: {e}")
+        audience = set()
+    rooms = [f"user_{name}" for name in audience if presence.is_online(name)]
+    rooms.append(f"user_{username}")
+    socketio.emit('user_status_change', payload, to=rooms)
 
 # Session management: { token: { username, created_at, expires_at } }
-active_sessions = {}
+# Sessions live in `sessions` (created below, once DATA_DIR is known)
 SESSION_EXPIRY_HOURS = 24
+SESSION_BACKEND = os.getenv('Zylo_SESSION_BACKEND', 'sqlite').lower()
+# 'signed' for stateless HMAC tokens any worker process can validate (see session_tokens.py)
+SESSION_MODE = os.getenv('Zylo_SESSION_MODE', 'store').lower()
 
 import time as _time
 
 def create_session(username):
     """Create a new session token for a user."""
-    token = str(uuid.uuid4())
-    now = int(_time.time())
-    active_sessions[token] = {
-        "username": username,
-        "created_at": now,
-        "expires_at": now + (SESSION_EXPIRY_HOURS * 3600)
-    }
-    return token
+    return sessions.create(username)
 
 def validate_session(token):
     """Validate a session token. Returns username if valid, None otherwise."""
-    if not token or token not in active_sessions:
-        return None
-    session = active_sessions[token]
-    if int(_time.time()) > session["expires_at"]:
-        # Session expired, remove it
-        del active_sessions[token]
-        return None
-    return session["username"]
+    return sessions.validate(token)
 
 def invalidate_session(token):
     """Invalidate/logout a session."""
-    if token in active_sessions:
-        del active_sessions[token]
-        return True
-    return False
+    return sessions.invalidate(token)
 
 def cleanup_expired_sessions():
     """Remove all expired sessions."""
-    now = int(_time.time())
-    expired = [t for t, s in active_sessions.items() if now > s["expires_at"]]
-    for t in expired:
-        del active_sessions[t]
+    return sessions.sweep()
 
 @socketio.on('register_status')
 def on_register_status(data):
     username = (data or {}).get('username')
     if username:
-        online_users[username] = request.sid
         join_room(f"user_{username}")
-        socketio.emit('user_status_change', {'username': username, 'status': 'online'})
-        print(f"User {username} is now online")
+        if presence.connect(request.sid, username):
+            _emit_presence(username, {'username': username, 'status': 'online'})
+            print(f"User {username} is now online")
 
 @socketio.on('join')
 def on_join(data):
@@ -147,8 +161,13 @@ UPLOADS_DIR = os.path.join(BASE_DIR, 'uploads')
 USER_DATA_FILE = os.path.join(DATA_DIR, 'users.json')
 FRONTEND_DIR = os.path.join(BASE_DIR, '../frontend')
 MESSAGES_FILE = os.path.join(DATA_DIR, "messages.json")
+MESSAGES_LOG_DIR = os.path.join(DATA_DIR, "messages_log")
 DMS_FILE = os.path.join(DATA_DIR, "dms.json")
-GROUPS_FILE = os.path.join(DATA_DIR, 'groups.json')
+DMS_DIR = os.path.join(DATA_DIR, "dms")
+BLOBS_DIR = os.path.join(UPLOADS_DIR, "blobs")
+THUMBS_DIR = os.path.join(UPLOADS_DIR, ".thumbs")
+# Output of scripts/build_assets.py
+STATIC_BUILD_DIR = os.getenv('Zylo_STATIC_BUILD_DIR', os.path.join(BASE_DIR, 'static_build'))
 EXPLORE_FILE = os.path.join(DATA_DIR, 'explore.json')
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(UPLOADS_DIR, exist_ok=True)
@@ -245,88 +264,80 @@ def _migrate_storage_dirs():
 
 _migrate_storage_dirs()
 
+# Imported after the migration so a legacy groups.json is in place before it is imported
+import database
+
+# Whole-file JSON stores are written behind by a background thread
+persistence.writer.start()
+
 # Helper functions
+# Users are held in memory with username/email/usertag indexes (see user_store.py)
+user_repo = UserRepository(USER_DATA_FILE)
+
 def load_users():
-    if not os.path.exists(USER_DATA_FILE):
-        return []
-    with open(USER_DATA_FILE, "r") as file:
-        return json.load(file)
+    """The live user list; pass it back to save_users() after changing it."""
+    return user_repo.all()
 
 def save_users(users):
-    with open(USER_DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(users, f, indent=2)
+    user_repo.replace_all(users)
 
 def save_user(username, email, password):
-    users = load_users()
-    for user in users:
-        if user["username"] == username or user.get("email") == email:
-            return False  # Username already exists
-    users.append({"username": username, "email": email, "password": password})
-    
-    with open(USER_DATA_FILE, "w") as file:
-        json.dump(users, file, indent=2)
+    if user_repo.get(username) or user_repo.by_email(email):
+        return False  # Username already exists
+    user_repo.add({"username": username, "email": email, "password": password})
     return True
 
-def load_messages():
-    if not os.path.exists(MESSAGES_FILE):
-        return []
-    with open(MESSAGES_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+# Community messages are kept in an append-only segmented log (see message_log.py):
+# a new message, edit or delete is one fsync'd record instead of a full rewrite.
+message_log = MessageLog(MESSAGES_LOG_DIR)
 
-def save_messages(messages):
-    with open(MESSAGES_FILE, "w", encoding="utf-8") as f:
-        json.dump(messages, f, indent=2)
+def load_messages():
+    imported = import_legacy(message_log, MESSAGES_FILE)
+    if imported:
+        print(f"Migrated {imported} messages from messages.json to the message log")
+    return message_log.messages()
 
 # ---- Direct Messages (DMs) helpers ----
-def load_dms():
-    """Load direct messages from persistent storage."""
-    if not os.path.exists(DMS_FILE):
-        # Initialize empty file for first-time startup
-        with open(DMS_FILE, 'w', encoding='utf-8') as f:
-            json.dump([], f)
-        return []
-    try:
-        with open(DMS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return []
-
-def save_dms(dms_list):
-    """Persist direct messages to disk."""
-    with open(DMS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(dms_list, f, indent=2)
-
-# Group storage helpers
-def load_groups():
-    if not os.path.exists(GROUPS_FILE):
-        with open(GROUPS_FILE, 'w', encoding='utf-8') as f:
-            json.dump([], f)
-        return []
-    try:
-        with open(GROUPS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return []
+# DMs are sharded per conversation (see dm_store.py); a send appends to one shard.
+dm_store = DMStore(DMS_DIR)
+_imported_dms = import_legacy_dms(dm_store, DMS_FILE)
+if _imported_dms:
+    print(f"Migrated {_imported_dms} DMs from dms.json into conversation shards")
+
+# Group storage lives in SQLite (see database.py); each action writes only its own rows
+
+# Message attachments are stored once by content hash (see blob_store.py)
+blob_store = BlobStore(BLOBS_DIR)
+
+# Uploaded images get 64/256/1024px WebP variants, served via ?size= (see thumbnails.py)
+thumbnailer = Thumbnailer(THUMBS_DIR)
+
+# Login sessions survive restarts in data/sessions.db (Zylo_SESSION_BACKEND=memory
+# keeps them in-process only) and are expired by a background sweep (see session_store.py)
+if SESSION_MODE == 'signed':
+    sessions = SignedSessions(
+        KeyRing(os.path.join(DATA_DIR, 'session_keys.json'), os.getenv('Zylo_SESSION_KEYS')),
+        RevocationList(os.path.join(DATA_DIR, 'sessions.db')),
+        ttl=SESSION_EXPIRY_HOURS * 3600,
+    )
+else:
+    sessions = SessionStore(
+        MemoryBackend() if SESSION_BACKEND == 'memory' else SQLiteBackend(os.path.join(DATA_DIR, 'sessions.db')),
+        ttl=SESSION_EXPIRY_HOURS * 3600,
+    )
+sessions.start()
+
+# Frontend files, precompressed and fingerprinted when a build exists (see static_assets.py)
+static_assets = StaticAssets(FRONTEND_DIR, STATIC_BUILD_DIR)
 
-def save_groups(groups):
-    with open(GROUPS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(groups, f, indent=2)
+# Explore storage helpers (cached, written behind; see persistence.py)
+explore_store = JsonStore(EXPLORE_FILE, create=True)
 
-# Explore storage helpers
 def load_explore():
-    if not os.path.exists(EXPLORE_FILE):
-        with open(EXPLORE_FILE, 'w', encoding='utf-8') as f:
-            json.dump([], f)
-        return []
-    try:
-        with open(EXPLORE_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return []
+    return explore_store.load()
 
 def save_explore(posts):
-    with open(EXPLORE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(posts, f, indent=2)
+    explore_store.save(posts)
 
 
 def http_post_json(url: str, payload: dict, timeout: int = 30) -> dict:
@@ -478,10 +489,8 @@ def send_verification_email(to_email, code):
     except Exception as e:
         print(f"Failed to send verification email: {e}")
         
-# Load existing messages and groups
+# Load existing messages
 messages = load_messages()
-groups = load_groups()
-dms = load_dms()
 
 # API Endpoints
 @app.route("/api/signup", methods=["POST"])
@@ -506,19 +515,11 @@ def signup():
     if not username or not email or not password:
         return jsonify({"success": False, "error": "Missing required fields."}), 400
 
-    # Load existing users
-    if not os.path.exists(USER_DATA_FILE):
-        with open(USER_DATA_FILE, "w") as f:
-            json.dump([], f)
-
-    with open(USER_DATA_FILE, "r") as f:
-        users = json.load(f)
-
-    for user in users:
-        if user["username"] == username:
-            return jsonify({"success": False, "error": "Username already exists."}), 409
-        if user["email"] == email:
-            return jsonify({"success": False, "error": "Email already registered."}), 409
+    if user_repo.get(username):
+        return jsonify({"success": False, "error": "Username already exists."}), 409
+    existing = user_repo.by_email(email)
+    if existing and existing.get("email") == email:
+        return jsonify({"success": False, "error": "Email already registered."}), 409
 
     # Process avatar and banner uploads
     avatar_url = "/images/default_avatar.png"
@@ -557,13 +558,7 @@ def signup():
         "verification_code": verification_code
     }
 
-    users.append(new_user)
-
-    with open(USER_DATA_FILE, "w") as f:
-        json.dump(users, f, indent=2)
-
-    with open(USER_DATA_FILE, "w") as f:
-        json.dump(users, f, indent=2)
+    user_repo.add(new_user)
 
     # Send verification email
     send_verification_email(email, verification_code)
@@ -590,14 +585,8 @@ def social_login():
     base_name = f"{provider}User"
     demo_email = f"{base_name.lower()}@example.com"
     
-    users = load_users()
-    target_user = None
-    
     # Check if this social user already exists
-    for u in users:
-        if u.get("email") == demo_email:
-            target_user = u
-            break
+    target_user = user_repo.by_email(demo_email)
             
     if not target_user:
         # Create new social user
@@ -618,10 +607,8 @@ def social_login():
             "banner": "/images/default_banner.png",
             "provider": provider
         }
-        users.append(target_user)
         try:
-            with open(USER_DATA_FILE, "w") as f:
-                json.dump(users, f, indent=2)
+            user_repo.add(target_user)
         except Exception as e:
             return jsonify({"success": False, "error": "Database error"}), 500
             
@@ -640,29 +627,28 @@ def login():
     data = request.json
     identifier = data.get("identifier")
     password = data.get("password")
-    users = load_users()
-    for user in users:
-        if (user["username"] == identifier or user.get("email") == identifier) and user["password"] == password:
-            # Check if 2FA is enabled
-            if user.get("twofa_enabled"):
-                return jsonify({
-                    "success": False, 
-                    "requires_2fa": True, 
-                    "username": user["username"],
-                    "message": "2FA verification required"
-                })
-            # Create session token
-            token = create_session(user["username"])
-            
-            # Refresh badges
-            check_badges(user["username"])
-            
+    user = user_repo.get(identifier) or user_repo.by_email(identifier)
+    if user and (user["username"] == identifier or user.get("email") == identifier) and user["password"] == password:
+        # Check if 2FA is enabled
+        if user.get("twofa_enabled"):
             return jsonify({
-                "success": True, 
-                "username": user["username"], 
-                "usertag": user.get("usertag", ""),
-                "session_token": token
+                "success": False, 
+                "requires_2fa": True, 
+                "username": user["username"],
+                "message": "2FA verification required"
             })
+        # Create session token
+        token = create_session(user["username"])
+        
+        # Refresh badges
+        check_badges(user["username"])
+        
+        return jsonify({
+            "success": True, 
+            "username": user["username"], 
+            "usertag": user.get("usertag", ""),
+            "session_token": token
+        })
     return jsonify({"success": False, "error": "Invalid credentials"}), 401
 
 @app.route("/api/auth/validate-session", methods=["POST"])
@@ -700,20 +686,14 @@ def enable_2fa():
     if not username:
         return jsonify({"success": False, "error": "Username required"}), 400
     
-    users = load_users()
-    updated = False
-    
-    for user in users:
-        if user["username"] == username:
-            # Generate a mock secret (in production, use pyotp.random_base32())
-            mock_secret = f"ZYLO{random.randint(100000, 999999)}SECRET"
-            user["twofa_enabled"] = True
-            user["twofa_secret"] = mock_secret
-            updated = True
-            break
+    user = user_repo.get(username)
     
-    if updated:
-        save_users(users)
+    if user:
+        # Generate a mock secret (in production, use pyotp.random_base32())
+        mock_secret = f"ZYLO{random.randint(100000, 999999)}SECRET"
+        user["twofa_enabled"] = True
+        user["twofa_secret"] = mock_secret
+        user_repo.save(user)
         return jsonify({
             "success": True, 
             "secret": mock_secret,
@@ -730,18 +710,12 @@ def disable_2fa():
     if not username:
         return jsonify({"success": False, "error": "Username required"}), 400
     
-    users = load_users()
-    updated = False
-    
-    for user in users:
-        if user["username"] == username:
-            user["twofa_enabled"] = False
-            user.pop("twofa_secret", None)
-            updated = True
-            break
+    user = user_repo.get(username)
     
-    if updated:
-        save_users(users)
+    if user:
+        user["twofa_enabled"] = False
+        user.pop("twofa_secret", None)
+        user_repo.save(user)
         return jsonify({"success": True, "message": "2FA disabled"})
     
     return jsonify({"success": False, "error": "User not found"}), 404
@@ -755,25 +729,24 @@ def verify_2fa():
     if not username or not code:
         return jsonify({"success": False, "error": "Username and code required"}), 400
     
-    users = load_users()
+    user = user_repo.get(username)
     
-    for user in users:
-        if user["username"] == username:
-            if not user.get("twofa_enabled"):
-                return jsonify({"success": False, "error": "2FA not enabled"}), 400
-            
-            # Simulated verification: accept any 6-digit code or "123456"
-            if len(code) == 6 and code.isdigit():
-                token = create_session(user["username"])
-                return jsonify({
-                    "success": True, 
-                    "username": user["username"], 
-                    "usertag": user.get("usertag", ""),
-                    "session_token": token,
-                    "message": "2FA verified"
-                })
-            else:
-                return jsonify({"success": False, "error": "Invalid code format"}), 400
+    if user:
+        if not user.get("twofa_enabled"):
+            return jsonify({"success": False, "error": "2FA not enabled"}), 400
+        
+        # Simulated verification: accept any 6-digit code or "123456"
+        if len(code) == 6 and code.isdigit():
+            token = create_session(user["username"])
+            return jsonify({
+                "success": True, 
+                "username": user["username"], 
+                "usertag": user.get("usertag", ""),
+                "session_token": token,
+                "message": "2FA verified"
+            })
+        else:
+            return jsonify({"success": False, "error": "Invalid code format"}), 400
     
     return jsonify({"success": False, "error": "User not found"}), 404
 
@@ -786,24 +759,23 @@ def verify_email():
     if not username or not code:
         return jsonify({"success": False, "error": "Username and code required"}), 400
     
-    users = load_users()
+    user = user_repo.get(username)
     
-    for user in users:
-        if user["username"] == username:
-            if user.get("email_verified"):
-                return jsonify({"success": True, "message": "Email already verified"})
+    if user:
+        if user.get("email_verified"):
+            return jsonify({"success": True, "message": "Email already verified"})
+        
+        if user.get("verification_code") == code:
+            user["email_verified"] = True
+            user.pop("verification_code", None)  # Remove code after verification
+            user_repo.save(user)
             
-            if user.get("verification_code") == code:
-                user["email_verified"] = True
-                user.pop("verification_code", None)  # Remove code after verification
-                save_users(users)
-                
-                # Grant verified badge
-                check_badges(username)
-                
-                return jsonify({"success": True, "message": "Email verified successfully!"})
-            else:
-                return jsonify({"success": False, "error": "Invalid verification code"}), 400
+            # Grant verified badge
+            check_badges(username)
+            
+            return jsonify({"success": True, "message": "Email verified successfully!"})
+        else:
+            return jsonify({"success": False, "error": "Invalid verification code"}), 400
     
     return jsonify({"success": False, "error": "User not found"}), 404
 
@@ -815,19 +787,18 @@ def resend_verification():
     if not email:
         return jsonify({"success": False, "error": "Email required"}), 400
         
-    users = load_users()
-    for user in users:
-        if user["email"] == email:
-            if user.get("email_verified"):
-                return jsonify({"success": False, "error": "Email already verified"}), 400
-                
-            # Generate new code
-            verification_code = str(random.randint(100000, 999999))
-            user["verification_code"] = verification_code
-            save_users(users)
+    user = user_repo.by_email(email)
+    if user and user.get("email") == email:
+        if user.get("email_verified"):
+            return jsonify({"success": False, "error": "Email already verified"}), 400
             
-            send_verification_email(email, verification_code)
-            return jsonify({"success": True, "message": "Verification code resent."})
+        # Generate new code
+        verification_code = str(random.randint(100000, 999999))
+        user["verification_code"] = verification_code
+        user_repo.save(user)
+        
+        send_verification_email(email, verification_code)
+        return jsonify({"success": True, "message": "Verification code resent."})
             
     return jsonify({"success": False, "error": "Email not found"}), 404
 
@@ -838,14 +809,11 @@ def forgot():
     data = request.get_json()
     identifier = data.get("identifier")
 
-    with open(USER_DATA_FILE, "r") as f:
-        users = json.load(f)
-
-    for user in users:
-        if user.get("username") == identifier or user.get("email") == identifier:
-            reset_link = f"http://{host_ip}:5000/reset.html?user={user['username']}"
-            send_reset_email(user.get("email"), reset_link)
-            return jsonify({"success": True})
+    user = user_repo.get(identifier) or user_repo.by_email(identifier)
+    if user and (user.get("username") == identifier or user.get("email") == identifier):
+        reset_link = f"http://{host_ip}:5000/reset.html?user={user['username']}"
+        send_reset_email(user.get("email"), reset_link)
+        return jsonify({"success": True})
 
     return jsonify({"success": False, "error": "User not found."}), 404
 
@@ -859,25 +827,60 @@ def reset_password():
     if not username or not new_password:
         return jsonify({"success": False, "error": "Missing username or password"}), 400
 
-    users = load_users()
-    updated = False
-    for user in users:
-        if user["username"] == username:
-            user["password"] = new_password
-            updated = True
-            break
-
-    if updated:
-        with open(USER_DATA_FILE, "w") as f:
-            json.dump(users, f, indent=2)
+    user = user_repo.get(username)
+    if user:
+        user["password"] = new_password
+        user_repo.save(user)
         return jsonify({"success": True})
     else:
         return jsonify({"success": False, "error": "Username not found"}), 404
     
+# ---- Cursor pagination (community feed, DMs, group channels) ----
+# Cursors are message seqs. `before` scrolls back from the oldest message the
+# client has, `after` catches up from the newest one.
+PAGE_DEFAULT_LIMIT = 50
+PAGE_MAX_LIMIT = 200
+
+def _num_arg(name, cast=int):
+    value = request.args.get(name)
+    try:
+        return cast(value) if value not in (None, '') else None
+    except ValueError:
+        return None
+
+def _page_limit(limit):
+    return max(1, min(limit or PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT))
+
+def _page_response(page, has_more, before=None, after=None):
+    return jsonify({
+        "success": True,
+        "messages": page,
+        "hasMore": has_more,
+        "before": page[0]['seq'] if page else before,
+        "after": page[-1]['seq'] if page else after,
+    })
+
+def _dm_history(user_a, user_b):
+    before, after, limit = _num_arg('before'), _num_arg('after'), _num_arg('limit')
+    since = _num_arg('since', float)
+    if before is None and after is None and limit is None and since is None:
+        # Older clients expect the whole conversation
+        return jsonify({"success": True, "messages": dm_store.conversation(user_a, user_b)})
+    page, has_more = dm_store.page(user_a, user_b, before=before, after=after, since=since, limit=_page_limit(limit))
+    return _page_response(page, has_more, before, after)
+
 @app.route("/api/messages", methods=["GET", "POST"])
 def messages_api():
     if request.method == 'GET':
-        return jsonify(messages)
+        before, after, limit = _num_arg('before'), _num_arg('after'), _num_arg('limit')
+        since_seq = _num_arg('since_seq')
+        if since_seq is not None:
+            after = since_seq
+        if before is None and after is None and limit is None:
+            # Older clients expect the whole room
+            return jsonify(messages)
+        page, has_more = message_log.page(before=before, after=after, limit=_page_limit(limit))
+        return _page_response(page, has_more, before, after)
     
     # POST - Send community message
     data = request.json or {}
@@ -898,8 +901,8 @@ def messages_api():
         "room": "community"
     }
     
+    message_log.append(msg_entry)
     messages.append(msg_entry)
-    save_messages(messages)
     
     # Emit to 'community' room
     socketio.emit('message', msg_entry, room='community')
@@ -918,14 +921,20 @@ def delete_community_message():
     if not msg_id and not timestamp:
         return jsonify({"success": False, "error": "Message ID or timestamp required"}), 400
 
-    original_len = len(messages)
-    messages = [m for m in messages if not (
-        (msg_id and m.get('id') == msg_id) or
-        (timestamp and m.get('timestamp') == timestamp and m.get('username') == username)
-    )]
+    found = message_log.by_id(msg_id)
+    if found:
+        removed = [found]
+    elif timestamp:
+        # Older clients only know the timestamp
+        removed = [m for m in messages if m.get('timestamp') == timestamp and m.get('username') == username]
+    else:
+        removed = []
 
-    if len(messages) < original_len:
-        save_messages(messages)
+    if removed:
+        removed_seqs = {m['seq'] for m in removed}
+        for seq in removed_seqs:
+            message_log.delete(seq)
+        messages = [m for m in messages if m['seq'] not in removed_seqs]
         socketio.emit('message_deleted', {'id': msg_id, 'timestamp': timestamp}, room='community')
         return jsonify({"success": True})
     return jsonify({"success": False, "error": "Message not found"}), 404
@@ -933,7 +942,6 @@ def delete_community_message():
 @app.route("/api/dm/delete", methods=["POST"])
 def delete_dm_message():
     """Delete a DM message by ID."""
-    global dms
     data = request.json or {}
     msg_id = data.get('id')
     username = data.get('username', '')
@@ -941,25 +949,19 @@ def delete_dm_message():
     if not msg_id:
         return jsonify({"success": False, "error": "Message ID required"}), 400
 
-    original_len = len(dms)
-    dms = [m for m in dms if not (m.get('id') == msg_id and m.get('from') == username)]
-
-    if len(dms) < original_len:
-        save_dms(dms)
+    if dm_store.delete(msg_id, username):
         return jsonify({"success": True})
     return jsonify({"success": False, "error": "Message not found"}), 404
 
 # Get list of currently online users
 @app.route("/api/users/online", methods=["GET"])
 def users_online():
-    return jsonify({"success": True, "online": list(online_users.keys())})
+    return jsonify({"success": True, "online": presence.online()})
 
 # Direct Message (DM) endpoint
 @app.route("/api/dm", methods=["POST", "GET"])
 def dm_messages():
     """Send or retrieve direct messages."""
-    global dms
-    
     if request.method == "GET":
         # Get DMs between two users
         from_user = request.args.get('from', '').strip()
@@ -967,12 +969,7 @@ def dm_messages():
         if not from_user or not to_user:
             return jsonify({"success": False, "error": "Missing from/to params"})
         
-        # Filter DMs between these users
-        relevant = [m for m in dms if 
-            (m.get('from') == from_user and m.get('to') == to_user) or
-            (m.get('from') == to_user and m.get('to') == from_user)
-        ]
-        return jsonify({"success": True, "messages": relevant})
+        return _dm_history(from_user, to_user)
     
     # POST - send a new DM
     data = request.get_json(silent=True) or {}
@@ -997,8 +994,7 @@ def dm_messages():
     if sticker_src:
         dm_entry['sticker_src'] = sticker_src
     
-    dms.append(dm_entry)
-    save_dms(dms)
+    dm_store.append(dm_entry)
     
     # Emit via socket for real-time delivery
     try:
@@ -1027,6 +1023,7 @@ def upload_file():
             unique_name = f"{uuid.uuid4().hex[:8]}_{filename}"
             save_path = os.path.join(UPLOADS_DIR, unique_name)
             file.save(save_path)
+            thumbnailer.submit(save_path)
             
             # Determine file type category
             mime_type = file.content_type
@@ -1048,9 +1045,45 @@ def upload_file():
         except Exception as e:
             return jsonify({"success": False, "error": str(e)}), 500
 
+def _send_upload(directory, filename):
+    """Send an uploaded file, or its resized WebP variant when ?size= is one of the thumbnail sizes.
+
+    Responses carry a content-hash ETag and support 304s and byte ranges (see media.py).
+    """
+    path = safe_join(directory, filename) if directory else None
+    if path is None or not os.path.isfile(path):
+        return jsonify({"success": False, "error": "Not found"}), 404
+    size = _num_arg('size')
+    if size is not None:
+        variant, final = thumbnailer.variant(path, size)
+        if variant:
+            return send_media(variant, mimetype='image/webp')
+        if not final:
+            # Still rendering: don't let the original stick to this URL
+            return send_media(path, immutable=False)
+    return send_media(path)
+
 @app.route('/uploads/<filename>')
 def serve_uploaded_file(filename):
-    return send_from_directory(UPLOADS_DIR, filename)
+    return _send_upload(UPLOADS_DIR, filename)
+
+@app.route('/blobs/<name>')
+def serve_blob(name):
+    """Serve a message attachment by content hash, with the type sniffed from its bytes.
+
+    The extension in the URL is cosmetic: anything that isn't an image, audio or
+    video file is sent as a download so uploaded HTML or SVG never renders here.
+    """
+    sha, _, ext = name.partition('.')
+    if len(sha) != 64 or not all(c in '0123456789abcdef' for c in sha) or not blob_store.exists(sha):
+        return jsonify({"success": False, "error": "Not found"}), 404
+    mimetype = blob_store.content_type(sha)
+    # Content-addressed, so the bytes behind a URL never change
+    response = send_media(blob_store.path(sha), mimetype=mimetype, etag=sha, immutable=True)
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    if mimetype.split('/', 1)[0] not in ('image', 'audio', 'video'):
+        response.headers['Content-Disposition'] = 'attachment'
+    return response
 
 @socketio.on("send_message")
 def handle_send_message(data):
@@ -1067,8 +1100,8 @@ def handle_send_message(data):
         "replyTo": data.get("replyTo"),
         "timestamp": int(_time.time())
     }
+    message_log.append(msg_data)
     messages.append(msg_data)
-    save_messages(messages)
     
     print("Message received from client:", msg_data)
     emit("receive_message", msg_data, broadcast=True)
@@ -1099,10 +1132,11 @@ def handle_send_file(data):
         "fileData": file_data
     }
 
+    blob_store.externalize(msg_data)
     # Save in memory
     print("File message received from client:", msg_data)
+    message_log.append(msg_data)
     messages.append(msg_data)
-    save_messages(messages)
 
     emit("receive_file", msg_data, broadcast=True)
 
@@ -1141,6 +1175,7 @@ def _save_data_url_for_user(username: str, base64_data: str, filename_hint: str
         filepath = os.path.join(user_upload_dir, filename)
         with open(filepath, 'wb') as f:
             f.write(file_bytes)
+        thumbnailer.submit(filepath)
         return f"/uploads/{username}/{filename}"
     except Exception as e:
         print("Failed to save data URL:", e)
@@ -1152,11 +1187,26 @@ def handle_join_group(data):
     username = (data or {}).get('username')
     if not group_id or not username:
         return
-    for g in load_groups():
-        if g.get('id') == group_id and (username in (g.get('members') or []) or username == g.get('owner')):
-            join_room(group_id)
-            emit('group_joined', { 'groupId': group_id })
-            return
+    if database.is_group_member(group_id, username):
+        join_room(group_id)
+        emit('group_joined', { 'groupId': group_id })
+
+def _channel_room(group_id, channel):
+    return f"group:{group_id}:{channel or 'general'}"
+
+@socketio.on('join_channel')
+def handle_join_channel(data):
+    """Follow the group channel the user has open (typing indicators); leaves the previous one."""
+    data = data or {}
+    group_id = data.get('groupId')
+    username = presence.username_for(request.sid) or data.get('username')
+    if not group_id or not username or not database.is_group_member(group_id, username):
+        return
+    room = _channel_room(group_id, data.get('channel'))
+    for current in rooms():
+        if current.startswith('group:') and current != room:
+            leave_room(current)
+    join_room(room)
 
 @socketio.on('leave_group')
 def handle_leave_group(data):
@@ -1176,18 +1226,21 @@ def handle_send_group_message(data):
 
     if not group_id or not username or not message:
         return
-    all_groups = load_groups()
-    for idx, g in enumerate(all_groups):
-        if g.get('id') == group_id:
-            entry = {
-                'id': msg_id,
-                'username': username,
-                'message': message,
-                'channel': channel,
-                'replyTo': reply_to,
-                'read_by': [username], # Sender has read it
-                'ts': int(__import__('time').time())
-            }
+    if not database.group_exists(group_id):
+        return
+    entry = {
+        'id': msg_id,
+        'username': username,
+        'message': message,
+        'channel': channel,
+        'replyTo': reply_to,
+        'read_by': [username], # Sender has read it
+        'ts': int(__import__('time').time())
+    }
+    database.append_group_message(group_id, entry)
+    emit('receive_group_message', dict(entry, groupId=group_id), room=group_id)
+
+@socketio.on('send_group_file')
 def handle_send_group_file(data):
     """Handle file sharing within a group room."""
     group_id = (data or {}).get('groupId')
@@ -1197,32 +1250,67 @@ def handle_send_group_file(data):
     file_data = (data or {}).get('fileData')
     if not group_id or not username or not file_name or not file_data:
         return
-    all_groups = load_groups()
-    for idx, g in enumerate(all_groups):
-        if g.get('id') == group_id:
-            entry = {
-                'username': username,
-                'fileName': file_name,
-                'fileType': file_type,
-                'fileData': file_data,
-            }
-            msgs = g.get('messages') or []
-            msgs.append(entry)
-            all_groups[idx]['messages'] = msgs
-            save_groups(all_groups)
-            emit('receive_group_file', {
-                'groupId': group_id,
-                'username': username,
-                'fileName': file_name,
-                'fileType': file_type,
-                'fileData': file_data,
-            }, room=group_id)
-            return
+    if not database.group_exists(group_id):
+        return
+    entry = {
+        'username': username,
+        'fileName': file_name,
+        'fileType': file_type,
+        'fileData': file_data,
+    }
+    blob_store.externalize(entry)
+    database.append_group_message(group_id, entry)
+    emit('receive_group_file', dict(entry, groupId=group_id), room=group_id)
+
+    
+# Typing indicators stay inside their conversation and are throttled (see typing_indicators.py)
+typing_tracker = TypingTracker()
+_typing_sweeper_started = False
+
+def _typing_target(data):
+    """(room, context) a typing event belongs to: a DM partner, a group channel or the community."""
+    if data.get('to'):
+        return f"user_{data['to']}", (('to', data['to']),)
+    if data.get('groupId'):
+        channel = data.get('channel') or 'general'
+        return _channel_room(data['groupId'], channel), (('groupId', data['groupId']), ('channel', channel))
+    if data.get('room') == 'community':
+        # Community messages go to every socket (receive_message), so do its typing events
+        return None, (('room', 'community'),)
+    return None
+
+def _emit_stop_typing(username, target, skip_sid=None):
+    room, context = target
+    socketio.emit('stop_typing', dict(context, username=username), to=room, skip_sid=skip_sid)
+
+def _typing_sweeper():
+    while True:
+        socketio.sleep(1)
+        for username, target in typing_tracker.expired():
+            _emit_stop_typing(username, target)
 
-    
 @socketio.on("typing")
 def handle_typing(data):
-    emit("typing", data, broadcast=True, include_self=False)
+    global _typing_sweeper_started
+    username = presence.username_for(request.sid)
+    target = _typing_target(data or {})
+    if not username or target is None or not typing_tracker.start(username, target):
+        return
+    room, context = target
+    if context[0][0] == 'groupId' and not database.is_group_member(context[0][1], username):
+        typing_tracker.stop(username, target)
+        return
+    if not _typing_sweeper_started:
+        _typing_sweeper_started = True
+        socketio.start_background_task(_typing_sweeper)
+    socketio.emit("typing", dict(context, username=username), to=room, skip_sid=request.sid)
+
+@socketio.on("stop_typing")
+def handle_stop_typing(data):
+    username = presence.username_for(request.sid)
+    target = _typing_target(data or {})
+    if username and target is not None and typing_tracker.stop(username, target):
+        _emit_stop_typing(username, target, skip_sid=request.sid)
 
 @socketio.on('mark_delivered')
 def handle_mark_delivered(data):
@@ -1230,21 +1318,16 @@ def handle_mark_delivered(data):
     username = data.get('username') # The recipient who received it
     if not msg_id: return
     
-    global dms
     updated = False
-    target_msg = None
-    
-    for m in dms:
-        if m.get('id') == msg_id:
-            # Only update if status is 'sent' (don't downgrade from read)
-            if m.get('status') == 'sent':
-                m['status'] = 'delivered'
-                updated = True
-                target_msg = m
-            break
+    target_msg = dm_store.get(msg_id)
+    
+    # Only update if status is 'sent' (don't downgrade from read)
+    if target_msg and target_msg.get('status') == 'sent':
+        target_msg['status'] = 'delivered'
+        updated = True
             
     if updated and target_msg:
-        save_dms(dms)
+        dm_store.save_message(target_msg)
         # Notify the sender that their message was delivered
         # We need to know who sent it. target_msg['from']
         sender = target_msg.get('from')
@@ -1262,30 +1345,27 @@ def handle_mark_read(data):
     reader = data.get('username') # Who is reading
     sender = data.get('sender') # Who sent the messages (if marking all)
     
-    global dms
-    updated_ids = []
+    updated = None
     
     if msg_id:
-        for m in dms:
-            if m.get('id') == msg_id:
-                if m.get('status') != 'read':
-                    m['status'] = 'read'
-                    updated_ids.append(msg_id)
-                    # Notify sender
-                    s = m.get('from')
-                    if s:
-                        socketio.emit('message_status_update', {
-                            'id': msg_id,
-                            'status': 'read',
-                            'peer': reader
-                        }, room=f"dm:{s}")
-                break
+        m = dm_store.get(msg_id)
+        if m and m.get('status') != 'read':
+            m['status'] = 'read'
+            updated = m
+            # Notify sender
+            s = m.get('from')
+            if s:
+                socketio.emit('message_status_update', {
+                    'id': msg_id,
+                    'status': 'read',
+                    'peer': reader
+                }, room=f"dm:{s}")
     elif sender and reader:
         # Mark all messages FROM sender TO reader as read
-        for m in dms:
+        for m in dm_store.conversation(sender, reader):
             if m.get('from') == sender and m.get('to') == reader and m.get('status') != 'read':
                 m['status'] = 'read'
-                updated_ids.append(m.get('id'))
+                updated = m
                 # Notify sender for each or bulk? 
                 # Let's emit one bulk update or individual. Individual is safer for existing logic structure.
                 socketio.emit('message_status_update', {
@@ -1294,30 +1374,37 @@ def handle_mark_read(data):
                     'peer': reader
                 }, room=f"dm:{sender}")
     
-    if updated_ids:
-        save_dms(dms)
+    if updated:
+        # Everything touched here belongs to one conversation
+        dm_store.save_message(updated)
     
     
 @app.route("/api/stats", methods=["GET"])
 def get_stats():
-    users = load_users()
-    user_count = len(users)
+    user_count = user_repo.count()
     message_count = len(messages) 
     try:
-        current_groups = load_groups()
         # +1 for the public community room
-        room_count = (len(current_groups) or 0) + 1
+        room_count = database.count_groups() + 1
     except Exception:
         room_count = 1
 
     return jsonify({
         "users": user_count,
         "messages": message_count,
-        "rooms": room_count
+        "rooms": room_count,
+        "persistence": persistence.writer.stats(),
+        "heroicons": heroicons.stats(),
+        "link_previews": link_previews.stats(),
+        "sessions": sessions.stats(),
+        "presence": presence.stats(),
+        "typing": typing_tracker.stats(),
+        "ai_stream": chat_handler.stream_stats()
     })
 
-# Link preview endpoint - fetches OpenGraph metadata
-import re as _re
+# Link preview endpoint - fetches OpenGraph metadata (cached and coalesced, see link_preview.py)
+link_previews = PreviewCache()
+
 @app.route('/api/link-preview', methods=['GET'])
 def link_preview():
     """Fetch OpenGraph metadata from a URL for rich link embeds."""
@@ -1330,57 +1417,10 @@ def link_preview():
         return jsonify({"success": False, "error": "Invalid URL scheme"})
     
     try:
-        req = urllib.request.Request(url, headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        
-        with urllib.request.urlopen(req, timeout=5, context=ctx) as response:
-            html = response.read(50000).decode('utf-8', errors='ignore')  # Read first 50KB only
-        
-        # Extract OpenGraph tags using regex
-        def get_og_content(tag_name):
-            pattern = rf'<meta[^>]*property=["\']og:{tag_name}["\'][^>]*content=["\']([^"\']*)["\']'
-            match = _re.search(pattern, html, _re.IGNORECASE)
-            if not match:
-                # Try alternate format: content before property
-                pattern = rf'<meta[^>]*content=["\']([^"\']*)["\'][^>]*property=["\']og:{tag_name}["\']'
-                match = _re.search(pattern, html, _re.IGNORECASE)
-            return match.group(1) if match else None
-        
-        title = get_og_content('title')
-        description = get_og_content('description')
-        image = get_og_content('image')
-        site_name = get_og_content('site_name')
-        
-        # Fallback to regular title if no og:title
-        if not title:
-            title_match = _re.search(r'<title[^>]*>([^<]*)</title>', html, _re.IGNORECASE)
-            if title_match:
-                title = title_match.group(1).strip()
-        
-        # Extract hostname as fallback site_name
-        if not site_name:
-            try:
-                from urllib.parse import urlparse
-                site_name = urlparse(url).hostname
-            except:
-                pass
-        
-        return jsonify({
-            "success": True,
-            "url": url,
-            "title": title,
-            "description": description,
-            "image": image,
-            "site_name": site_name
-        })
-        
-    except Exception as e:
-        print(f"Link preview failed for {url}: {e}")
-        return jsonify({"success": False, "error": str(e)})
+        return jsonify(dict(link_previews.get(url), url=url))
+    except ValueError:
+        # Unparseable URL, e.g. a non-numeric port
+        return jsonify({"success": False, "error": "Invalid URL"})
 
 # AI models from Ollama and for exceptions
 @app.route('/api/ai/models', methods=['GET'])
@@ -1681,22 +1721,21 @@ def add_moment_comment(post_id):
 
 CLOUD_FILE = os.path.join(DATA_DIR, 'cloud.json')
 CLOUD_DIR = os.path.join(UPLOADS_DIR, 'cloud')
+CLOUD_INCOMING_DIR = os.path.join(UPLOADS_DIR, '.incoming')
 os.makedirs(CLOUD_DIR, exist_ok=True)
 
+# Uploads are streamed to disk and hashed on the way (see cloud_uploads.py)
+cloud_chunks = ChunkedUploads(os.path.join(CLOUD_INCOMING_DIR, 'chunked'))
+
+cloud_store = JsonStore(CLOUD_FILE, create=True)
+# Serialises read-modify-write of cloud.json (dedup check + append, delete)
+cloud_lock = threading.Lock()
+
 def load_cloud():
-    if not os.path.exists(CLOUD_FILE):
-        with open(CLOUD_FILE, 'w', encoding='utf-8') as f:
-            json.dump([], f)
-        return []
-    try:
-        with open(CLOUD_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return []
+    return cloud_store.load()
 
 def save_cloud(files):
-    with open(CLOUD_FILE, 'w', encoding='utf-8') as f:
-        json.dump(files, f, indent=2)
+    cloud_store.save(files)
 
 
 @app.route('/api/cloud/files', methods=['GET'])
@@ -1712,52 +1751,118 @@ def cloud_files():
     return jsonify({"success": True, "files": user_files})
 
 
+def _store_cloud_upload(username, file_name, file_type, tmp_path, sha, size):
+    """Register an uploaded temp file in the user's cloud, deduplicating by content hash."""
+    with cloud_lock:
+        all_files = load_cloud()
+        for existing in all_files:
+            if existing.get('username') == username and existing.get('sha256') == sha:
+                os.remove(tmp_path)
+                return existing, False
+
+        ext = file_name.rsplit('.', 1)[1].lower() if file_name and '.' in file_name else 'bin'
+        user_upload_dir = os.path.join(UPLOADS_DIR, username)
+        os.makedirs(user_upload_dir, exist_ok=True)
+        filename = f"cloud_{sha[:16]}.{ext}"
+        os.replace(tmp_path, os.path.join(user_upload_dir, filename))
+
+        cloud_entry = {
+            'id': f"cf{random.randint(100000, 999999)}",
+            'username': username,
+            'fileName': file_name,
+            'fileType': file_type,
+            'url': f"/uploads/{username}/{filename}",
+            'size': size,
+            'sha256': sha,
+            'createdAt': int(__import__('time').time())
+        }
+        all_files.append(cloud_entry)
+        save_cloud(all_files)
+    thumbnailer.submit(os.path.join(user_upload_dir, filename))
+    return cloud_entry, True
+
+
+def _cloud_upload_response(entry, created):
+    if created:
+        return jsonify({"success": True, "file": entry})
+    return jsonify({"success": True, "file": entry, "message": "File already exists"})
+
+
 @app.route('/api/cloud/upload', methods=['POST'])
 def cloud_upload():
-    """Upload file to personal cloud storage."""
+    """Upload file to personal cloud storage.
+
+    Accepts multipart/form-data (`file`, `username`, optional `fileType`),
+    streamed to disk, or the older JSON body with a base64 `fileData`.
+    """
+    upload = request.files.get('file')
+    try:
+        if upload is not None:
+            username = (request.form.get('username') or '').strip()
+            file_name = upload.filename
+            file_type = request.form.get('fileType') or upload.mimetype or ''
+            if not username:
+                return jsonify({"success": False, "error": "Missing username"}), 400
+            tmp_path, sha, size = stream_to_file(upload.stream, CLOUD_INCOMING_DIR)
+        else:
+            data = request.json or {}
+            username = (data.get('username') or '').strip()
+            file_name = data.get('fileName')
+            file_data = data.get('fileData')
+            file_type = data.get('fileType', '')
+            if not username or not file_data:
+                return jsonify({"success": False, "error": "Missing username/fileData"}), 400
+            tmp_path, sha, size = data_url_to_file(file_data, CLOUD_INCOMING_DIR)
+    except Exception as e:
+        print("Cloud upload failed:", e)
+        return jsonify({"success": False, "error": "Failed to save file"}), 500
+
+    return _cloud_upload_response(*_store_cloud_upload(username, file_name, file_type, tmp_path, sha, size))
+
+
+@app.route('/api/cloud/upload/start', methods=['POST'])
+def cloud_upload_start():
+    """Open a chunked, resumable upload. Chunks then go to PUT /api/cloud/upload/<uploadId>?offset=N."""
     data = request.json or {}
     username = (data.get('username') or '').strip()
     file_name = data.get('fileName')
-    file_data = data.get('fileData')
-    file_type = data.get('fileType', '')
-    
-    if not username or not file_data:
-        return jsonify({"success": False, "error": "Missing username/fileData"}), 400
-    
-    # --- Backend Deduplication Fix ---
-    # Check if file with same name/size already exists for user
     try:
-        size_bytes = int(len(file_data.split(',')[-1]) * 3 / 4)
-    except:
-        size_bytes = 0
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        size = -1
+    if not username or not file_name or size < 0:
+        return jsonify({"success": False, "error": "Missing username/fileName/size"}), 400
+    session = cloud_chunks.start(username, file_name, data.get('fileType', ''), size)
+    return jsonify({"success": True, "upload": session, "maxChunkBytes": MAX_CHUNK_BYTES})
+
+
+@app.route('/api/cloud/upload/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+def cloud_upload_chunk(upload_id):
+    """GET reports how much arrived (to resume), PUT appends a chunk, DELETE abandons the upload."""
+    session = cloud_chunks.get(upload_id)
+    username = (request.args.get('username') or '').strip()
+    if session is None or session['username'] != username:
+        return jsonify({"success": False, "error": "Upload not found"}), 404
 
-    all_files = load_cloud()
-    for existing in all_files:
-        if (existing.get('username') == username and 
-            existing.get('fileName') == file_name and 
-            abs(existing.get('size', 0) - size_bytes) < 100): # Allow small size variance due to encoding
-            
-            # Found duplicate! Return existing one instead of creating new.
-            return jsonify({"success": True, "file": existing, "message": "File already exists"})
+    if request.method == 'GET':
+        return jsonify({"success": True, "upload": session})
+    if request.method == 'DELETE':
+        cloud_chunks.abort(upload_id)
+        return jsonify({"success": True})
 
-    url = _save_data_url_for_user(username, file_data, file_name)
-    if not url:
-        return jsonify({"success": False, "error": "Failed to save file"}), 500
-    
-    cloud_entry = {
-        'id': f"cf{random.randint(100000, 999999)}",
-        'username': username,
-        'fileName': file_name,
-        'fileType': file_type,
-        'url': url,
-        'size': size_bytes,
-        'createdAt': int(__import__('time').time())
-    }
-    
-    all_files.append(cloud_entry)
-    save_cloud(all_files)
-    
-    return jsonify({"success": True, "file": cloud_entry})
+    offset = _num_arg('offset')
+    if offset is None:
+        offset = session['received']
+    try:
+        session = cloud_chunks.write(upload_id, offset, request.stream, request.content_length or 0)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e), "upload": cloud_chunks.get(upload_id)}), 409
+    if session['received'] < session['size']:
+        return jsonify({"success": True, "upload": session})
+
+    session, tmp_path, sha = cloud_chunks.finish(upload_id)
+    return _cloud_upload_response(*_store_cloud_upload(
+        username, session['fileName'], session['fileType'], tmp_path, sha, session['size']))
 
 @app.route('/api/cloud/delete', methods=['POST'])
 def cloud_delete():
@@ -1769,23 +1874,27 @@ def cloud_delete():
     if not username or not file_id:
         return jsonify({"success": False, "error": "Missing username/fileId"}), 400
     
-    all_files = load_cloud()
-    file_to_delete = None
-    
-    for f in all_files:
-        if f.get('id') == file_id and f.get('username') == username:
-            file_to_delete = f
-            break
-    
-    if not file_to_delete:
-        return jsonify({"success": False, "error": "File not found"}), 404
-    
-    all_files = [f for f in all_files if not (f.get('id') == file_id and f.get('username') == username)]
-    save_cloud(all_files)
+    with cloud_lock:
+        all_files = load_cloud()
+        file_to_delete = None
+        
+        for f in all_files:
+            if f.get('id') == file_id and f.get('username') == username:
+                file_to_delete = f
+                break
+        
+        if not file_to_delete:
+            return jsonify({"success": False, "error": "File not found"}), 404
+        
+        all_files = [f for f in all_files if not (f.get('id') == file_id and f.get('username') == username)]
+        save_cloud(all_files)
     
     return jsonify({"success": True})
 
 
+MAX_ZIP_STREAMS = 4
+_zip_streams = threading.BoundedSemaphore(MAX_ZIP_STREAMS)
+
 @app.route('/api/cloud/download-all', methods=['GET'])
 def cloud_download_all():
     """Create and download a ZIP of all user files."""
@@ -1793,56 +1902,38 @@ def cloud_download_all():
     if not username:
         return jsonify({"success": False, "error": "Missing username"}), 400
 
-    import zipfile
-    import io
-
-    all_files = load_cloud()
-    user_files = [f for f in all_files if f.get('username') == username]
-    
+    user_files = [f for f in load_cloud() if f.get('username') == username]
     if not user_files:
          return jsonify({"success": False, "error": "No files to download"}), 404
 
-    # Create in-memory zip
-    memory_file = io.BytesIO()
-    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for f in user_files:
-            file_name = f.get('fileName')
-            file_url = f.get('url')
-            
-            # Resolve physical path
-            # URLs are like /uploads/username/filename or /images/default.png
-            # We need to map this to local disk
-            if not file_url:
-                continue
-                
-            local_path = None
-            if file_url.startswith('/uploads/'):
-                # /uploads/username/filename -> UPLOADS_DIR/username/filename
-                # app.py defines UPLOADS_DIR
-                # Remove '/uploads/' prefix
-                rel_path = file_url.replace('/uploads/', '', 1).lstrip('/')
-                local_path = os.path.join(UPLOADS_DIR, rel_path)
-                
-            elif file_url.startswith('/images/'):
-                # /images/filename -> FRONTEND_DIR/images/filename
-                rel_path = file_url.replace('/images/', '', 1).lstrip('/')
-                local_path = os.path.join(FRONTEND_DIR, 'images', rel_path)
-            
-            if local_path and os.path.exists(local_path):
-                # Add to zip, using just the filename to flatten structure or keep it simple
-                try:
-                    zf.write(local_path, arcname=file_name)
-                except Exception as e:
-                    print(f"Failed to add {file_name} to zip: {e}")
-    
-    memory_file.seek(0)
-    
-    return flask.send_file(
-        memory_file,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name=f'{username}_cloud_files.zip'
-    )
+    entries = []
+    for f in user_files:
+        # Resolve physical path
+        # URLs are like /uploads/username/filename or /images/default.png
+        file_url = f.get('url')
+        if not file_url:
+            continue
+        local_path = None
+        if file_url.startswith('/uploads/'):
+            # /uploads/username/filename -> UPLOADS_DIR/username/filename
+            local_path = os.path.join(UPLOADS_DIR, file_url.replace('/uploads/', '', 1).lstrip('/'))
+        elif file_url.startswith('/images/'):
+            # /images/filename -> FRONTEND_DIR/images/filename
+            local_path = os.path.join(FRONTEND_DIR, 'images', file_url.replace('/images/', '', 1).lstrip('/'))
+        if local_path and os.path.exists(local_path):
+            entries.append((local_path, f.get('fileName')))
+
+    # Each stream holds about one chunk in memory; cap how many run at once
+    if not _zip_streams.acquire(blocking=False):
+        return jsonify({"success": False, "error": "Too many downloads in progress, try again shortly"}), 503
+
+    response = Response(stream_with_context(iter_zip(entries)), mimetype='application/zip', headers={
+        'Content-Disposition': f'attachment; filename="{username}_cloud_files.zip"',
+        'Cache-Control': 'no-store',
+    })
+    # Runs when the response is closed, even if streaming never started
+    response.call_on_close(_zip_streams.release)
+    return response
 
 
 @app.route('/api/get-user')
@@ -1851,20 +1942,18 @@ def get_user():
     if not identifier:
         return jsonify({"success": False, "error": "Missing identifier"}), 400
 
-    if not os.path.exists(USER_DATA_FILE):
-        return jsonify({"success": False, "error": "User data not found"}), 404
-
-    with open(USER_DATA_FILE, "r", encoding="utf-8") as f:
-        users = json.load(f)
-
-    for user in users:
-        if user.get("username") == identifier or user.get("email") == identifier:
-            # Inject real-time status
-            uname = user.get("username")
-            is_online = uname in online_users
-            user['is_online'] = is_online
-            user['status'] = 'online' if is_online else 'offline'
-            return jsonify({"success": True, "user": user})
+    user = user_repo.get(identifier) or user_repo.by_email(identifier)
+    if user and (user.get("username") == identifier or user.get("email") == identifier):
+        # Inject real-time status into a copy, not the cached record
+        user = dict(user)
+        uname = user.get("username")
+        is_online = presence.is_online(uname)
+        user['is_online'] = is_online
+        # A disconnect's last_active is written in batches; show the newest
+        if presence.last_active(uname):
+            user['last_active'] = presence.last_active(uname)
+        user['status'] = 'online' if is_online else 'offline'
+        return jsonify({"success": True, "user": user})
 
     return jsonify({"success": False, "error": "User not found"}), 404
 
@@ -1874,38 +1963,33 @@ def check_user():
     if not identifier:
         return jsonify({"exists": False})
 
-    if not os.path.exists(USER_DATA_FILE):
-        return jsonify({"exists": False})
-
-    with open(USER_DATA_FILE, "r", encoding="utf-8") as f:
-        users = json.load(f)
-
-    for user in users:
-        if user.get("username", "").lower() == identifier or user.get("email", "").lower() == identifier:
-            return jsonify({"exists": True, "username": user["username"]})
+    lowered = user_repo.find(identifier)
+    # find() also matches usertags; this endpoint only checks username/email
+    if lowered and identifier in ((lowered.get("username") or "").lower(), (lowered.get("email") or "").lower()):
+        return jsonify({"exists": True, "username": lowered["username"]})
 
     return jsonify({"exists": False})
 
 
 @app.route('/')
 def serve_main():
-    return send_from_directory(FRONTEND_DIR, 'login.html')
+    return static_assets.send('login.html')
 
 @app.route('/images/<path:filename>')
 def serve_images(filename):
-    return send_from_directory(os.path.join(FRONTEND_DIR, 'images'), filename) # Images were relocated under the frontend folder
+    return static_assets.send(f'images/{filename}') # Images were relocated under the frontend folder
 
 @app.route('/uploads/<username>/<filename>')
 def serve_upload(username, filename):
-    return send_from_directory(os.path.join(UPLOADS_DIR, username), filename)
+    return _send_upload(safe_join(UPLOADS_DIR, username), filename)
 
 @app.route('/files/<path:filename>')
 def serve_files(filename):
-    return send_from_directory(os.path.join(FRONTEND_DIR, 'files'), filename)  # Static files (css, vendor, audio, etc.) now live under frontend/files
+    return static_assets.send(f'files/{filename}')  # Static files (css, vendor, audio, etc.) now live under frontend/files
 
 @app.route('/js/<path:filename>')
 def serve_js(filename):
-    return send_from_directory(os.path.join(FRONTEND_DIR, 'js'), filename)
+    return static_assets.send(f'js/{filename}')
 
 @app.route('/api/update-profile', methods=['POST'])
 def update_profile():
@@ -1928,9 +2012,6 @@ def update_profile():
     if not username:
         return jsonify({"success": False, "error": "Missing username"}), 400
 
-    if not os.path.exists(USER_DATA_FILE):
-        return jsonify({"success": False, "error": "users.json not found"}), 404
-
     user_upload_dir = os.path.join(UPLOADS_DIR, username)
     os.makedirs(user_upload_dir, exist_ok=True)
 
@@ -1953,6 +2034,7 @@ def update_profile():
             filepath = os.path.join(user_upload_dir, filename)
             with open(filepath, "wb") as f:
                 f.write(file_data)
+            thumbnailer.submit(filepath)
             return f"/uploads/{username}/{filename}"
         except Exception as e:
             print("Failed to save image:", e)
@@ -1961,77 +2043,66 @@ def update_profile():
     avatar_url = save_image(avatar_data, "avatar.png")
     banner_url = save_image(banner_data, "banner.png")
 
-    with open(USER_DATA_FILE, "r", encoding="utf-8") as f:
-        users = json.load(f)
-
-    updated = False
-    for user in users:
-        if user.get("username") == username:
-
-            # Avatar / banner
-            if avatar_url:
-                user["avatar"] = avatar_url
-            if banner_url:
-                user["banner"] = banner_url
-
-            # Usertag
-            if usertag is not None:
-                raw_tag = str(usertag).strip()
-                if raw_tag:
-                    user["usertag"] = "@" + raw_tag.lstrip("@")
-
-            # Only update if the key exists in the payload
-            if "about" in data or "bio" in data:
-                user["about"] = str(data.get("about") or data.get("bio") or "").strip()
-                print(f"Updated short bio for {username}: '{user['about']}'")
-
-            if "aboutMe" in data or "about_long" in data or "description" in data:
-                user["aboutMe"] = str(data.get("aboutMe") or data.get("about_long") or data.get("description") or "").strip()
-                print(f"Updated aboutMe for {username}: '{user['aboutMe']}'")
-
-            if "pronouns" in data:
-                user["pronouns"] = str(data.get("pronouns") or "").strip()
-                
-            if "allowDMs" in data:
-                user["allowDMs"] = bool(data.get("allowDMs"))
-                
-            if "allowFriendRequests" in data:
-                user["allowFriendRequests"] = bool(data.get("allowFriendRequests"))
-
-            # Optional fields
-            if level is not None:
-                user["level"] = level
-            if gold is not None:
-                user["gold"] = gold
-            if rank is not None:
-                user["rank"] = rank
-
-            # Update settings
-            if settings is not None:
-                if "settings" not in user:
-                    user["settings"] = {}
-                user["settings"].update(settings)
-                print(f"✅ Updated settings: {settings}")
-
-            # Badges
-            if "badges" in data:
-                user["badges"] = data.get("badges")
-                print(f"✅ Updated badges for {username}: {user['badges']}")
-
-            if "badges_pinned" in data:
-                user["badges_pinned"] = data.get("badges_pinned")
-                print(f"✅ Updated pinned badges for {username}: {user['badges_pinned']}")
-
-            updated = True
-            print(f"✅ Updated {username}'s profile.")
-            break
-
-
-    if not updated:
+    user = user_repo.get(username)
+    if user is None:
         return jsonify({"success": False, "error": "User not found"}), 404
 
-    with open(USER_DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(users, f, indent=2)
+    # Avatar / banner
+    if avatar_url:
+        user["avatar"] = avatar_url
+    if banner_url:
+        user["banner"] = banner_url
+
+    # Usertag
+    if usertag is not None:
+        raw_tag = str(usertag).strip()
+        if raw_tag:
+            user["usertag"] = "@" + raw_tag.lstrip("@")
+
+    # Only update if the key exists in the payload
+    if "about" in data or "bio" in data:
+        user["about"] = str(data.get("about") or data.get("bio") or "").strip()
+        print(f"Updated short bio for {username}: '{user['about']}'")
+
+    if "aboutMe" in data or "about_long" in data or "description" in data:
+        user["aboutMe"] = str(data.get("aboutMe") or data.get("about_long") or data.get("description") or "").strip()
+        print(f"Updated aboutMe for {username}: '{user['aboutMe']}'")
+
+    if "pronouns" in data:
+        user["pronouns"] = str(data.get("pronouns") or "").strip()
+        
+    if "allowDMs" in data:
+        user["allowDMs"] = bool(data.get("allowDMs"))
+        
+    if "allowFriendRequests" in data:
+        user["allowFriendRequests"] = bool(data.get("allowFriendRequests"))
+
+    # Optional fields
+    if level is not None:
+        user["level"] = level
+    if gold is not None:
+        user["gold"] = gold
+    if rank is not None:
+        user["rank"] = rank
+
+    # Update settings
+    if settings is not None:
+        if "settings" not in user:
+            user["settings"] = {}
+        user["settings"].update(settings)
+        print(f"✅ Updated settings: {settings}")
+
+    # Badges
+    if "badges" in data:
+        user["badges"] = data.get("badges")
+        print(f"✅ Updated badges for {username}: {user['badges']}")
+
+    if "badges_pinned" in data:
+        user["badges_pinned"] = data.get("badges_pinned")
+        print(f"✅ Updated pinned badges for {username}: {user['badges_pinned']}")
+
+    print(f"✅ Updated {username}'s profile.")
+    user_repo.save(user)
 
     return jsonify({"success": True, "user": user})
 
@@ -2040,18 +2111,11 @@ def _add_xp(username: str, amount: int = 5):
     if not username: 
         return
         
-    users = load_users()
-    user_idx = -1
-    for i, u in enumerate(users):
-        if u['username'] == username:
-            user_idx = i
-            break
-            
-    if user_idx == -1:
+    user = user_repo.get(username)
+    if user is None:
         return
 
     # Initialize XP/Level if missing
-    user = users[user_idx]
     current_xp = int(user.get('xp') or 0)
     current_level = int(user.get('level') or 0)
     
@@ -2061,10 +2125,10 @@ def _add_xp(username: str, amount: int = 5):
     # Calculate Level (Simple formula: 100 XP per level)
     new_level = new_xp // 100
     
-    users[user_idx]['xp'] = new_xp
-    users[user_idx]['level'] = new_level
+    user['xp'] = new_xp
+    user['level'] = new_level
     
-    save_users(users)
+    user_repo.save(user)
     
     # Notify user of level up
     if new_level > current_level:
@@ -2086,17 +2150,10 @@ def grant_badge(username, badge_id):
     if not username or not badge_id:
         return False
         
-    users = load_users()
-    user_idx = -1
-    for i, u in enumerate(users):
-        if u['username'] == username:
-            user_idx = i
-            break
-            
-    if user_idx == -1:
+    user = user_repo.get(username)
+    if user is None:
         return False
         
-    user = users[user_idx]
     if 'badges' not in user:
         user['badges'] = []
         
@@ -2104,7 +2161,7 @@ def grant_badge(username, badge_id):
         return False # Already has it
         
     user['badges'].append(badge_id)
-    save_users(users)
+    user_repo.save(user)
     
     # Notify user of badge unlock
     try:
@@ -2124,8 +2181,7 @@ def check_badges(username, context=None):
     if not username:
         return
         
-    users = load_users()
-    user = next((u for u in users if u['username'] == username), None)
+    user = user_repo.get(username)
     if not user:
         return
         
@@ -2145,31 +2201,16 @@ def check_badges(username, context=None):
 
 # -------- Settings and Account Management Endpoints -------- #
 
-def _find_user(users, identifier: str):
+def _find_user(identifier: str):
     """Lookup a user by username, email, or usertag (with or without @).
 
     Historically we only matched the exact username which caused 404s when
     the client submitted a usertag like "@dan_1234" in friends endpoints.
     To make the APIs more forgiving, accept any of: username, email, or
-    usertag (with or without the leading @), case-insensitive.
+    usertag (with or without the leading @), case-insensitive. Served from
+    the in-memory indexes, so this is a dict lookup rather than a scan.
     """
-    query = (identifier or "").strip().lower()
-    if not query:
-        return -1, None
-    # Normalize a potential tag to include @ variant for matching
-    query_tag = query if query.startswith('@') else f"@{query}"
-    for idx, u in enumerate(users):
-        uname = (u.get("username") or "").strip().lower()
-        email = (u.get("email") or "").strip().lower()
-        utag = (u.get("usertag") or "").strip().lower()
-        # Accept both @tag and tag without @
-        if (
-            uname == query
-            or email == query
-            or utag == query_tag
-        ):
-            return idx, u
-    return -1, None
+    return user_repo.find(identifier)
 
 
 @app.route('/api/update-username', methods=['POST'])
@@ -2180,13 +2221,11 @@ def update_username():
     if not username or not new_username:
         return jsonify({"success": False, "error": "Missing username/newUsername"}), 400
 
-    users = load_users()
     # Ensure new username unique
-    for u in users:
-        if u.get("username", "").lower() == new_username.lower():
-            return jsonify({"success": False, "error": "Username already exists"}), 409
+    if user_repo.get(new_username, ignore_case=True):
+        return jsonify({"success": False, "error": "Username already exists"}), 409
 
-    idx, user = _find_user(users, username)
+    user = _find_user(username)
     if user is None:
         return jsonify({"success": False, "error": "User not found"}), 404
 
@@ -2202,19 +2241,16 @@ def update_username():
             pass
 
     # Update user record
-    users[idx]["username"] = new_username
+    user["username"] = new_username
 
     # Update messages author names to keep history aligned
     global messages
-    changed = False
     for m in messages:
         if m.get("username") == username:
             m["username"] = new_username
-            changed = True
-    if changed:
-        save_messages(messages)
+            message_log.update(m)
 
-    save_users(users)
+    user_repo.save(user)
     return jsonify({"success": True, "username": new_username})
 
 
@@ -2237,13 +2273,12 @@ def update_usertag():
     if not any(c.isdigit() for c in raw):
         return jsonify({"success": False, "error": "Usertag must contain digits (e.g., 4 digits)."}), 400
 
-    users = load_users()
-    idx, user = _find_user(users, username)
+    user = _find_user(username)
     if user is None:
         return jsonify({"success": False, "error": "User not found"}), 404
 
-    users[idx]["usertag"] = normalized
-    save_users(users)
+    user["usertag"] = normalized
+    user_repo.save(user)
     return jsonify({"success": True, "usertag": normalized})
 
 
@@ -2260,13 +2295,11 @@ def update_email():
     if not password:
         return jsonify({"success": False, "error": "Password confirmation is required"}), 400
 
-    users = load_users()
     # Ensure email unique
-    for u in users:
-        if u.get("email", "").lower() == new_email.lower():
-            return jsonify({"success": False, "error": "Email already in use"}), 409
+    if user_repo.by_email(new_email):
+        return jsonify({"success": False, "error": "Email already in use"}), 409
 
-    idx, user = _find_user(users, username)
+    user = _find_user(username)
     if user is None:
         return jsonify({"success": False, "error": "User not found"}), 404
 
@@ -2274,8 +2307,8 @@ def update_email():
     if user.get("password") and user.get("password") != password:
         return jsonify({"success": False, "error": "Incorrect password"}), 401
 
-    users[idx]["email"] = new_email
-    save_users(users)
+    user["email"] = new_email
+    user_repo.save(user)
     return jsonify({"success": True, "email": new_email})
 
 
@@ -2288,16 +2321,15 @@ def update_password():
     if not username or not old_password or not new_password:
         return jsonify({"success": False, "error": "Missing fields"}), 400
 
-    users = load_users()
-    idx, user = _find_user(users, username)
+    user = _find_user(username)
     if user is None:
         return jsonify({"success": False, "error": "User not found"}), 404
 
     if user.get("password") != old_password:
         return jsonify({"success": False, "error": "Old password incorrect"}), 401
 
-    users[idx]["password"] = new_password
-    save_users(users)
+    user["password"] = new_password
+    user_repo.save(user)
     return jsonify({"success": True})
 
 
@@ -2309,16 +2341,15 @@ def update_settings():
     if not username:
         return jsonify({"success": False, "error": "Missing username"}), 400
 
-    users = load_users()
-    idx, user = _find_user(users, username)
+    user = _find_user(username)
     if user is None:
         return jsonify({"success": False, "error": "User not found"}), 404
 
     user_settings = user.get("settings") or {}
     # Merge shallowly
     user_settings.update(settings_payload)
-    users[idx]["settings"] = user_settings
-    save_users(users)
+    user["settings"] = user_settings
+    user_repo.save(user)
     return jsonify({"success": True, "settings": user_settings})
 
 
@@ -2329,25 +2360,26 @@ def delete_account():
     if not username:
         return jsonify({"success": False, "error": "Missing username"}), 400
 
-    users = load_users()
-    new_users = [u for u in users if u.get("username") != username]
-    if len(new_users) == len(users):
+    if not user_repo.remove(username):
         return jsonify({"success": False, "error": "User not found"}), 404
 
-    save_users(new_users)
-
     # Remove uploads dir if exists
     user_upload_dir = os.path.join(UPLOADS_DIR, username)
     try:
         if os.path.isdir(user_upload_dir):
+            for root, _, names in os.walk(user_upload_dir):
+                for name in names:
+                    thumbnailer.discard(os.path.join(root, name))
             shutil.rmtree(user_upload_dir)
     except Exception:
         pass
 
     # Remove user's messages
     global messages
+    for m in messages:
+        if m.get("username") == username:
+            message_log.delete(m['seq'])
     messages = [m for m in messages if m.get("username") != username]
-    save_messages(messages)
 
     return jsonify({"success": True})
 
@@ -2374,8 +2406,7 @@ def friends_get():
     username = (request.args.get('username') or '').strip()
     if not username:
         return jsonify({"success": False, "error": "Missing username"}), 400
-    users = load_users()
-    _, user = _find_user(users, username)
+    user = _find_user(username)
     if user is None:
         return jsonify({"success": False, "error": "User not found"}), 404
     user = _ensure_social_fields(user)
@@ -2396,9 +2427,8 @@ def friends_request():
         return jsonify({"success": False, "error": "Missing from/to"}), 400
     if sender == target:
         return jsonify({"success": False, "error": "Cannot add yourself"}), 400
-    users = load_users()
-    si, su = _find_user(users, sender)
-    ti, tu = _find_user(users, target)
+    su = _find_user(sender)
+    tu = _find_user(target)
     if su is None or tu is None:
         return jsonify({"success": False, "error": "User not found"}), 404
     su = _ensure_social_fields(su)
@@ -2417,9 +2447,7 @@ def friends_request():
 
     su['friendRequests']['outgoing'].append(target_name)
     tu['friendRequests']['incoming'].append(sender_name)
-    users[si] = su
-    users[ti] = tu
-    save_users(users)
+    user_repo.save(su, tu)
     return jsonify({"success": True})
 
 
@@ -2430,9 +2458,8 @@ def friends_accept():
     requester = (data.get('from') or '').strip()
     if not username or not requester:
         return jsonify({"success": False, "error": "Missing fields"}), 400
-    users = load_users()
-    ui, u = _find_user(users, username)
-    ri, r = _find_user(users, requester)
+    u = _find_user(username)
+    r = _find_user(requester)
     if u is None or r is None:
         return jsonify({"success": False, "error": "User not found"}), 404
     u = _ensure_social_fields(u)
@@ -2450,9 +2477,7 @@ def friends_accept():
     if uname not in r['friends']:
         r['friends'].append(uname)
 
-    users[ui] = u
-    users[ri] = r
-    save_users(users)
+    user_repo.save(u, r)
     return jsonify({"success": True})
 
 
@@ -2463,9 +2488,8 @@ def friends_decline():
     requester = (data.get('from') or '').strip()
     if not username or not requester:
         return jsonify({"success": False, "error": "Missing fields"}), 400
-    users = load_users()
-    ui, u = _find_user(users, username)
-    ri, r = _find_user(users, requester)
+    u = _find_user(username)
+    r = _find_user(requester)
     if u is None or r is None:
         return jsonify({"success": False, "error": "User not found"}), 404
     u = _ensure_social_fields(u)
@@ -2474,9 +2498,7 @@ def friends_decline():
     rname = r.get('username')
     u['friendRequests']['incoming'] = [x for x in u['friendRequests']['incoming'] if x not in (requester, rname)]
     r['friendRequests']['outgoing'] = [x for x in r['friendRequests']['outgoing'] if x not in (username, uname)]
-    users[ui] = u
-    users[ri] = r
-    save_users(users)
+    user_repo.save(u, r)
     return jsonify({"success": True})
 
 
@@ -2487,9 +2509,8 @@ def friends_remove():
     friend = (data.get('friend') or '').strip()
     if not username or not friend:
         return jsonify({"success": False, "error": "Missing fields"}), 400
-    users = load_users()
-    ui, u = _find_user(users, username)
-    fi, fuser = _find_user(users, friend)
+    u = _find_user(username)
+    fuser = _find_user(friend)
     if u is None or fuser is None:
         return jsonify({"success": False, "error": "User not found"}), 404
     u = _ensure_social_fields(u)
@@ -2499,9 +2520,7 @@ def friends_remove():
     # Remove by either raw input or canonical names
     u['friends'] = [x for x in u['friends'] if x not in (friend, fname)]
     fuser['friends'] = [x for x in fuser['friends'] if x not in (username, uname)]
-    users[ui] = u
-    users[fi] = fuser
-    save_users(users)
+    user_repo.save(u, fuser)
     return jsonify({"success": True})
 
 @app.route('/api/friends/cancel', methods=['POST'])
@@ -2511,9 +2530,8 @@ def friends_cancel():
     target = (data.get('to') or '').strip()
     if not username or not target:
         return jsonify({"success": False, "error": "Missing fields"}), 400
-    users = load_users()
-    ui, u = _find_user(users, username)
-    ti, t = _find_user(users, target)
+    u = _find_user(username)
+    t = _find_user(target)
     if u is None or t is None:
         return jsonify({"success": False, "error": "User not found"}), 404
     u = _ensure_social_fields(u)
@@ -2522,9 +2540,7 @@ def friends_cancel():
     tname = t.get('username')
     u['friendRequests']['outgoing'] = [x for x in u['friendRequests']['outgoing'] if x not in (target, tname)]
     t['friendRequests']['incoming'] = [x for x in t['friendRequests']['incoming'] if x not in (username, uname)]
-    users[ui] = u
-    users[ti] = t
-    save_users(users)
+    user_repo.save(u, t)
     return jsonify({"success": True})
 
 # ---------------- Direct Messages APIs + Socket ---------------- #
@@ -2534,11 +2550,7 @@ def dm_history():
     user_b = (request.args.get('userB') or '').strip()
     if not user_a or not user_b:
         return jsonify([])
-    conv = []
-    for m in (load_dms() or []):
-        if (m.get('from') == user_a and m.get('to') == user_b) or (m.get('from') == user_b and m.get('to') == user_a):
-            conv.append(m)
-    return jsonify({"success": True, "messages": conv})
+    return _dm_history(user_a, user_b)
 
 @app.route('/api/dm/media', methods=['GET'])
 def dm_media():
@@ -2549,13 +2561,10 @@ def dm_media():
     
     media_msgs = []
     # Filter for messages with fileData (images/videos) or sticker_src
-    for m in (load_dms() or []):
-        if ((m.get('from') == user_a and m.get('to') == user_b) or 
-            (m.get('from') == user_b and m.get('to') == user_a)):
-            
-            # Check for media content
-            if m.get('fileData') or m.get('sticker_src') or (m.get('type') == 'image') or (m.get('type') == 'video'):
-                media_msgs.append(m)
+    for m in dm_store.conversation(user_a, user_b):
+        # Check for media content
+        if m.get('fileData') or m.get('sticker_src') or (m.get('type') == 'image') or (m.get('type') == 'video'):
+            media_msgs.append(m)
                 
     return jsonify({"success": True, "media": media_msgs})
 
@@ -2577,9 +2586,8 @@ def dm_send():
         'replyTo': data.get('replyTo'),
         'createdAt': int(__import__('time').time()),
     }
-    all_dms = load_dms()
-    all_dms.append(entry)
-    save_dms(all_dms)
+    blob_store.externalize(entry)
+    dm_store.append(entry)
     # Push live update only to both parties
     try:
         emit('receive_dm', entry, room=f"user_{to}")
@@ -2612,9 +2620,8 @@ def handle_send_dm(data):
             'replyTo': (data or {}).get('replyTo'),
             'createdAt': int(__import__('time').time()),
         }
-        all_dms = load_dms()
-        all_dms.append(entry)
-        save_dms(all_dms)
+        blob_store.externalize(entry)
+        dm_store.append(entry)
         # Emit only to the recipient (sender handles their own message locally)
         # Emit only to the recipient (sender handles their own message locally)
         emit('receive_dm', entry, room=f"user_{to}")
@@ -2633,11 +2640,9 @@ def _gen_group_id() -> str:
 @app.route('/api/groups/list', methods=['GET'])
 def list_groups():
     username = (request.args.get('username') or '').strip()
-    all_groups = load_groups()
     if username:
-        filtered = [g for g in all_groups if username in (g.get('members') or []) or username == g.get('owner')]
-        return jsonify({"success": True, "groups": filtered})
-    return jsonify({"success": True, "groups": all_groups})
+        return jsonify({"success": True, "groups": database.list_groups_for(username)})
+    return jsonify({"success": True, "groups": database.load_groups()})
 
 
 @app.route('/api/groups/create', methods=['POST'])
@@ -2668,9 +2673,7 @@ def create_group():
         "messages": [],
         "createdAt": int(__import__('time').time())
     }
-    all_groups = load_groups()
-    all_groups.append(g)
-    save_groups(all_groups)
+    database.create_group(g)
     return jsonify({"success": True, "group": g})
 
 
@@ -2681,16 +2684,10 @@ def join_group_api():
     group_id = (data.get('groupId') or '').strip()
     if not username or not group_id:
         return jsonify({"success": False, "error": "Missing username/groupId"}), 400
-    all_groups = load_groups()
-    for idx, g in enumerate(all_groups):
-        if g.get('id') == group_id:
-            members = g.get('members') or []
-            if username not in members:
-                members.append(username)
-                all_groups[idx]['members'] = members
-                save_groups(all_groups)
-            return jsonify({"success": True, "group": all_groups[idx]})
-    return jsonify({"success": False, "error": "Group not found"}), 404
+    if not database.group_exists(group_id):
+        return jsonify({"success": False, "error": "Group not found"}), 404
+    database.add_group_member(group_id, username)
+    return jsonify({"success": True, "group": database.get_group(group_id)})
 
 
 @app.route('/api/groups/leave', methods=['POST'])
@@ -2700,14 +2697,10 @@ def leave_group_api():
     group_id = (data.get('groupId') or '').strip()
     if not username or not group_id:
         return jsonify({"success": False, "error": "Missing username/groupId"}), 400
-    all_groups = load_groups()
-    for idx, g in enumerate(all_groups):
-        if g.get('id') == group_id:
-            members = [m for m in (g.get('members') or []) if m != username]
-            all_groups[idx]['members'] = members
-            save_groups(all_groups)
-            return jsonify({"success": True})
-    return jsonify({"success": False, "error": "Group not found"}), 404
+    if not database.group_exists(group_id):
+        return jsonify({"success": False, "error": "Group not found"}), 404
+    database.remove_group_member(group_id, username)
+    return jsonify({"success": True})
 
 
 @app.route('/api/groups/update', methods=['POST'])
@@ -2722,27 +2715,28 @@ def update_group_api():
     if not username or not group_id:
         return jsonify({"success": False, "error": "Missing fields"}), 400
         
-    all_groups = load_groups()
-    for idx, g in enumerate(all_groups):
-        if g.get('id') == group_id:
-            # Check if user is owner (or admin logic later)
-            if g.get('owner') != username:
-                return jsonify({"success": False, "error": "Not authorized"}), 403
-            
-            if name:
-                all_groups[idx]['name'] = name
-            if description is not None: # Empty description allowed
-                all_groups[idx]['description'] = description
-            
-            if icon_data:
-                icon_url = _save_data_url_for_user("groups", icon_data, f"{group_id}_icon.png")
-                if icon_url:
-                    all_groups[idx]['icon'] = icon_url
-            
-            save_groups(all_groups)
-            return jsonify({"success": True, "group": all_groups[idx]})
-            
-    return jsonify({"success": False, "error": "Group not found"}), 404
+    g = database.get_group(group_id)
+    if not g:
+        return jsonify({"success": False, "error": "Group not found"}), 404
+
+    # Check if user is owner (or admin logic later)
+    if g.get('owner') != username:
+        return jsonify({"success": False, "error": "Not authorized"}), 403
+
+    changes = {}
+    if name:
+        changes['name'] = name
+    if description is not None: # Empty description allowed
+        changes['description'] = description
+
+    if icon_data:
+        icon_url = _save_data_url_for_user("groups", icon_data, f"{group_id}_icon.png")
+        if icon_url:
+            changes['icon'] = icon_url
+
+    database.update_group(group_id, **changes)
+    g.update(changes)
+    return jsonify({"success": True, "group": g})
 
 
 @app.route('/api/groups/delete', methods=['POST'])
@@ -2754,17 +2748,14 @@ def delete_group_api():
     if not username or not group_id:
         return jsonify({"success": False, "error": "Missing fields"}), 400
         
-    all_groups = load_groups()
-    for idx, g in enumerate(all_groups):
-        if g.get('id') == group_id:
-            if g.get('owner') != username:
-                return jsonify({"success": False, "error": "Not authorized"}), 403
-            
-            del all_groups[idx]
-            save_groups(all_groups)
-            return jsonify({"success": True})
-            
-    return jsonify({"success": False, "error": "Group not found"}), 404
+    g = database.get_group(group_id)
+    if not g:
+        return jsonify({"success": False, "error": "Group not found"}), 404
+    if g.get('owner') != username:
+        return jsonify({"success": False, "error": "Not authorized"}), 403
+
+    database.delete_group(group_id)
+    return jsonify({"success": True})
 
 
 @app.route('/api/groups/channels/create', methods=['POST'])
@@ -2779,34 +2770,35 @@ def create_group_channel():
     if not group_id or not username or not channel_name:
         return jsonify({"success": False, "error": "Missing required fields"}), 400
 
-    all_groups = load_groups()
-    for idx, g in enumerate(all_groups):
-        if g.get('id') == group_id:
-            # Permission: Owner OR Admin
-            roles = g.get('roles', {})
-            is_owner = g.get('owner') == username
-            is_admin = username in roles.get('admin', [])
-            
-            if not (is_owner or is_admin):
-                return jsonify({"success": False, "error": "Not authorized"}), 403
-            
-            channels = g.get('channels', [])
-            # Check for duplicate names
-            if any(c.get('name') == channel_name for c in channels):
-                return jsonify({"success": False, "error": "Channel already exists"}), 400
-            
-            new_channel = {
-                "id": str(random.randint(1000, 9999)), # Simplified channel ID
-                "name": channel_name,
-                "type": channel_type,
-                "category": category
-            }
-            channels.append(new_channel)
-            all_groups[idx]['channels'] = channels
-            save_groups(all_groups)
+    g = database.get_group(group_id)
+    if not g:
+        return jsonify({"success": False, "error": "Group not found"}), 404
+
+    # Permission: Owner OR Admin
+    roles = g.get('roles', {})
+    is_owner = g.get('owner') == username
+    is_admin = username in roles.get('admin', [])
+
+    if not (is_owner or is_admin):
+        return jsonify({"success": False, "error": "Not authorized"}), 403
+
+    channels = g.get('channels', [])
+    # Check for duplicate names
+    if any(isinstance(c, dict) and c.get('name') == channel_name for c in channels):
+        return jsonify({"success": False, "error": "Channel already exists"}), 400
+
+    new_channel = {
+        "id": str(random.randint(1000, 9999)), # Simplified channel ID
+        "name": channel_name,
+        "type": channel_type,
+        "category": category
+    }
+    # Short random ids can collide; pick another rather than overwrite a channel
+    for _ in range(20):
+        if database.add_group_channel(group_id, new_channel):
             return jsonify({"success": True, "channel": new_channel})
-    
-    return jsonify({"success": False, "error": "Group not found"}), 404
+        new_channel["id"] = str(random.randint(1000, 9999))
+    return jsonify({"success": False, "error": "Could not allocate a channel id"}), 500
 
 
 @app.route('/api/groups/channels/delete', methods=['POST'])
@@ -2822,18 +2814,14 @@ def delete_group_channel():
     if channel_id == 'general':
         return jsonify({"success": False, "error": "Cannot delete #general"}), 400
 
-    all_groups = load_groups()
-    for idx, g in enumerate(all_groups):
-        if g.get('id') == group_id:
-            if g.get('owner') != username:
-                return jsonify({"success": False, "error": "Not authorized"}), 403
-            
-            channels = [c for c in g.get('channels', []) if c.get('id') != channel_id]
-            all_groups[idx]['channels'] = channels
-            save_groups(all_groups)
-            return jsonify({"success": True})
-            
-    return jsonify({"success": False, "error": "Group not found"}), 404
+    g = database.get_group(group_id)
+    if not g:
+        return jsonify({"success": False, "error": "Group not found"}), 404
+    if g.get('owner') != username:
+        return jsonify({"success": False, "error": "Not authorized"}), 403
+
+    database.delete_group_channel(group_id, channel_id)
+    return jsonify({"success": True})
 
 
 @app.route('/api/groups/message', methods=['POST'])
@@ -2848,38 +2836,32 @@ def send_group_message_api():
     if not group_id or not username or not message:
         return jsonify({"success": False, "error": "Missing required fields"}), 400
     
-    all_groups = load_groups()
-    
-    for idx, group in enumerate(all_groups):
-        if group.get('id') == group_id:
-            msg_entry = {
-                'username': username,
-                'message': message,
-                'channel': channel,
-                'timestamp': int(__import__('time').time()),
-                'type': data.get('type', 'text'),
-                'sticker_src': data.get('sticker_src'),
-                'fileData': data.get('fileData'),
-                'fileName': data.get('fileName'),
-                'fileName': data.get('fileName'),
-                'fileType': data.get('fileType'),
-                'replyTo': data.get('replyTo')
-            }
-            messages = group.get('messages', [])
-            messages.append(msg_entry)
-            all_groups[idx]['messages'] = messages
-            save_groups(all_groups)
-            
-            # Emit to group room
-            socketio.emit('group_message', {
-                'groupId': group_id,
-                'channel': channel,
-                'message': msg_entry
-            }, room=group_id)
-            
-            return jsonify({"success": True, "message": msg_entry})
-    
-    return jsonify({"success": False, "error": "Group not found"}), 404
+    if not database.group_exists(group_id):
+        return jsonify({"success": False, "error": "Group not found"}), 404
+
+    msg_entry = {
+        'username': username,
+        'message': message,
+        'channel': channel,
+        'timestamp': int(__import__('time').time()),
+        'type': data.get('type', 'text'),
+        'sticker_src': data.get('sticker_src'),
+        'fileData': data.get('fileData'),
+        'fileName': data.get('fileName'),
+        'fileType': data.get('fileType'),
+        'replyTo': data.get('replyTo')
+    }
+    blob_store.externalize(msg_entry)
+    database.append_group_message(group_id, msg_entry)
+
+    # Emit to group room
+    socketio.emit('group_message', {
+        'groupId': group_id,
+        'channel': channel,
+        'message': msg_entry
+    }, room=group_id)
+
+    return jsonify({"success": True, "message": msg_entry})
 
 
 @app.route('/api/groups/message/edit', methods=['POST'])
@@ -2895,40 +2877,34 @@ def edit_group_message_api():
     if not group_id or not username or not new_message or not message_timestamp:
         return jsonify({"success": False, "error": "Missing required fields"}), 400
     
-    all_groups = load_groups()
-    
-    for idx, group in enumerate(all_groups):
-        if group.get('id') == group_id:
-            messages = group.get('messages', [])
-            for msg_idx, msg in enumerate(messages):
-                if msg.get('timestamp') == message_timestamp and msg.get('username') == username and msg.get('channel') == channel:
-                    # Save history before overwriting
-                    if 'history' not in messages[msg_idx]:
-                        messages[msg_idx]['history'] = []
-                    
-                    messages[msg_idx]['history'].append({
-                        'content': messages[msg_idx]['message'],
-                        'timestamp': messages[msg_idx].get('editedAt') or messages[msg_idx]['timestamp']
-                    })
-
-                    messages[msg_idx]['message'] = new_message
-                    messages[msg_idx]['edited'] = True
-                    messages[msg_idx]['editedAt'] = int(__import__('time').time())
-                    
-                    all_groups[idx]['messages'] = messages
-                    save_groups(all_groups)
+    if not database.group_exists(group_id):
+        return jsonify({"success": False, "error": "Group not found"}), 404
 
-                    # Emit update event
-                    socketio.emit('group_message_update', {
-                        'groupId': group_id,
-                        'channel': channel,
-                        'message': messages[msg_idx]
-                    }, room=group_id)
+    for seq, msg in database.group_messages_at(group_id, message_timestamp, channel):
+        if msg.get('timestamp') == message_timestamp and msg.get('username') == username:
+            # Save history before overwriting
+            if 'history' not in msg:
+                msg['history'] = []
 
-                    return jsonify({"success": True, "message": messages[msg_idx]})
-            return jsonify({"success": False, "error": "Message not found"}), 404
-    
-    return jsonify({"success": False, "error": "Group not found"}), 404
+            msg['history'].append({
+                'content': msg['message'],
+                'timestamp': msg.get('editedAt') or msg['timestamp']
+            })
+
+            msg['message'] = new_message
+            msg['edited'] = True
+            msg['editedAt'] = int(__import__('time').time())
+            database.update_group_message(seq, msg)
+
+            # Emit update event
+            socketio.emit('group_message_update', {
+                'groupId': group_id,
+                'channel': channel,
+                'message': msg
+            }, room=group_id)
+
+            return jsonify({"success": True, "message": msg})
+    return jsonify({"success": False, "error": "Message not found"}), 404
 
 
 @app.route('/api/groups/message/react', methods=['POST'])
@@ -2945,53 +2921,48 @@ def react_group_message_api():
     if not group_id or not username or not emoji or not message_timestamp:
         return jsonify({"success": False, "error": "Missing required fields"}), 400
     
-    all_groups = load_groups()
-    
-    for idx, group in enumerate(all_groups):
-        if group.get('id') == group_id:
-            messages = group.get('messages', [])
-            for msg_idx, msg in enumerate(messages):
-                if msg.get('timestamp') == message_timestamp and msg.get('channel') == channel:
-                    # Initialize reactions dict if not present
-                    if 'reactions' not in messages[msg_idx]:
-                        messages[msg_idx]['reactions'] = {}
-                    
-                    reactions = messages[msg_idx]['reactions']
-                    
-                    if emoji not in reactions:
-                        reactions[emoji] = []
-                    
-                    if action == 'add':
-                        if username not in reactions[emoji]:
-                            reactions[emoji].append(username)
-                    else:  # remove
-                        if username in reactions[emoji]:
-                            reactions[emoji].remove(username)
-                        if len(reactions[emoji]) == 0:
-                            del reactions[emoji]
-                    
-                    messages[msg_idx]['reactions'] = reactions
-                    all_groups[idx]['messages'] = messages
-                    save_groups(all_groups)
-                    
-                    # Emit socket update
-                    # Use socketio.emit directly if possible, or import if needed
-                    # (Assuming socketio is available in this scope or globally)
-                    try:
-                        socketio.emit('message_reaction_update', {
-                            'groupId': group_id,
-                            'channelId': channel,
-                            'messageId': msg.get('id'), # Use ID if available
-                            'timestamp': msg.get('timestamp'),
-                            'reactions': reactions
-                        }, room=group_id)
-                    except Exception as e:
-                        print(f"Socket emit error: {e}")
+    if not database.group_exists(group_id):
+        return jsonify({"success": False, "error": "Group not found"}), 404
 
-                    return jsonify({"success": True, "reactions": reactions})
-            return jsonify({"success": False, "error": "Message not found"}), 404
-    
-    return jsonify({"success": False, "error": "Group not found"}), 404
+    for seq, msg in database.group_messages_at(group_id, message_timestamp, channel):
+        if msg.get('timestamp') == message_timestamp:
+            # Initialize reactions dict if not present
+            if 'reactions' not in msg:
+                msg['reactions'] = {}
+            
+            reactions = msg['reactions']
+            
+            if emoji not in reactions:
+                reactions[emoji] = []
+            
+            if action == 'add':
+                if username not in reactions[emoji]:
+                    reactions[emoji].append(username)
+            else:  # remove
+                if username in reactions[emoji]:
+                    reactions[emoji].remove(username)
+                if len(reactions[emoji]) == 0:
+                    del reactions[emoji]
+            
+            msg['reactions'] = reactions
+            database.update_group_message(seq, msg)
+            
+            # Emit socket update
+            # Use socketio.emit directly if possible, or import if needed
+            # (Assuming socketio is available in this scope or globally)
+            try:
+                socketio.emit('message_reaction_update', {
+                    'groupId': group_id,
+                    'channelId': channel,
+                    'messageId': msg.get('id'), # Use ID if available
+                    'timestamp': msg.get('timestamp'),
+                    'reactions': reactions
+                }, room=group_id)
+            except Exception as e:
+                print(f"Socket emit error: {e}")
+
+            return jsonify({"success": True, "reactions": reactions})
+    return jsonify({"success": False, "error": "Message not found"}), 404
 
 
 @app.route('/api/groups/message/delete', methods=['POST'])
@@ -3006,69 +2977,54 @@ def delete_group_message_api():
     if not group_id or not username or not message_timestamp:
         return jsonify({"success": False, "error": "Missing required fields"}), 400
     
-    all_groups = load_groups()
-    
-    for idx, group in enumerate(all_groups):
-        if group.get('id') == group_id:
-            messages = group.get('messages', [])
-            for msg_idx, msg in enumerate(messages):
-                if msg.get('timestamp') == message_timestamp and msg.get('channel') == channel:
-                    if msg.get('username') != username:
-                        return jsonify({"success": False, "error": "Unauthorized"}), 403
-                        
-                    messages.pop(msg_idx)
-                    all_groups[idx]['messages'] = messages
-                    save_groups(all_groups)
-                    
-                    # Emit delete event
-                    socketio.emit('group_message_delete', {
-                        'groupId': group_id,
-                        'channel': channel,
-                        'timestamp': message_timestamp
-                    }, room=group_id)
-                    
-                    return jsonify({"success": True})
-            return jsonify({"success": False, "error": "Message not found"}), 404
-    
-    return jsonify({"success": False, "error": "Group not found"}), 404
+    if not database.group_exists(group_id):
+        return jsonify({"success": False, "error": "Group not found"}), 404
+
+    for seq, msg in database.group_messages_at(group_id, message_timestamp, channel):
+        if msg.get('timestamp') == message_timestamp:
+            if msg.get('username') != username:
+                return jsonify({"success": False, "error": "Unauthorized"}), 403
+
+            database.delete_group_message(seq)
+
+            # Emit delete event
+            socketio.emit('group_message_delete', {
+                'groupId': group_id,
+                'channel': channel,
+                'timestamp': message_timestamp
+            }, room=group_id)
+
+            return jsonify({"success": True})
+    return jsonify({"success": False, "error": "Message not found"}), 404
 
 @app.route('/api/groups/<group_id>/messages', methods=['GET'])
 def group_messages_get(group_id):
     channel = request.args.get('channel', 'general').strip()
-    all_groups = load_groups()
-    for g in all_groups:
-        if g.get('id') == group_id:
-            all_messages = g.get('messages', [])
-            # Filter by channel if specified
-            channel_messages = [
-                msg for msg in all_messages 
-                if msg.get('channel', 'general') == channel
-            ]
-            return jsonify({"success": True, "messages": channel_messages})
-    return jsonify({"success": True, "messages": []})
+    before, after, limit = _num_arg('before'), _num_arg('after'), _num_arg('limit')
+    if before is None and after is None and limit is None:
+        # Older clients expect the whole channel
+        return jsonify({"success": True, "messages": database.group_channel_messages(group_id, channel)})
+
+    page, has_more = database.group_channel_page(group_id, channel, before=before, after=after, limit=_page_limit(limit))
+    return _page_response(page, has_more, before, after)
 
 @app.route('/api/groups/<group_id>/media', methods=['GET'])
 def group_media_get(group_id):
-    all_groups = load_groups()
-    for g in all_groups:
-        if g.get('id') == group_id:
-            all_messages = g.get('messages', [])
-            # Filter for media messages
-            media_messages = [
-                msg for msg in all_messages 
-                if msg.get('fileData') or msg.get('sticker_src') or (msg.get('type') == 'image') or (msg.get('type') == 'video')
-            ]
-            return jsonify({"success": True, "media": media_messages})
-    return jsonify({"success": True, "media": []})
+    # Filter for media messages
+    media_messages = [
+        msg for msg in database.group_all_messages(group_id)
+        if msg.get('fileData') or msg.get('sticker_src') or (msg.get('type') == 'image') or (msg.get('type') == 'video')
+    ]
+    return jsonify({"success": True, "media": media_messages})
 
 @app.route('/<path:path>')
 def serve_static_file(path):
     # Serve frontend files. Map service worker and manifest to root scope from /frontend/js
     if path == 'service-worker.js':
-        return send_from_directory(os.path.join(FRONTEND_DIR, 'js'), 'service-worker.js')
+        return static_assets.send('js/service-worker.js')
     if path == 'manifest.webmanifest':
-        return send_from_directory(os.path.join(FRONTEND_DIR, 'js'), 'manifest.webmanifest')
-    return send_from_directory(FRONTEND_DIR, path)
+        return static_assets.send('js/manifest.webmanifest')
+    return static_assets.send(path)
 
 @app.route('/api/groups/message/read', methods=['POST'])
 def read_group_message_api():
@@ -3082,33 +3038,27 @@ def read_group_message_api():
     if not group_id or not username or not message_timestamp:
         return jsonify({"success": False, "error": "Missing fields"}), 400
     
-    all_groups = load_groups()
-    
-    for idx, group in enumerate(all_groups):
-        if group.get('id') == group_id:
-            messages = group.get('messages', [])
-            for msg_idx, msg in enumerate(messages):
-                if msg.get('timestamp') == message_timestamp and msg.get('channel') == channel:
-                    
-                    read_by = msg.get('readBy', [])
-                    if username not in read_by:
-                        read_by.append(username)
-                        messages[msg_idx]['readBy'] = read_by
-                        all_groups[idx]['messages'] = messages
-                        save_groups(all_groups)
-                        
-                        # Emit read update
-                        socketio.emit('group_message_read_update', {
-                            'groupId': group_id,
-                            'channel': channel,
-                            'timestamp': message_timestamp,
-                            'readBy': read_by
-                        }, room=group_id)
-                        
-                    return jsonify({"success": True, "readBy": read_by})
-            return jsonify({"success": False, "error": "Message not found"}), 404
-    
-    return jsonify({"success": False, "error": "Group not found"}), 404
+    if not database.group_exists(group_id):
+        return jsonify({"success": False, "error": "Group not found"}), 404
+
+    for seq, msg in database.group_messages_at(group_id, message_timestamp, channel):
+        if msg.get('timestamp') == message_timestamp:
+            read_by = msg.get('readBy', [])
+            if username not in read_by:
+                read_by.append(username)
+                msg['readBy'] = read_by
+                database.update_group_message(seq, msg)
+
+                # Emit read update
+                socketio.emit('group_message_read_update', {
+                    'groupId': group_id,
+                    'channel': channel,
+                    'timestamp': message_timestamp,
+                    'readBy': read_by
+                }, room=group_id)
+
+            return jsonify({"success": True, "readBy": read_by})
+    return jsonify({"success": False, "error": "Message not found"}), 404
 
 
 
@@ -3133,8 +3083,7 @@ def webauthn_verify():
         else:
              # Create one
              target_user = {"username": "BiometricUser", "usertag": "@bio", "password": "bio"}
-             users.append(target_user)
-             save_users(users)
+             user_repo.add(target_user)
              
         token = create_session(target_user["username"])
         return jsonify({
@@ -3146,6 +3095,18 @@ def webauthn_verify():
         
     return jsonify({"success": False, "error": "Verification failed"}), 400
 
+def _find_group_message(group_id, msg_id=None, timestamp=None):
+    """Locate a group message by id, falling back to its timestamp. Returns (seq, message)."""
+    if msg_id:
+        seq, msg = database.group_message_by_id(group_id, msg_id)
+        if msg is not None:
+            return seq, msg
+    if timestamp:
+        found = database.group_messages_at(group_id, timestamp)
+        if found:
+            return found[0]
+    return None, None
+
 @app.route('/api/groups/message/edit', methods=['POST'])
 def edit_group_message():
     data = request.json or {}
@@ -3158,48 +3119,33 @@ def edit_group_message():
     if not group_id or not username or not new_text:
         return jsonify({"success": False, "error": "Missing fields"}), 400
 
-    all_groups = load_groups()
-    changed = False
-    
-    for g in all_groups:
-        if g.get('id') == group_id:
-            msgs = g.get('messages') or []
-            for m in msgs:
-                match = False
-                if msg_id and m.get('id') == msg_id:
-                    match = True
-                elif timestamp and (m.get('ts') == timestamp or m.get('timestamp') == timestamp):
-                    match = True
-                
-                if match:
-                    if m.get('username') != username:
-                        return jsonify({"success": False, "error": "Unauthorized"}), 403
-                    
-                    if 'history' not in m:
-                        m['history'] = []
-                    
-                    m['history'].append({
-                        'message': m.get('message'),
-                        'timestamp': int(__import__('time').time())
-                    })
-                    
-                    m['message'] = new_text
-                    m['isEdited'] = True
-                    changed = True
-                    
-                    socketio.emit('group_message_updated', {
-                        'groupId': group_id,
-                        'id': m.get('id'),
-                        'timestamp': m.get('ts'),
-                        'message': new_text,
-                        'isEdited': True
-                    }, room=group_id)
-                    break
-            if changed:
-                save_groups(all_groups)
-                return jsonify({"success": True})
-            
-    return jsonify({"success": False, "error": "Message not found"}), 404
+    seq, m = _find_group_message(group_id, msg_id, timestamp)
+    if m is None:
+        return jsonify({"success": False, "error": "Message not found"}), 404
+
+    if m.get('username') != username:
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+
+    if 'history' not in m:
+        m['history'] = []
+
+    m['history'].append({
+        'message': m.get('message'),
+        'timestamp': int(__import__('time').time())
+    })
+
+    m['message'] = new_text
+    m['isEdited'] = True
+    database.update_group_message(seq, m)
+
+    socketio.emit('group_message_updated', {
+        'groupId': group_id,
+        'id': m.get('id'),
+        'timestamp': m.get('ts'),
+        'message': new_text,
+        'isEdited': True
+    }, room=group_id)
+    return jsonify({"success": True})
 
 @app.route('/api/groups/message/history', methods=['POST'])
 def get_message_history():
@@ -3211,24 +3157,14 @@ def get_message_history():
     if not group_id:
         return jsonify({"success": False, "error": "Missing groupId"}), 400
         
-    all_groups = load_groups()
-    for g in all_groups:
-        if g.get('id') == group_id:
-            msgs = g.get('messages') or []
-            for m in msgs:
-                match = False
-                if msg_id and m.get('id') == msg_id:
-                    match = True
-                elif timestamp and (m.get('ts') == timestamp or m.get('timestamp') == timestamp):
-                    match = True
-                    
-                if match:
-                    return jsonify({
-                        "success": True, 
-                        "history": m.get('history', []),
-                        "currentMessage": m.get('message'),
-                        "lastEditedAt": m.get('history')[-1]['timestamp'] if m.get('history') else 0
-                    })
+    _, m = _find_group_message(group_id, msg_id, timestamp)
+    if m is not None:
+        return jsonify({
+            "success": True, 
+            "history": m.get('history', []),
+            "currentMessage": m.get('message'),
+            "lastEditedAt": m.get('history')[-1]['timestamp'] if m.get('history') else 0
+        })
                     
     return jsonify({"success": False, "error": "Message not found"}), 404
 
@@ -3243,72 +3179,50 @@ def delete_group_message():
     if not group_id or not username:
         return jsonify({"success": False, "error": "Missing fields"}), 400
 
-    all_groups = load_groups()
-    deleted = False
-    
-    for idx, g in enumerate(all_groups):
-        if g.get('id') == group_id:
-            msgs = g.get('messages') or []
-            
-            # Permission Check
-            roles = g.get('roles', {})
-            is_owner = g.get('owner') == username
-            is_admin = username in roles.get('admin', [])
-            is_mod = username in roles.get('moderator', [])
-            
-            new_msgs = []
-            deleted_id = None
-            
-            for m in msgs:
-                match = False
-                if msg_id and m.get('id') == msg_id:
-                    match = True
-                elif timestamp and (m.get('ts') == timestamp or m.get('timestamp') == timestamp):
-                    match = True
-                
-                if match:
-                    msg_author = m.get('username')
-                    
-                    # Logic: 
-                    # Owner can delete anyone
-                    # Admin can delete anyone except Owner
-                    # Mod can delete anyone except Owner/Admin
-                    # User can delete their own
-                    
-                    allowed = False
-                    if msg_author == username:
-                        allowed = True
-                    elif is_owner:
-                        allowed = True
-                    elif is_admin:
-                        author_is_owner = g.get('owner') == msg_author
-                        allowed = not author_is_owner
-                    elif is_mod:
-                        author_is_owner = g.get('owner') == msg_author
-                        author_is_admin = msg_author in roles.get('admin', [])
-                        allowed = not (author_is_owner or author_is_admin)
-
-                    if allowed:
-                        deleted_id = m.get('id')
-                        deleted = True
-                        continue 
-                    else:
-                        return jsonify({"success": False, "error": "Unauthorized"}), 403
-                new_msgs.append(m)
-            
-            if deleted:
-                all_groups[idx]['messages'] = new_msgs
-                save_groups(all_groups)
-                
-                socketio.emit('group_message_deleted', {
-                    'groupId': group_id,
-                    'id': deleted_id,
-                    'timestamp': timestamp
-                }, room=group_id)
-                
-                return jsonify({"success": True})
-                
-    return jsonify({"success": False, "error": "Message not found"}), 404
+    g = database.get_group(group_id)
+    seq, m = _find_group_message(group_id, msg_id, timestamp) if g else (None, None)
+    if m is None:
+        return jsonify({"success": False, "error": "Message not found"}), 404
+
+    # Permission Check
+    roles = g.get('roles', {})
+    is_owner = g.get('owner') == username
+    is_admin = username in roles.get('admin', [])
+    is_mod = username in roles.get('moderator', [])
+
+    msg_author = m.get('username')
+
+    # Logic: 
+    # Owner can delete anyone
+    # Admin can delete anyone except Owner
+    # Mod can delete anyone except Owner/Admin
+    # User can delete their own
+
+    allowed = False
+    if msg_author == username:
+        allowed = True
+    elif is_owner:
+        allowed = True
+    elif is_admin:
+        author_is_owner = g.get('owner') == msg_author
+        allowed = not author_is_owner
+    elif is_mod:
+        author_is_owner = g.get('owner') == msg_author
+        author_is_admin = msg_author in roles.get('admin', [])
+        allowed = not (author_is_owner or author_is_admin)
+
+    if not allowed:
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+
+    database.delete_group_message(seq)
+
+    socketio.emit('group_message_deleted', {
+        'groupId': group_id,
+        'id': m.get('id'),
+        'timestamp': timestamp
+    }, room=group_id)
+
+    return jsonify({"success": True})
 
 # Role Management Events
 @socketio.on('assign_role')
@@ -3321,37 +3235,18 @@ def handle_assign_role(data):
     if not group_id or not requester or not target_user or not role:
         return
         
-    all_groups = load_groups()
-    for idx, g in enumerate(all_groups):
-        if g.get('id') == group_id:
-            # Only Owner can assign roles currently
-            if g.get('owner') != requester:
-                return 
-            
-            if 'roles' not in g:
-                all_groups[idx]['roles'] = {'admin': [], 'moderator': []}
-            
-            # Remove from existing roles first
-            if target_user in all_groups[idx]['roles'].get('admin', []):
-                all_groups[idx]['roles']['admin'].remove(target_user)
-            if target_user in all_groups[idx]['roles'].get('moderator', []):
-                all_groups[idx]['roles']['moderator'].remove(target_user)
-                
-            # Add to new role
-            if role == 'admin':
-                if 'admin' not in all_groups[idx]['roles']: all_groups[idx]['roles']['admin'] = []
-                all_groups[idx]['roles']['admin'].append(target_user)
-            elif role == 'moderator':
-                if 'moderator' not in all_groups[idx]['roles']: all_groups[idx]['roles']['moderator'] = []
-                all_groups[idx]['roles']['moderator'].append(target_user)
-            
-            save_groups(all_groups)
-            
-            emit('group_roles_updated', {
-                'groupId': group_id,
-                'roles': all_groups[idx]['roles']
-            }, room=group_id)
-            return
+    g = database.get_group(group_id)
+    # Only Owner can assign roles currently
+    if not g or g.get('owner') != requester:
+        return
+
+    # Replaces any existing role; 'member' just clears it
+    database.set_group_role(group_id, target_user, role)
+
+    emit('group_roles_updated', {
+        'groupId': group_id,
+        'roles': database.get_group(group_id)['roles']
+    }, room=group_id)
 
 @socketio.on('kick_user')
 def handle_kick_user(data):
@@ -3362,40 +3257,35 @@ def handle_kick_user(data):
     if not group_id or not requester or not target_user:
         return
 
-    all_groups = load_groups()
-    for idx, g in enumerate(all_groups):
-        if g.get('id') == group_id:
-            roles = g.get('roles', {})
-            is_owner = g.get('owner') == requester
-            is_admin = requester in roles.get('admin', [])
-            is_mod = requester in roles.get('moderator', [])
-            
-            target_is_owner = g.get('owner') == target_user
-            target_is_admin = target_user in roles.get('admin', [])
-            target_is_mod = target_user in roles.get('moderator', [])
-            
-            allowed = False
-            if is_owner:
-                allowed = True
-            elif is_admin:
-                allowed = not (target_is_owner or target_is_admin)
-            elif is_mod:
-                allowed = not (target_is_owner or target_is_admin or target_is_mod)
-                
-            if allowed and target_user in (g.get('members') or []):
-                all_groups[idx]['members'].remove(target_user)
-                
-                # Also remove from roles if present
-                if target_user in roles.get('admin', []): roles['admin'].remove(target_user)
-                if target_user in roles.get('moderator', []): roles['moderator'].remove(target_user)
-                
-                save_groups(all_groups)
-                
-                emit('user_kicked', {
-                    'groupId': group_id,
-                    'username': target_user
-                }, room=group_id)
-            return
+    g = database.get_group(group_id)
+    if not g:
+        return
+
+    roles = g.get('roles', {})
+    is_owner = g.get('owner') == requester
+    is_admin = requester in roles.get('admin', [])
+    is_mod = requester in roles.get('moderator', [])
+
+    target_is_owner = g.get('owner') == target_user
+    target_is_admin = target_user in roles.get('admin', [])
+    target_is_mod = target_user in roles.get('moderator', [])
+
+    allowed = False
+    if is_owner:
+        allowed = True
+    elif is_admin:
+        allowed = not (target_is_owner or target_is_admin)
+    elif is_mod:
+        allowed = not (target_is_owner or target_is_admin or target_is_mod)
+
+    if allowed and target_user in (g.get('members') or []):
+        # Also drops any roles the user held
+        database.remove_group_member(group_id, target_user)
+
+        emit('user_kicked', {
+            'groupId': group_id,
+            'username': target_user
+        }, room=group_id)
 
 @socketio.on('pin_message')
 def handle_pin_message(data):
@@ -3408,59 +3298,57 @@ def handle_pin_message(data):
     if not group_id or not channel_id or not msg_id or not username:
         return
 
-    all_groups = load_groups()
-    for idx, g in enumerate(all_groups):
-        if g.get('id') == group_id:
-            # Permissions: Owner, Admin, or Moderator can pin
-            roles = g.get('roles', {})
-            is_owner = g.get('owner') == username
-            is_admin = username in roles.get('admin', [])
-            is_mod = username in roles.get('moderator', [])
-            
-            if not(is_owner or is_admin or is_mod):
-                return # unauthorized
-            
-            channels = g.get('channels', [])
-            target_channel = next((c for c in channels if (c.get('id') == channel_id or c == channel_id)), None)
-            
-            if not target_channel or isinstance(target_channel, str):
-                # Basic string channels don't support pins yet, or upgrade them?
-                # For v1, let's skip strings or convert them.
-                # If it's a string, we can't easily attach pinned_messages without object conversion.
-                # Assuming objects for newer channels.
-                return 
-
-            if 'pinned_messages' not in target_channel:
-                target_channel['pinned_messages'] = []
-                
-            if action == 'pin':
-                if msg_id not in target_channel['pinned_messages']:
-                    target_channel['pinned_messages'].append(msg_id)
-            elif action == 'unpin':
-                 if msg_id in target_channel['pinned_messages']:
-                    target_channel['pinned_messages'].remove(msg_id)
-            
-            # Save
-            all_groups[idx]['channels'] = channels # (reference updated, but safe to be explicit)
-            save_groups(all_groups)
-            
-            # Emit update
-            emit('message_pinned_update', {
-                'groupId': group_id,
-                'channelId': channel_id,
-                'pinnedMessages': target_channel['pinned_messages']
-            }, room=group_id)
-            return
+    g = database.get_group(group_id)
+    if not g:
+        return
+
+    # Permissions: Owner, Admin, or Moderator can pin
+    roles = g.get('roles', {})
+    is_owner = g.get('owner') == username
+    is_admin = username in roles.get('admin', [])
+    is_mod = username in roles.get('moderator', [])
+
+    if not(is_owner or is_admin or is_mod):
+        return # unauthorized
+
+    channels = g.get('channels', [])
+    target_channel = next((c for c in channels if (c == channel_id or (isinstance(c, dict) and c.get('id') == channel_id))), None)
+
+    if not target_channel or isinstance(target_channel, str):
+        # Basic string channels don't support pins yet, or upgrade them?
+        # For v1, let's skip strings or convert them.
+        # If it's a string, we can't easily attach pinned_messages without object conversion.
+        # Assuming objects for newer channels.
+        return 
+
+    if 'pinned_messages' not in target_channel:
+        target_channel['pinned_messages'] = []
+
+    if action == 'pin':
+        if msg_id not in target_channel['pinned_messages']:
+            target_channel['pinned_messages'].append(msg_id)
+    elif action == 'unpin':
+        if msg_id in target_channel['pinned_messages']:
+            target_channel['pinned_messages'].remove(msg_id)
+
+    # Save
+    database.update_group_channel(group_id, target_channel)
+
+    # Emit update
+    emit('message_pinned_update', {
+        'groupId': group_id,
+        'channelId': channel_id,
+        'pinnedMessages': target_channel['pinned_messages']
+    }, room=group_id)
 
 @app.route('/api/groups/<group_id>/channels/<channel_id>/pins', methods=['GET'])
 def get_pinned_messages(group_id, channel_id):
-    all_groups = load_groups()
-    group = next((g for g in all_groups if g.get('id') == group_id), None)
+    group = database.get_group(group_id)
     if not group:
         return jsonify({"success": False, "error": "Group not found"}), 404
         
     channels = group.get('channels', [])
-    channel = next((c for c in channels if (c.get('id') == channel_id or c == channel_id)), None)
+    channel = next((c for c in channels if (c == channel_id or (isinstance(c, dict) and c.get('id') == channel_id))), None)
     
     if not channel or isinstance(channel, str):
          return jsonify({"success": True, "messages": []})
@@ -3469,10 +3357,8 @@ def get_pinned_messages(group_id, channel_id):
     if not pinned_ids:
         return jsonify({"success": True, "messages": []})
         
-    # Fetch actual messages from group['messages']
-    all_msgs = group.get('messages', [])
-    # Filter by IDs
-    found_msgs = [m for m in all_msgs if m.get('id') in pinned_ids]
+    # Fetch only the pinned rows
+    found_msgs = database.group_messages_by_ids(group_id, pinned_ids)
     
     # Sort by timestamp to keep order? Or keep pin order?
     # Usually pin order (insertion order in list) is preferred, but here we just return them.
@@ -3487,7 +3373,7 @@ def get_pinned_messages(group_id, channel_id):
 
 @socketio.on('message_reaction')
 def handle_message_reaction(data):
-    global messages, dms
+    global messages
     # Unified handler for DMs and Groups
     group_id = (data or {}).get('groupId')
     msg_id = (data or {}).get('messageId')
@@ -3500,37 +3386,32 @@ def handle_message_reaction(data):
         
     if group_id:
         # handle group reaction logic (reusing or duplicating logic for speed)
-        all_groups = load_groups()
-        for idx, g in enumerate(all_groups):
-            if g.get('id') == group_id:
-                group_msgs = g.get('messages', [])
-                # Find message by ID
-                target_msg = next((m for m in group_msgs if m.get('id') == msg_id), None)
-                if target_msg:
-                    if 'reactions' not in target_msg: target_msg['reactions'] = {}
-                    reactions = target_msg['reactions']
-                    
-                    if emoji not in reactions: reactions[emoji] = []
-                    
-                    if action == 'add':
-                        if username not in reactions[emoji]: reactions[emoji].append(username)
-                    else:
-                        if username in reactions[emoji]: reactions[emoji].remove(username)
-                        if not reactions[emoji]: del reactions[emoji]
-                    
-                    all_groups[idx]['messages'] = group_msgs
-                    save_groups(all_groups)
-                    
-                    # Emit (use socketio.emit to include the sender)
-                    socketio.emit('message_reaction_update', {
-                        'groupId': group_id,
-                        'messageId': msg_id,
-                        'reactions': reactions
-                    }, room=group_id)
-                return
+        # Find message by ID
+        seq, target_msg = database.group_message_by_id(group_id, msg_id)
+        if target_msg:
+            if 'reactions' not in target_msg: target_msg['reactions'] = {}
+            reactions = target_msg['reactions']
+            
+            if emoji not in reactions: reactions[emoji] = []
+            
+            if action == 'add':
+                if username not in reactions[emoji]: reactions[emoji].append(username)
+            else:
+                if username in reactions[emoji]: reactions[emoji].remove(username)
+                if not reactions[emoji]: del reactions[emoji]
+            
+            database.update_group_message(seq, target_msg)
+            
+            # Emit (use socketio.emit to include the sender)
+            socketio.emit('message_reaction_update', {
+                'groupId': group_id,
+                'messageId': msg_id,
+                'reactions': reactions
+            }, room=group_id)
+        return
     else:
         # Try Community messages first
-        target_msg = next((m for m in messages if m.get('id') == msg_id), None)
+        target_msg = message_log.by_id(msg_id)
         if target_msg:
             if 'reactions' not in target_msg: target_msg['reactions'] = {}
             reactions = target_msg['reactions']
@@ -3543,7 +3424,7 @@ def handle_message_reaction(data):
                 if username in reactions[emoji]: reactions[emoji].remove(username)
                 if not reactions[emoji]: del reactions[emoji]
 
-            save_messages(messages)
+            message_log.update(target_msg)
 
             # Broadcast to all connected clients
             socketio.emit('message_reaction_update', {
@@ -3553,7 +3434,7 @@ def handle_message_reaction(data):
             return
 
         # DM Reaction
-        target_msg = next((m for m in dms if m.get('id') == msg_id), None)
+        target_msg = dm_store.get(msg_id)
         if target_msg:
             if 'reactions' not in target_msg: target_msg['reactions'] = {}
             reactions = target_msg['reactions']
@@ -3566,7 +3447,7 @@ def handle_message_reaction(data):
                 if username in reactions[emoji]: reactions[emoji].remove(username)
                 if not reactions[emoji]: del reactions[emoji]
             
-            save_dms(dms)
+            dm_store.save_message(target_msg)
             
             # Emit to both sender and recipient
             sender = target_msg.get('from')
@@ -3586,27 +3467,18 @@ def handle_message_reaction(data):
 # ==========================================
 MOMENTS_FILE = os.path.join(DATA_DIR, 'moments.json')
 
+moments_store = JsonStore(MOMENTS_FILE)
+
 def load_moments():
-    if not os.path.exists(MOMENTS_FILE):
-        return []
-    try:
-        with open(MOMENTS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return []
+    return moments_store.load()
 
 def save_moments(data):
-    try:
-        with open(MOMENTS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4)
-    except Exception as e:
-        print(f"Error saving moments: {e}")
+    moments_store.save(data)
 
 @app.route('/api/moments', methods=['GET'])
 def get_moments():
-    moments = load_moments()
-    # Sort by timestamp desc
-    moments.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
+    # Sort by timestamp desc (a sorted copy; the list is the cached store)
+    moments = sorted(load_moments(), key=lambda x: x.get('timestamp', 0), reverse=True)
     return jsonify({"success": True, "moments": moments})
 
 @app.route('/api/moments', methods=['POST'])
@@ -3697,28 +3569,25 @@ def cloud_list():
 
 @app.route('/api/cloud/serve/<username>/<filename>')
 def serve_cloud_file(username, filename):
-    user_dir = os.path.join(CLOUD_DIR, username)
-    return send_from_directory(user_dir, filename)
+    return _send_upload(safe_join(CLOUD_DIR, username), filename)
 
 
 # ---------------- AI Chat Endpoints ---------------- #
 
-@app.route('/api/ai/chat', methods=['POST'])
-def ai_chat_endpoint():
-    data = request.json or {}
-    
+def _request_token(data):
     # 1. Try to get token from header
-    token = None
     auth_header = request.headers.get('Authorization')
     if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header.split(" ")[1]
-    
+        return auth_header.split(" ")[1]
     # 2. Fallback to body
-    if not token:
-        token = data.get("token")
-        
-    # 3. Validate
-    username = validate_session(token)
+    return data.get("token")
+
+@app.route('/api/ai/chat', methods=['POST'])
+def ai_chat_endpoint():
+    data = request.json or {}
+    
+    # Validate
+    username = validate_session(_request_token(data))
     
     # Allow guest/dev mode if configured, but for now strict
     # For development, if no token, check if we have a global dev user
@@ -3729,6 +3598,48 @@ def ai_chat_endpoint():
 
     return chat_handler.handle_chat_request(data, username)
 
+# Streamed replies: thinking and answer tokens as Ollama produces them (see chat_handler.stream_chat)
+@app.route('/api/ai/chat/stream', methods=['POST'])
+def ai_chat_stream():
+    data = request.get_json(silent=True) or {}
+    username = validate_session(_request_token(data))
+    chat, error = chat_handler.prepare_chat(data, username)
+    if error:
+        return jsonify({"success": False, "error": error[0]}), error[1]
+    events = (chat_handler.sse_event(event) for event in chat_handler.stream_chat(chat, username))
+    return Response(events, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Same stream over Socket.IO: "ai_stream" events go to the requesting socket only.
+# (sid, requestId) -> Event set by ai_chat_cancel or a disconnect
+ai_streams = {}
+
+def _run_ai_stream(chat, username, sid, request_id, cancelled):
+    try:
+        for event in chat_handler.stream_chat(chat, username, cancelled):
+            socketio.emit('ai_stream', dict(event, requestId=request_id), to=sid)
+    finally:
+        ai_streams.pop((sid, request_id), None)
+
+@socketio.on('ai_chat_stream')
+def handle_ai_chat_stream(data):
+    data = data or {}
+    request_id = str(data.get('requestId') or uuid.uuid4())
+    username = validate_session(data.get('token'))
+    chat, error = chat_handler.prepare_chat(data, username)
+    if error:
+        emit('ai_stream', {'type': 'error', 'error': error[0], 'requestId': request_id})
+        return
+    cancelled = threading.Event()
+    ai_streams[(request.sid, request_id)] = cancelled
+    socketio.start_background_task(_run_ai_stream, chat, username, request.sid, request_id, cancelled)
+
+@socketio.on('ai_chat_cancel')
+def handle_ai_chat_cancel(data):
+    cancelled = ai_streams.get((request.sid, str((data or {}).get('requestId'))))
+    if cancelled:
+        cancelled.set()
+
 @app.route('/api/ai/models', methods=['GET'])
 def ai_models_endpoint():
     return chat_handler.get_available_models()
@@ -3737,17 +3648,18 @@ def ai_models_endpoint():
 def ai_status_endpoint():
     return chat_handler.check_service_status()
 
+# Icons are served from a local store, filled from unpkg on first use or
+# up front by scripts/prewarm_heroicons.py (see icon_cache.py)
+heroicons = IconCache(os.path.join(DATA_DIR, 'icons'))
+
 @app.route('/api/proxy/heroicons/<path:filename>')
 def serve_heroicon_proxy(filename):
-    try:
-        url = f"https://unpkg.com/heroicons@2.0.18/24/outline/{filename}"
-        resp = requests.get(url, timeout=5)
-        if resp.status_code == 200:
-            return (resp.content, 200, {'Content-Type': 'image/svg+xml', 'Cache-Control': 'public, max-age=86400'})
+    data = heroicons.get(filename)
+    if data is None:
         return jsonify({"error": "Icon not found"}), 404
-    except Exception as e:
-        print(f"Proxy error: {e}")
-        return jsonify({"error": str(e)}), 500
+    response = Response(data, mimetype='image/svg+xml', headers={'Cache-Control': 'public, max-age=86400'})
+    response.add_etag()
+    return response.make_conditional(request)
 
 # Run the app (IMPORTANT: Use socketio.run to enable Socket.IO support)
 if __name__ == "__main__":
@@ -0,0 +1,148 @@
+import base64
+import hashlib
+import mimetypes
+import os
+import tempfile
+from typing import Optional, Tuple
+
+# Content-addressed attachment storage.
+#
+# Attachments used to travel and persist as base64 data URLs inside the
+# message itself, so every history load, save and response carried them.
+# Now an upload is decoded once and written to <dir>/<sha[:2]>/<sha>, named by
+# the SHA-256 of its bytes, so identical files are stored once. The message
+# keeps only a reference: `fileData`/`url` point at /blobs/<sha>.<ext>, which
+# is immutable and therefore cacheable forever, and `blob` holds the hash.
+#
+# The content type a blob is served with comes from its own bytes, never from
+# the URL or the uploader's file name: sniff_type() recognises common image,
+# audio and video formats, everything else is application/octet-stream. The
+# result is kept next to the blob in <sha>.type.
+
+BLOB_URL_PREFIX = '/blobs/'
+SNIFF_BYTES = 32
+
+
+def sniff_type(head: bytes) -> str:
+    """Media type of a file from its first bytes, for formats safe to show inline."""
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'audio/wav'
+    if head[4:8] == b'ftyp':
+        brand = head[8:12]
+        if brand in (b'heic', b'heix', b'mif1'):
+            return 'image/heic'
+        if brand == b'M4A ':
+            return 'audio/mp4'
+        return 'video/quicktime' if brand == b'qt  ' else 'video/mp4'
+    if head.startswith(b'\x1aE\xdf\xa3'):
+        return 'video/webm'
+    if head.startswith(b'OggS'):
+        return 'audio/ogg'
+    if head.startswith(b'fLaC'):
+        return 'audio/flac'
+    if head.startswith(b'ID3') or head[:2] in (b'\xff\xfb', b'\xff\xf3', b'\xff\xf2'):
+        return 'audio/mpeg'
+    return 'application/octet-stream'
+
+
+def parse_data_url(data_url: str) -> Tuple[str, bytes]:
+    """Split a base64 data URL into (mime type, bytes). Raises ValueError if it isn't one."""
+    if not isinstance(data_url, str) or not data_url.startswith('data:') or ',' not in data_url:
+        raise ValueError('not a data URL')
+    header, encoded = data_url.split(',', 1)
+    if ';base64' not in header:
+        raise ValueError('only base64 data URLs are supported')
+    mime = header[5:].split(';', 1)[0] or 'application/octet-stream'
+    return mime, base64.b64decode(encoded)
+
+
+def extension_for(mime: str, filename: Optional[str] = None) -> str:
+    if filename and '.' in filename:
+        return filename.rsplit('.', 1)[1].lower()
+    ext = mimetypes.guess_extension(mime or '') or '.bin'
+    return {'.jpe': 'jpg', '.jpeg': 'jpg'}.get(ext, ext.lstrip('.'))
+
+
+class BlobStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, sha: str) -> str:
+        return os.path.join(self.directory, sha[:2], sha)
+
+    def exists(self, sha: str) -> bool:
+        return os.path.exists(self.path(sha))
+
+    def content_type(self, sha: str) -> str:
+        """The type recorded when the blob was stored (sniffed now for blobs older than that)."""
+        try:
+            with open(self.path(sha) + '.type', 'r', encoding='ascii') as f:
+                return f.read().strip()
+        except (OSError, ValueError):
+            pass
+        with open(self.path(sha), 'rb') as f:
+            return self._record_type(sha, f.read(SNIFF_BYTES))
+
+    def _record_type(self, sha: str, head: bytes) -> str:
+        mime = sniff_type(head)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path(sha)), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='ascii') as f:
+            f.write(mime)
+        os.replace(tmp, self.path(sha) + '.type')
+        return mime
+
+    def put(self, data: bytes) -> str:
+        """Store bytes and return their SHA-256; a blob that already exists is not rewritten."""
+        sha = hashlib.sha256(data).hexdigest()
+        path = self.path(sha)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._record_type(sha, data[:SNIFF_BYTES])
+        return sha
+
+    def put_file(self, tmp_path: str, sha: str) -> str:
+        """Adopt an already hashed temp file (streamed uploads); drops it if the blob exists."""
+        path = self.path(sha)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            with open(path, 'rb') as f:
+                self._record_type(sha, f.read(SNIFF_BYTES))
+        return sha
+
+    def url(self, sha: str, ext: str = 'bin') -> str:
+        return f"{BLOB_URL_PREFIX}{sha}.{ext}"
+
+    def externalize(self, msg: dict, field: str = 'fileData') -> bool:
+        """Move an inline data URL out of `msg` into the store. Returns True if the message changed."""
+        value = msg.get(field) if msg else None
+        try:
+            mime, data = parse_data_url(value)
+        except (ValueError, TypeError) as e:
+            if isinstance(value, str) and value.startswith('data:'):
+                print(f"Could not decode inline attachment: {e}")
+            return False
+        sha = self.put(data)
+        ref = self.url(sha, extension_for(mime, msg.get('fileName')))
+        msg[field] = ref
+        msg['url'] = ref
+        msg['blob'] = sha
+        msg['fileSize'] = len(data)
+        if not msg.get('fileType'):
+            msg['fileType'] = mime
+        return True
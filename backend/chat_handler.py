@@ -1,4 +1,7 @@
+import json
+import os
 import time
+from collections import deque
 from flask import jsonify
 from ai.model_manager import model_manager
 from ai import memory
@@ -53,12 +56,16 @@ def get_cache_key(model, messages, system_prompt):
     }
     return json.dumps(key_data, sort_keys=True)
 
-def handle_chat_request(data, username):
+def prepare_chat(data, username):
+    """Check a chat request and build its prompt.
+
+    Returns (chat, None), or (None, (error, status)) if the request can't be served.
+    """
     if not username:
-        return jsonify({"success": False, "error": "Authentication required"}), 401
+        return None, ("Authentication required", 401)
         
     if not check_rate_limit(username):
-        return jsonify({"success": False, "error": "Rate limit exceeded. Please wait."}), 429
+        return None, ("Rate limit exceeded. Please wait.", 429)
 
     message = data.get("message")
     messages = data.get("messages", [])
@@ -68,7 +75,7 @@ def handle_chat_request(data, username):
         messages = [{"role": "user", "content": message}]
         
     if not messages:
-        return jsonify({"success": False, "error": "No message provided"}), 400
+        return None, ("No message provided", 400)
 
     persona_key = data.get("persona", "diszi")
     mode_key = data.get("mode", "default")
@@ -100,23 +107,49 @@ def handle_chat_request(data, username):
         print(f"Memory load error: {e}")
     # ---------------------------------------------------------
 
+    return {
+        "model": model,
+        "messages": messages,
+        "system_prompt": system_prompt,
+        "cache_key": get_cache_key(model, messages, system_prompt)
+    }, None
+
+def remember_reply(username, chat, content):
+    """Save a finished reply to the user's conversation memory and the response cache."""
+    try:
+        # Append the new interaction to history
+        new_interaction = list(chat["messages"]) + [{"role": "assistant", "content": content}]
+        memory.append_conversation(username, new_interaction)
+    except Exception as e:
+        print(f"Memory save error: {e}")
+
+    # Update Cache
+    if len(RESPONSE_CACHE) > 100:
+        RESPONSE_CACHE.pop(next(iter(RESPONSE_CACHE))) # Remove oldest
+    RESPONSE_CACHE[chat["cache_key"]] = content
+
+def handle_chat_request(data, username):
+    chat, error = prepare_chat(data, username)
+    if error:
+        return jsonify({"success": False, "error": error[0]}), error[1]
+    model = chat["model"]
+
     # Check Cache
-    cache_key = get_cache_key(model, messages, system_prompt)
-    if cache_key in RESPONSE_CACHE:
+    if chat["cache_key"] in RESPONSE_CACHE:
         return jsonify({
             "success": True, 
-            "reply": RESPONSE_CACHE[cache_key],
+            "reply": RESPONSE_CACHE[chat["cache_key"]],
             "model": model,
             "cached": True
         })
     
-    # Call Model Manager
+    # Call Model Manager (stream_chat below is the streaming variant)
     try:
         response = model_manager.generate_response(
             model=model,
-            messages=messages,
-            system_prompt=system_prompt,
-            stream=False # Streaming not yet supported in this handler wrapper
+            messages=chat["messages"],
+            system_prompt=chat["system_prompt"],
+            stream=False
         )
         
         if "error" in response:
@@ -132,18 +165,7 @@ def handle_chat_request(data, username):
             if thinking and thinking.strip():
                 content = f"<think>{thinking.strip()}</think>\n\n{content}"
             
-            # Save to Memory (Conversation History)
-            try:
-                # Append the new interaction to history
-                new_interaction = list(messages) + [{"role": "assistant", "content": content}]
-                memory.append_conversation(username, new_interaction)
-            except Exception as e:
-                print(f"Memory save error: {e}")
-
-            # Update Cache
-            if len(RESPONSE_CACHE) > 100:
-                RESPONSE_CACHE.pop(next(iter(RESPONSE_CACHE))) # Remove oldest
-            RESPONSE_CACHE[cache_key] = content
+            remember_reply(username, chat, content)
             
             return jsonify({
                 "success": True, 
@@ -157,6 +179,181 @@ def handle_chat_request(data, username):
         print(f"Chat Handler Error: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# ---------------------------------------------------------
+# STREAMING
+# ---------------------------------------------------------
+# stream_chat() forwards the reply as Ollama produces it, as a series of events:
+#   {"type": "thinking", "text": ...}   reasoning (Ollama's "thinking" field or inline <think> tags)
+#   {"type": "answer", "text": ...}     the reply itself
+#   {"type": "done", ...}               timings: ttft_ms (first token of either kind),
+#                                       first_answer_ms, total_ms
+#   {"type": "error", "error": ...}
+# app.py sends them over Server-Sent Events (/api/ai/chat/stream) or Socket.IO (ai_chat_stream).
+
+# (connect, read between chunks) seconds; a thinking model streams steadily, so
+# a long gap means Ollama is stuck rather than busy
+STREAM_TIMEOUT = (5, float(os.getenv('Zylo_AI_STREAM_READ_TIMEOUT', '120')))
+
+stream_counters = {"streams": 0, "cached": 0, "errors": 0, "cancelled": 0}
+# Recent time-to-first-token samples (ms), for stream_stats()
+ttft_samples = deque(maxlen=200)
+
+class ThinkSplitter:
+    """Split streamed content on inline <think>...</think> tags, even when a tag spans chunks."""
+    OPEN, CLOSE = "<think>", "</think>"
+
+    def __init__(self):
+        self.inside = False
+        self._buf = ""
+
+    def feed(self, text):
+        self._buf += text
+        out = []
+        while self._buf:
+            kind = "thinking" if self.inside else "answer"
+            tag = self.CLOSE if self.inside else self.OPEN
+            i = self._buf.find(tag)
+            if i >= 0:
+                if i:
+                    out.append((kind, self._buf[:i]))
+                self._buf = self._buf[i + len(tag):]
+                self.inside = not self.inside
+                continue
+            # Hold back a trailing "<thi" that may be the start of a tag
+            keep = next((k for k in range(len(tag) - 1, 0, -1) if self._buf.endswith(tag[:k])), 0)
+            if len(self._buf) > keep:
+                out.append((kind, self._buf[:len(self._buf) - keep]))
+                self._buf = self._buf[len(self._buf) - keep:]
+            break
+        return out
+
+    def flush(self):
+        out = [("thinking" if self.inside else "answer", self._buf)] if self._buf else []
+        self._buf = ""
+        return out
+
+def _ms(start, end):
+    return round((end - start) * 1000, 1) if end is not None else None
+
+def stream_chat(chat, username, cancelled=None):
+    """Generate stream events for a chat from prepare_chat(). Stops early if `cancelled` (an Event) is set."""
+    model = chat["model"]
+    started = time.monotonic()
+    stream_counters["streams"] += 1
+
+    cached = RESPONSE_CACHE.get(chat["cache_key"])
+    if cached is not None:
+        stream_counters["cached"] += 1
+        splitter = ThinkSplitter()
+        seen = set()
+        for kind, text in splitter.feed(cached) + splitter.flush():
+            if kind not in seen:
+                text = text.lstrip()
+            if text:
+                seen.add(kind)
+                yield {"type": kind, "text": text}
+        yield {"type": "done", "model": model, "cached": True, "ttft_ms": _ms(started, time.monotonic())}
+        return
+
+    response = model_manager.generate_response(
+        model=model,
+        messages=chat["messages"],
+        system_prompt=chat["system_prompt"],
+        stream=True,
+        timeout=STREAM_TIMEOUT
+    )
+    if isinstance(response, dict):
+        stream_counters["errors"] += 1
+        error = response.get("error", "Invalid response from model")
+        if "404" in error:
+            error = f"Model '{model}' not found. Please run 'ollama pull {model}' in your terminal."
+        yield {"type": "error", "error": error}
+        return
+
+    parts = {"thinking": [], "answer": []}
+    first_token = first_answer = None
+    final = {}
+    splitter = ThinkSplitter()
+    try:
+        for chunk in model_manager.iter_stream(response):
+            if cancelled is not None and cancelled.is_set():
+                break
+            if "error" in chunk:
+                stream_counters["errors"] += 1
+                yield {"type": "error", "error": chunk["error"]}
+                return
+            message = chunk.get("message") or {}
+            pieces = []
+            if message.get("thinking"):
+                pieces.append(("thinking", message["thinking"]))
+            if message.get("content"):
+                pieces.extend(splitter.feed(message["content"]))
+            if chunk.get("done"):
+                pieces.extend(splitter.flush())
+                final = chunk
+            for kind, text in pieces:
+                if not parts[kind]:
+                    # Drop the whitespace models put around their reasoning
+                    text = text.lstrip()
+                    if not text:
+                        continue
+                now = time.monotonic()
+                if first_token is None:
+                    first_token = now
+                if kind == "answer" and first_answer is None:
+                    first_answer = now
+                parts[kind].append(text)
+                yield {"type": kind, "text": text}
+            if final:
+                break
+        else:
+            raise ValueError("Stream ended before the reply did")
+    except GeneratorExit:
+        # The SSE client went away
+        stream_counters["cancelled"] += 1
+        raise
+    except Exception as e:
+        print(f"Chat stream error ({model}): {e}")
+        stream_counters["errors"] += 1
+        yield {"type": "error", "error": str(e)}
+        return
+    finally:
+        # Closing the connection makes Ollama stop generating
+        response.close()
+
+    if not final:
+        stream_counters["cancelled"] += 1
+        return
+    thinking = "".join(parts["thinking"]).strip()
+    content = "".join(parts["answer"])
+    if thinking:
+        content = f"<think>{thinking}</think>\n\n{content}"
+    remember_reply(username, chat, content)
+
+    if first_token is not None:
+        ttft_samples.append(_ms(started, first_token))
+    yield {
+        "type": "done",
+        "model": final.get("model", model),
+        "cached": False,
+        "ttft_ms": _ms(started, first_token),
+        "first_answer_ms": _ms(started, first_answer),
+        "total_ms": _ms(started, time.monotonic()),
+        "eval_count": final.get("eval_count")
+    }
+
+def sse_event(event):
+    """Format a stream event as a Server-Sent Events message."""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+def stream_stats():
+    samples = sorted(ttft_samples)
+    stats = dict(stream_counters)
+    if samples:
+        stats["ttft_ms_p50"] = samples[len(samples) // 2]
+        stats["ttft_ms_p95"] = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return stats
+
 def get_available_models():
     # In a real app, query Ollama for available models
     # For now, return a static list or query model_manager if it supports it
@@ -0,0 +1,229 @@
+import base64
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+import json_codec
+
+# Streaming uploads for My Cloud.
+#
+# Uploads are copied to a temp file in fixed-size pieces while being hashed, so
+# neither the multipart path nor the legacy data-URL path ever holds a whole
+# decoded file (let alone the file plus its base64 form) in memory. The caller
+# gets back (temp path, sha256, size) and decides where the file ends up.
+#
+# Large files can also be sent in chunks: start a session, PUT each chunk at
+# its offset, and ask for the session to learn how much arrived after a
+# dropped connection. Session metadata sits next to the partial file, so an
+# upload can resume across a server restart.
+
+CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_BYTES = 8 * 1024 * 1024
+# Abandoned chunked uploads are removed after this long without activity
+SESSION_TTL = 24 * 3600
+
+
+def _new_temp(directory: str):
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=directory, suffix='.part')
+    return os.fdopen(fd, 'wb'), path
+
+
+def stream_to_file(stream, directory: str, max_bytes: Optional[int] = None) -> Tuple[str, str, int]:
+    """Copy a file-like object to a temp file while hashing it. Returns (path, sha256, size)."""
+    hasher = hashlib.sha256()
+    size = 0
+    f, path = _new_temp(directory)
+    try:
+        with f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise ValueError('File too large')
+                hasher.update(chunk)
+                f.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, hasher.hexdigest(), size
+
+
+def data_url_to_file(data_url: str, directory: str, max_bytes: Optional[int] = None) -> Tuple[str, str, int]:
+    """Decode a base64 data URL to a temp file a slice at a time. Returns (path, sha256, size)."""
+    encoded = data_url.split(',', 1)[1] if ',' in data_url else data_url
+    hasher = hashlib.sha256()
+    size = 0
+    # A multiple of 4 characters always decodes on its own
+    step = CHUNK_SIZE // 3 * 4
+    f, path = _new_temp(directory)
+    try:
+        with f:
+            for start in range(0, len(encoded), step):
+                chunk = base64.b64decode(encoded[start:start + step])
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise ValueError('File too large')
+                hasher.update(chunk)
+                f.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, hasher.hexdigest(), size
+
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class ChunkedUploads:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # Guards the two dicts below only; never held while reading a request body
+        self._lock = threading.Lock()
+        # upload id -> lock held while that upload's chunk is written, finished or aborted
+        self._upload_locks: Dict[str, threading.Lock] = {}
+        # upload id -> (hasher, bytes hashed); lost on restart, then finish() rehashes
+        self._hashers: Dict[str, tuple] = {}
+
+    def _meta_path(self, upload_id: str) -> str:
+        return os.path.join(self.directory, f"{upload_id}.json")
+
+    def _data_path(self, upload_id: str) -> str:
+        return os.path.join(self.directory, f"{upload_id}.chunks")
+
+    def _save_meta(self, session: dict) -> None:
+        tmp = self._meta_path(session['uploadId']) + '.tmp'
+        json_codec.dump_file(tmp, session)
+        os.replace(tmp, self._meta_path(session['uploadId']))
+
+    def _upload_lock(self, upload_id: str) -> threading.Lock:
+        with self._lock:
+            return self._upload_locks.setdefault(upload_id, threading.Lock())
+
+    def _forget(self, upload_id: str) -> None:
+        with self._lock:
+            self._upload_locks.pop(upload_id, None)
+            self._hashers.pop(upload_id, None)
+
+    def start(self, username: str, file_name: str, file_type: str, size: int) -> dict:
+        self.sweep()
+        upload_id = uuid.uuid4().hex
+        session = {
+            'uploadId': upload_id,
+            'username': username,
+            'fileName': file_name,
+            'fileType': file_type,
+            'size': size,
+            'received': 0,
+            'updatedAt': time.time(),
+        }
+        open(self._data_path(upload_id), 'wb').close()
+        self._save_meta(session)
+        with self._lock:
+            self._hashers[upload_id] = (hashlib.sha256(), 0)
+        return session
+
+    def get(self, upload_id: str) -> Optional[dict]:
+        if not upload_id or not upload_id.isalnum():
+            return None
+        try:
+            return json_codec.load_file(self._meta_path(upload_id))
+        except (OSError, ValueError):
+            return None
+
+    def write(self, upload_id: str, offset: int, stream, length: int) -> dict:
+        """Append one chunk at `offset`. A chunk that was already received is acknowledged and skipped."""
+        if length > MAX_CHUNK_BYTES:
+            raise ValueError('Chunk too large')
+        if self.get(upload_id) is None:
+            raise KeyError(upload_id)
+        # Only this upload waits while a slow client sends its chunk
+        with self._upload_lock(upload_id):
+            session = self.get(upload_id)
+            if session is None:
+                raise KeyError(upload_id)
+            if offset + length <= session['received']:
+                # Retry of a chunk we already have
+                return session
+            if offset != session['received']:
+                raise ValueError(f"Expected offset {session['received']}")
+            if offset + length > session['size']:
+                raise ValueError('Chunk runs past the declared size')
+            with self._lock:
+                hasher, hashed = self._hashers.get(upload_id, (None, 0))
+            if hashed != offset:
+                hasher = None
+            written = 0
+            with open(self._data_path(upload_id), 'r+b') as f:
+                f.seek(offset)
+                while written < length:
+                    chunk = stream.read(min(CHUNK_SIZE, length - written))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    written += len(chunk)
+                f.truncate(offset + written)
+            session['received'] = offset + written
+            session['updatedAt'] = time.time()
+            self._save_meta(session)
+            with self._lock:
+                if hasher is not None:
+                    self._hashers[upload_id] = (hasher, session['received'])
+                else:
+                    self._hashers.pop(upload_id, None)
+            return session
+
+    def finish(self, upload_id: str) -> Tuple[dict, str, str]:
+        """Close a complete session. Returns (session, file path, sha256); the caller owns the file."""
+        with self._upload_lock(upload_id):
+            session = self.get(upload_id)
+            if session is None:
+                raise KeyError(upload_id)
+            if session['received'] != session['size']:
+                raise ValueError('Upload incomplete')
+            with self._lock:
+                hasher, hashed = self._hashers.get(upload_id, (None, 0))
+            path = self._data_path(upload_id)
+            sha = hasher.hexdigest() if hasher is not None and hashed == session['size'] else file_sha256(path)
+            os.remove(self._meta_path(upload_id))
+        self._forget(upload_id)
+        return session, path, sha
+
+    def abort(self, upload_id: str, blocking: bool = True) -> bool:
+        """Drop an upload. With blocking=False, leave it alone if a chunk is being written."""
+        lock = self._upload_lock(upload_id)
+        if not lock.acquire(blocking):
+            return False
+        try:
+            for path in (self._meta_path(upload_id), self._data_path(upload_id)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        finally:
+            lock.release()
+        self._forget(upload_id)
+        return True
+
+    def sweep(self) -> None:
+        """Drop sessions idle for longer than SESSION_TTL."""
+        cutoff = time.time() - SESSION_TTL
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                session = self.get(name[:-5])
+                if session and session.get('updatedAt', 0) < cutoff:
+                    self.abort(session['uploadId'], blocking=False)
@@ -1,6 +1,10 @@
 import sqlite3
-import json
 import os
+import threading
+
+import json_codec
+import message_index
+from message_index import GROUP
 
 # ***THIS DATABASE MODULE IS STILL UNDER DEVELOPMENT***
 # It's hasen't been fully tested yet, so use with caution.
@@ -12,16 +16,34 @@ import os
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 DB_PATH = os.path.join(DATA_DIR, 'users.db')
 JSON_PATH = os.path.join(DATA_DIR, 'users.json')
+GROUPS_JSON_PATH = os.path.join(DATA_DIR, 'groups.json')
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# One long-lived connection per thread for the hot paths (groups)
+_local = threading.local()
+
 def get_connection():
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = sqlite3.connect(DB_PATH, timeout=10)
+        # WAL lets readers keep going while a writer commits
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
         return conn
     except Exception as e:
         print("DB error:", e)
         return None
 
+def _conn():
+    """Return this thread's cached connection, opening it on first use."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = get_connection()
+        if conn is None:
+            raise RuntimeError("Database unavailable")
+        conn.row_factory = sqlite3.Row
+        _local.conn = conn
+    return conn
+
 def init_db():
     conn = get_connection()
     if conn:
@@ -37,6 +59,7 @@ def init_db():
                     aboutMe TEXT
                 )
             ''')
+            _create_group_tables(conn)
             conn.commit()
         except Exception as e:
             print("Error initializing DB:", e)
@@ -67,13 +90,393 @@ def save_user_json(user):
     if os.path.exists(JSON_PATH):
         with open(JSON_PATH, 'r') as f:
             try:
-                users = json.load(f)
+                users = json_codec.loads(f.read())
             except Exception:
                 users = []
     users = [u for u in users if u['username'] != user['username']]
     users.append(user)
     with open(JSON_PATH, 'w') as f:
-        json.dump(users, f, indent=2)
+        f.write(json_codec.dumps(users))
+
+# ---------------- Groups ---------------- #
+# Groups used to live in one groups.json that was parsed and rewritten on
+# every action. Each piece now has its own table so a reaction or a new
+# message only touches the affected row. Group metadata (members, roles,
+# channels) is assembled without message history; messages are read one
+# channel at a time through the (group_id, channel, seq) index.
+
+# Top-level group keys that have their own column; anything else is kept in `extra`
+GROUP_COLUMNS = ('id', 'name', 'description', 'owner', 'icon', 'createdAt')
+GROUP_NESTED = ('members', 'channels', 'roles', 'messages')
+
+def _create_group_tables(conn):
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS groups (
+            id TEXT PRIMARY KEY,
+            name TEXT,
+            description TEXT,
+            owner TEXT,
+            icon TEXT,
+            created_at INTEGER,
+            extra TEXT
+        );
+        CREATE TABLE IF NOT EXISTS group_channels (
+            group_id TEXT NOT NULL,
+            channel_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (group_id, channel_id)
+        );
+        CREATE TABLE IF NOT EXISTS group_members (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id TEXT NOT NULL,
+            username TEXT NOT NULL,
+            UNIQUE (group_id, username)
+        );
+        CREATE INDEX IF NOT EXISTS idx_group_members_user ON group_members (username);
+        CREATE TABLE IF NOT EXISTS group_roles (
+            group_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            username TEXT NOT NULL,
+            PRIMARY KEY (group_id, role, username)
+        );
+        CREATE TABLE IF NOT EXISTS group_messages (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id TEXT NOT NULL,
+            channel TEXT NOT NULL,
+            msg_id TEXT,
+            ts INTEGER,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_group_messages_channel ON group_messages (group_id, channel, seq);
+        CREATE INDEX IF NOT EXISTS idx_group_messages_id ON group_messages (group_id, msg_id);
+        CREATE INDEX IF NOT EXISTS idx_group_messages_ts ON group_messages (group_id, ts);
+    ''')
+
+def _encode(obj):
+    # Row payloads are always compact, whatever Zylo_JSON_PRETTY says
+    return json_codec.dumps(obj, pretty=False)
+
+def _channel_key(channel):
+    # Older groups stored channels as plain strings
+    return channel.get('id') if isinstance(channel, dict) else str(channel)
+
+def _message_ts(msg):
+    ts = msg.get('timestamp')
+    return msg.get('ts') if ts is None else ts
+
+def _insert_message(conn, group_id, msg):
+    cur = conn.execute(
+        'INSERT INTO group_messages (group_id, channel, msg_id, ts, data) VALUES (?, ?, ?, ?, ?)',
+        (group_id, msg.get('channel') or 'general', msg.get('id'), _message_ts(msg), _encode(msg))
+    )
+    message_index.index.add(msg.get('id'), GROUP, group_id, cur.lastrowid)
+    return cur.lastrowid
+
+def _load_message_index(conn):
+    for r in conn.execute('SELECT msg_id, group_id, seq FROM group_messages WHERE msg_id IS NOT NULL'):
+        message_index.index.add(r['msg_id'], GROUP, r['group_id'], r['seq'])
+
+def _insert_group(conn, group):
+    extra = {k: v for k, v in group.items() if k not in GROUP_COLUMNS and k not in GROUP_NESTED}
+    conn.execute(
+        'INSERT INTO groups (id, name, description, owner, icon, created_at, extra) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (group['id'], group.get('name'), group.get('description'), group.get('owner'),
+         group.get('icon'), group.get('createdAt'), _encode(extra) if extra else None)
+    )
+    for pos, ch in enumerate(group.get('channels') or []):
+        try:
+            conn.execute(
+                'INSERT INTO group_channels (group_id, channel_id, position, data) VALUES (?, ?, ?, ?)',
+                (group['id'], _channel_key(ch), pos, _encode(ch))
+            )
+        except sqlite3.IntegrityError:
+            # Keep the first channel with a given id rather than overwriting it
+            print(f"Skipping duplicate channel id {_channel_key(ch)!r} in group {group['id']}")
+    for member in group.get('members') or []:
+        conn.execute('INSERT OR IGNORE INTO group_members (group_id, username) VALUES (?, ?)', (group['id'], member))
+    for role, names in (group.get('roles') or {}).items():
+        for name in names or []:
+            conn.execute('INSERT OR IGNORE INTO group_roles (group_id, role, username) VALUES (?, ?, ?)',
+                         (group['id'], role, name))
+    for msg in group.get('messages') or []:
+        _insert_message(conn, group['id'], msg)
+
+def _assemble_group(conn, row, with_messages=False):
+    gid = row['id']
+    group = {
+        'id': gid,
+        'name': row['name'],
+        'description': row['description'],
+        'owner': row['owner'],
+        'icon': row['icon'],
+        'createdAt': row['created_at'],
+    }
+    if row['extra']:
+        group.update(json_codec.loads(row['extra']))
+    group['members'] = [r['username'] for r in conn.execute(
+        'SELECT username FROM group_members WHERE group_id = ? ORDER BY id', (gid,))]
+    group['channels'] = [json_codec.loads(r['data']) for r in conn.execute(
+        'SELECT data FROM group_channels WHERE group_id = ? ORDER BY position', (gid,))]
+    roles = {'admin': [], 'moderator': []}
+    for r in conn.execute('SELECT role, username FROM group_roles WHERE group_id = ? ORDER BY rowid', (gid,)):
+        roles.setdefault(r['role'], []).append(r['username'])
+    group['roles'] = roles
+    if with_messages:
+        group['messages'] = [json_codec.loads(r['data']) for r in conn.execute(
+            'SELECT data FROM group_messages WHERE group_id = ? ORDER BY seq', (gid,))]
+    return group
+
+def _migrate_groups_json(conn):
+    """Import a legacy groups.json once, then move it aside."""
+    if not os.path.exists(GROUPS_JSON_PATH):
+        return
+    if conn.execute('SELECT 1 FROM groups LIMIT 1').fetchone():
+        return
+    try:
+        with open(GROUPS_JSON_PATH, 'r', encoding='utf-8') as f:
+            legacy = json_codec.loads(f.read())
+    except Exception as e:
+        print("Could not read groups.json for migration:", e)
+        return
+    migrated = 0
+    with conn:
+        for g in legacy or []:
+            if not g.get('id'):
+                continue
+            # One bad legacy row (e.g. a duplicate group id) must not stop startup
+            conn.execute('SAVEPOINT legacy_group')
+            try:
+                _insert_group(conn, g)
+            except sqlite3.IntegrityError as e:
+                conn.execute('ROLLBACK TO legacy_group')
+                print(f"Skipping legacy group {g.get('id')!r} during migration: {e}")
+            else:
+                migrated += 1
+            conn.execute('RELEASE legacy_group')
+    try:
+        os.replace(GROUPS_JSON_PATH, GROUPS_JSON_PATH + '.migrated')
+    except Exception:
+        pass
+    print(f"Migrated {migrated} groups from groups.json to SQLite")
+
+def load_groups(with_messages=False):
+    """Return every group as the legacy dict shape."""
+    conn = _conn()
+    rows = conn.execute('SELECT * FROM groups ORDER BY rowid').fetchall()
+    return [_assemble_group(conn, r, with_messages) for r in rows]
+
+def count_groups():
+    return _conn().execute('SELECT COUNT(*) FROM groups').fetchone()[0]
+
+def group_exists(group_id):
+    return _conn().execute('SELECT 1 FROM groups WHERE id = ?', (group_id,)).fetchone() is not None
+
+def is_group_member(group_id, username):
+    """Owner or member check that reads neither channels nor message history."""
+    return _conn().execute('''
+        SELECT 1 FROM groups WHERE id = ? AND owner = ?
+        UNION ALL
+        SELECT 1 FROM group_members WHERE group_id = ? AND username = ?
+        LIMIT 1
+    ''', (group_id, username, group_id, username)).fetchone() is not None
+
+def group_peers(username):
+    """Everyone sharing at least one group with the user, owners included."""
+    rows = _conn().execute('''
+        WITH mine AS (
+            SELECT group_id FROM group_members WHERE username = ?
+            UNION SELECT id FROM groups WHERE owner = ?
+        )
+        SELECT username FROM group_members WHERE group_id IN mine
+        UNION SELECT owner FROM groups WHERE id IN mine
+    ''', (username, username)).fetchall()
+    return {r[0] for r in rows if r[0] != username}
+
+def get_group(group_id, with_messages=False):
+    conn = _conn()
+    row = conn.execute('SELECT * FROM groups WHERE id = ?', (group_id,)).fetchone()
+    return _assemble_group(conn, row, with_messages) if row else None
+
+def list_groups_for(username, with_messages=False):
+    """Groups where the user is the owner or a member."""
+    conn = _conn()
+    rows = conn.execute('''
+        SELECT * FROM groups WHERE owner = ?
+        OR id IN (SELECT group_id FROM group_members WHERE username = ?)
+        ORDER BY rowid
+    ''', (username, username)).fetchall()
+    return [_assemble_group(conn, r, with_messages) for r in rows]
+
+def create_group(group):
+    conn = _conn()
+    with conn:
+        _insert_group(conn, group)
+
+def update_group(group_id, **fields):
+    """Update top-level group fields such as name, description or icon."""
+    column_map = {'name': 'name', 'description': 'description', 'owner': 'owner', 'icon': 'icon'}
+    sets = [(column_map[k], v) for k, v in fields.items() if k in column_map]
+    if not sets:
+        return
+    conn = _conn()
+    with conn:
+        conn.execute(
+            f"UPDATE groups SET {', '.join(c + ' = ?' for c, _ in sets)} WHERE id = ?",
+            [v for _, v in sets] + [group_id]
+        )
+
+def delete_group(group_id):
+    conn = _conn()
+    for r in conn.execute('SELECT msg_id FROM group_messages WHERE group_id = ? AND msg_id IS NOT NULL', (group_id,)):
+        message_index.index.remove(r['msg_id'], GROUP)
+    with conn:
+        for table in ('group_channels', 'group_members', 'group_roles', 'group_messages'):
+            conn.execute(f'DELETE FROM {table} WHERE group_id = ?', (group_id,))
+        conn.execute('DELETE FROM groups WHERE id = ?', (group_id,))
+
+def add_group_member(group_id, username):
+    """Add a member; returns False if they were already in the group."""
+    conn = _conn()
+    with conn:
+        cur = conn.execute('INSERT OR IGNORE INTO group_members (group_id, username) VALUES (?, ?)', (group_id, username))
+    return cur.rowcount > 0
+
+def remove_group_member(group_id, username):
+    conn = _conn()
+    with conn:
+        cur = conn.execute('DELETE FROM group_members WHERE group_id = ? AND username = ?', (group_id, username))
+        conn.execute('DELETE FROM group_roles WHERE group_id = ? AND username = ?', (group_id, username))
+    return cur.rowcount > 0
+
+def set_group_role(group_id, username, role):
+    """Give a user exactly one role ('admin', 'moderator'); any other value clears it."""
+    conn = _conn()
+    with conn:
+        conn.execute('DELETE FROM group_roles WHERE group_id = ? AND username = ?', (group_id, username))
+        if role in ('admin', 'moderator'):
+            conn.execute('INSERT INTO group_roles (group_id, role, username) VALUES (?, ?, ?)', (group_id, role, username))
+
+def add_group_channel(group_id, channel):
+    """Add a channel at the end. False if the group already has a channel with that id."""
+    conn = _conn()
+    try:
+        with conn:
+            pos = conn.execute('SELECT COALESCE(MAX(position), -1) + 1 FROM group_channels WHERE group_id = ?',
+                               (group_id,)).fetchone()[0]
+            conn.execute('INSERT INTO group_channels (group_id, channel_id, position, data) VALUES (?, ?, ?, ?)',
+                         (group_id, _channel_key(channel), pos, _encode(channel)))
+    except sqlite3.IntegrityError:
+        return False
+    return True
+
+def update_group_channel(group_id, channel):
+    conn = _conn()
+    with conn:
+        conn.execute('UPDATE group_channels SET data = ? WHERE group_id = ? AND channel_id = ?',
+                     (_encode(channel), group_id, _channel_key(channel)))
+
+def delete_group_channel(group_id, channel_id):
+    conn = _conn()
+    with conn:
+        conn.execute('DELETE FROM group_channels WHERE group_id = ? AND channel_id = ?', (group_id, channel_id))
+
+def append_group_message(group_id, msg):
+    """Store a new group message, set its `seq` and return it."""
+    conn = _conn()
+    with conn:
+        msg['seq'] = _insert_message(conn, group_id, msg)
+    return msg['seq']
+
+def update_group_message(seq, msg):
+    conn = _conn()
+    with conn:
+        conn.execute('UPDATE group_messages SET data = ?, msg_id = ?, ts = ? WHERE seq = ?',
+                     (_encode(msg), msg.get('id'), _message_ts(msg), seq))
+
+def delete_group_message(seq):
+    conn = _conn()
+    row = conn.execute('SELECT msg_id FROM group_messages WHERE seq = ?', (seq,)).fetchone()
+    with conn:
+        conn.execute('DELETE FROM group_messages WHERE seq = ?', (seq,))
+    if row:
+        message_index.index.remove(row['msg_id'], GROUP)
+
+def group_message_by_id(group_id, msg_id):
+    """Return (seq, message) or (None, None), resolved through the message id index."""
+    seq = message_index.index.lookup_in(msg_id, GROUP, group_id)
+    if seq is None:
+        return None, None
+    row = _conn().execute('SELECT data FROM group_messages WHERE seq = ?', (seq,)).fetchone()
+    return (seq, json_codec.loads(row['data'])) if row else (None, None)
+
+def group_messages_at(group_id, timestamp, channel=None):
+    """All (seq, message) pairs sent at `timestamp`, optionally within one channel."""
+    sql = 'SELECT seq, data FROM group_messages WHERE group_id = ? AND ts = ?'
+    args = [group_id, timestamp]
+    if channel is not None:
+        sql += ' AND channel = ?'
+        args.append(channel)
+    return [(r['seq'], json_codec.loads(r['data'])) for r in _conn().execute(sql + ' ORDER BY seq', args)]
+
+def group_messages_by_ids(group_id, msg_ids):
+    if not msg_ids:
+        return []
+    seqs = [seq for seq in (message_index.index.lookup_in(m, GROUP, group_id) for m in msg_ids) if seq is not None]
+    if not seqs:
+        return []
+    marks = ','.join('?' for _ in seqs)
+    rows = _conn().execute(f'SELECT data FROM group_messages WHERE seq IN ({marks}) ORDER BY seq', seqs)
+    return [json_codec.loads(r['data']) for r in rows]
+
+def group_channel_messages(group_id, channel):
+    """Every message in a channel, oldest first, each carrying its `seq`."""
+    rows = _conn().execute('SELECT seq, data FROM group_messages WHERE group_id = ? AND channel = ? ORDER BY seq',
+                           (group_id, channel))
+    return [dict(json_codec.loads(r['data']), seq=r['seq']) for r in rows]
+
+def group_channel_page(group_id, channel, before=None, after=None, limit=50):
+    """One page of a channel, oldest first, using seq as the cursor.
+
+    With `after` the page starts right after that seq; otherwise it is the
+    newest `limit` messages older than `before` (or the newest overall).
+    Returns (messages, has_more); each message carries its `seq`. seq is the
+    table's autoincrement key, so it only grows within a channel too, and the
+    (group_id, channel, seq) index serves a page without reading the rest.
+    """
+    sql = 'SELECT seq, data FROM group_messages WHERE group_id = ? AND channel = ?'
+    args = [group_id, channel]
+    if after is not None:
+        sql += ' AND seq > ? ORDER BY seq ASC LIMIT ?'
+        args += [after, limit + 1]
+    else:
+        if before is not None:
+            sql += ' AND seq < ?'
+            args.append(before)
+        sql += ' ORDER BY seq DESC LIMIT ?'
+        args.append(limit + 1)
+    rows = _conn().execute(sql, args).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after is None:
+        rows.reverse()
+    page = []
+    for r in rows:
+        msg = json_codec.loads(r['data'])
+        msg['seq'] = r['seq']
+        page.append(msg)
+    return page, has_more
+
+def iter_group_messages():
+    """Yield (seq, message) for every group message (maintenance scripts)."""
+    for r in _conn().execute('SELECT seq, data FROM group_messages ORDER BY seq'):
+        yield r['seq'], json_codec.loads(r['data'])
+
+def group_all_messages(group_id):
+    rows = _conn().execute('SELECT data FROM group_messages WHERE group_id = ? ORDER BY seq', (group_id,))
+    return [json_codec.loads(r['data']) for r in rows]
 
 # Call this once at startup
-init_db()
\ No newline at end of file
+init_db()
+_migrate_groups_json(_conn())
+_load_message_index(_conn())
@@ -0,0 +1,227 @@
+import bisect
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import json_codec
+import message_index
+import persistence
+from message_index import DM
+
+# Direct messages sharded by conversation.
+#
+# Each conversation (the sorted pair of usernames) gets its own JSON-lines
+# shard under the store directory. Sending a DM appends one line to one shard;
+# status changes, reactions and deletes rewrite only that conversation, through
+# the write-behind writer so a burst of reactions costs one rewrite.
+# In memory we keep conversation key -> messages, so history lookups cost
+# O(conversation) instead of scanning every DM, and message ids are registered
+# in the global message index as (key, position) for O(1) lookups.
+#
+# Every DM also gets a `seq` that only grows within its conversation, used as
+# the pagination cursor, and each conversation keeps its seqs and a running
+# max of message times side by side so a page or a `since` sync is a bisect.
+
+
+def message_time(msg: dict) -> float:
+    """Send time in seconds; DMs carry `ts`, `createdAt` or `timestamp` depending on the sender path."""
+    for field in ('ts', 'createdAt', 'timestamp'):
+        value = msg.get(field)
+        if value in (None, ''):
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            continue
+        # Browser timestamps are in milliseconds
+        return value / 1000.0 if value > 1e11 else value
+    return 0.0
+
+
+def conversation_key(user_a: str, user_b: str) -> Tuple[str, str]:
+    """Canonical key for the conversation between two users."""
+    return tuple(sorted((user_a or '', user_b or '')))
+
+
+class DMStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conversations: Dict[Tuple[str, str], List[dict]] = {}
+        # Parallel to each conversation: seqs, and the running max of message times
+        self._seqs: Dict[Tuple[str, str], List[int]] = {}
+        self._times: Dict[Tuple[str, str], List[float]] = {}
+        # Next seq per conversation. Only ever grows, so a deleted newest
+        # message never has its seq handed out again
+        self._next_seq: Dict[Tuple[str, str], int] = {}
+        self._load()
+
+    def _shard_path(self, key: Tuple[str, str]) -> str:
+        # Usernames may contain anything, so hash the pair for the file name
+        digest = hashlib.sha1('\x00'.join(key).encode('utf-8')).hexdigest()[:20]
+        return os.path.join(self.directory, f"{digest}.jsonl")
+
+    def _load(self) -> None:
+        unnumbered = set()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.jsonl'):
+                continue
+            path = os.path.join(self.directory, name)
+            marks = []
+            with open(path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    start, offset = offset, offset + len(line)
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError("unterminated line")
+                        msg = json_codec.loads(line)
+                    except ValueError:
+                        # Torn last line after a crash: cut it off so later
+                        # appends start on a fresh line
+                        print(f"DM store: truncating torn line in {name} at byte {start}")
+                        f.close()
+                        with open(path, 'r+b') as out:
+                            out.truncate(start)
+                        break
+                    if '_meta' in msg:
+                        marks.append(msg['_meta'])
+                        continue
+                    if 'seq' not in msg:
+                        unnumbered.add(conversation_key(msg.get('from'), msg.get('to')))
+                    self._index(msg)
+            # Applied after the messages so a header never renumbers them
+            for meta in marks:
+                key = conversation_key(*meta.get('users', ('', '')))
+                self._next_seq[key] = max(self._next_seq.get(key, 1), int(meta.get('next_seq', 1)))
+        # Shards written before DMs had seqs: persist the numbers we just gave them
+        for key in unnumbered:
+            self.save_conversation(*key)
+
+    def _index(self, msg: dict) -> Tuple[str, str]:
+        key = conversation_key(msg.get('from'), msg.get('to'))
+        msgs = self._conversations.setdefault(key, [])
+        seqs = self._seqs.setdefault(key, [])
+        times = self._times.setdefault(key, [])
+        next_seq = self._next_seq.get(key, 1)
+        if not isinstance(msg.get('seq'), int) or msg['seq'] < next_seq:
+            msg['seq'] = next_seq
+        self._next_seq[key] = msg['seq'] + 1
+        msgs.append(msg)
+        seqs.append(msg['seq'])
+        times.append(max(times[-1], message_time(msg)) if times else message_time(msg))
+        message_index.index.add(msg.get('id'), DM, key, len(msgs) - 1)
+        return key
+
+    def append(self, msg: dict) -> None:
+        """Add a DM to its conversation, appending a single line to that shard."""
+        with self._lock:
+            key = self._index(msg)
+            with open(self._shard_path(key), 'a', encoding='utf-8') as f:
+                f.write(json_codec.dumps(msg, pretty=False) + '\n')
+
+    def save_conversation(self, user_a: str, user_b: str) -> None:
+        """Schedule a rewrite of one conversation's shard after its messages were changed in place."""
+        key = conversation_key(user_a, user_b)
+        persistence.writer.schedule(self._shard_path(key), lambda: self._write_shard(key))
+
+    def _write_shard(self, key: Tuple[str, str]) -> None:
+        with self._lock:
+            path = self._shard_path(key)
+            msgs = self._conversations.get(key) or []
+            tmp = path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                # Header keeps the seq high-water mark across deletes, even
+                # when no messages are left
+                meta = {'users': list(key), 'next_seq': self._next_seq.get(key, 1)}
+                f.write(json_codec.dumps({'_meta': meta}, pretty=False) + '\n')
+                for m in msgs:
+                    f.write(json_codec.dumps(m, pretty=False) + '\n')
+            os.replace(tmp, path)
+
+    def save_message(self, msg: dict) -> None:
+        self.save_conversation(msg.get('from'), msg.get('to'))
+
+    def conversation(self, user_a: str, user_b: str) -> List[dict]:
+        """Messages between two users, oldest first."""
+        with self._lock:
+            return list(self._conversations.get(conversation_key(user_a, user_b), []))
+
+    def page(self, user_a: str, user_b: str, before: Optional[int] = None, after: Optional[int] = None,
+             since: Optional[float] = None, limit: int = 50) -> Tuple[List[dict], bool]:
+        """One page of a conversation, oldest first. Returns (messages, has_more).
+
+        `after` (a seq) or `since` (a time in seconds) page forward from that
+        point for incremental sync; otherwise this is the newest `limit`
+        messages older than `before` (a seq), or the newest overall.
+        """
+        with self._lock:
+            key = conversation_key(user_a, user_b)
+            msgs = self._conversations.get(key) or []
+            if after is not None or since is not None:
+                start = 0
+                if after is not None:
+                    start = bisect.bisect_right(self._seqs[key], after) if msgs else 0
+                if since is not None and msgs:
+                    # Running max, so out-of-order legacy times can only widen the page
+                    start = max(start, bisect.bisect_right(self._times[key], since))
+                end = start + limit
+                return list(msgs[start:end]), end < len(msgs)
+            end = bisect.bisect_left(self._seqs[key], before) if (msgs and before is not None) else len(msgs)
+            start = max(0, end - limit)
+            return list(msgs[start:end]), start > 0
+
+    def get(self, msg_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = message_index.index.lookup(msg_id, DM)
+            if not entry:
+                return None
+            key, pos = entry
+            msgs = self._conversations.get(key) or []
+            return msgs[pos] if pos < len(msgs) else None
+
+    def delete(self, msg_id: str, sender: str) -> bool:
+        """Delete one of `sender`'s messages. Returns True if it existed."""
+        with self._lock:
+            msg = self.get(msg_id)
+            if msg is None or msg.get('from') != sender:
+                return False
+            key, pos = message_index.index.lookup(msg_id, DM)
+            message_index.index.remove(msg_id, DM)
+            msgs, seqs, times = self._conversations[key], self._seqs[key], self._times[key]
+            del msgs[pos], seqs[pos], times[pos]
+            # Later messages moved up one slot
+            for i in range(pos, len(msgs)):
+                message_index.index.add(msgs[i].get('id'), DM, key, i)
+                times[i] = max(times[i - 1], message_time(msgs[i])) if i else message_time(msgs[i])
+            self.save_conversation(*key)
+            return True
+
+    def keys(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            return list(self._conversations)
+
+    def count(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._conversations.values())
+
+
+def import_legacy(store: DMStore, json_path: str) -> int:
+    """Split an old flat dms.json into conversation shards once."""
+    if not os.path.exists(json_path) or store.count():
+        return 0
+    try:
+        legacy = json_codec.load_file(json_path)
+    except Exception as e:
+        print("Could not read dms.json for migration:", e)
+        return 0
+    for msg in legacy or []:
+        store._index(msg)
+    for key in list(store._conversations):
+        store.save_conversation(*key)
+    # Shards must be on disk before the source file is retired
+    persistence.writer.flush()
+    os.replace(json_path, json_path + '.migrated')
+    return len(legacy or [])
@@ -0,0 +1,145 @@
+import os
+import re
+import tarfile
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+try:
+    import requests
+except ImportError:  # pragma: no cover
+    requests = None
+
+# Local Heroicons store behind /api/proxy/heroicons.
+#
+# Icons are looked up in a small in-memory LRU, then on disk, and only then
+# fetched from unpkg (once; the result is written to disk). Names unpkg does not
+# have, and fetches that fail, are remembered for a while so a missing icon or
+# a dead network doesn't tie up a worker on every request.
+#
+# `install_archive()` fills the disk store from the heroicons npm tarball in one
+# go (scripts/prewarm_heroicons.py), after which no request needs the network;
+# with Zylo_HEROICONS_OFFLINE=1 it is never used.
+
+HEROICONS_VERSION = '2.0.18'
+STYLE = '24/outline'
+UPSTREAM_URL = f"https://unpkg.com/heroicons@{HEROICONS_VERSION}/{STYLE}/{{name}}"
+ARCHIVE_URL = f"https://registry.npmjs.org/heroicons/-/heroicons-{HEROICONS_VERSION}.tgz"
+OFFLINE = os.getenv('Zylo_HEROICONS_OFFLINE', '').lower() in ('1', 'true', 'yes')
+FETCH_TIMEOUT = float(os.getenv('Zylo_HEROICONS_TIMEOUT', '2'))
+MEMORY_ITEMS = 512
+# How long a name is answered with "not found" without asking unpkg again
+MISSING_TTL = 3600
+# ...and how long after a network error
+ERROR_TTL = 60
+MAX_ICON_BYTES = 64 * 1024
+
+_NAME = re.compile(r'^[a-z0-9][a-z0-9-]*\.svg$')
+
+
+def valid_name(name: str) -> bool:
+    return bool(_NAME.match(name or ''))
+
+
+class IconCache:
+    def __init__(self, cache_dir: str, offline: bool = OFFLINE, capacity: int = MEMORY_ITEMS):
+        self.dir = os.path.join(cache_dir, f"heroicons-{HEROICONS_VERSION}", *STYLE.split('/'))
+        os.makedirs(self.dir, exist_ok=True)
+        self.offline = offline
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._memory: OrderedDict = OrderedDict()
+        # name -> time until which it is reported missing
+        self._missing = {}
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'fetched': 0, 'missing': 0, 'errors': 0}
+
+    def _remember(self, name: str, data: bytes) -> None:
+        with self._lock:
+            self._memory[name] = data
+            self._memory.move_to_end(name)
+            while len(self._memory) > self.capacity:
+                self._memory.popitem(last=False)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def _write(self, name: str, data: bytes) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, os.path.join(self.dir, name))
+
+    def _fetch(self, name: str) -> Optional[bytes]:
+        if self.offline or requests is None:
+            return None
+        try:
+            resp = requests.get(UPSTREAM_URL.format(name=name), timeout=FETCH_TIMEOUT)
+        except Exception as e:
+            print(f"Heroicons fetch failed for {name}: {e}")
+            self._count('errors')
+            with self._lock:
+                self._missing[name] = time.monotonic() + ERROR_TTL
+            return None
+        if resp.status_code != 200 or len(resp.content) > MAX_ICON_BYTES or b'<svg' not in resp.content[:512]:
+            self._count('missing')
+            with self._lock:
+                self._missing[name] = time.monotonic() + MISSING_TTL
+            return None
+        self._count('fetched')
+        try:
+            self._write(name, resp.content)
+        except OSError as e:
+            print(f"Failed to cache heroicon {name}: {e}")
+        return resp.content
+
+    def get(self, name: str) -> Optional[bytes]:
+        """SVG bytes for e.g. 'bell.svg', or None if there is no such icon (or it can't be fetched now)."""
+        if not valid_name(name):
+            return None
+        with self._lock:
+            data = self._memory.get(name)
+            if data is not None:
+                self._memory.move_to_end(name)
+                self._stats['memory_hits'] += 1
+                return data
+            until = self._missing.get(name)
+            if until is not None:
+                if until > time.monotonic():
+                    return None
+                del self._missing[name]
+        try:
+            with open(os.path.join(self.dir, name), 'rb') as f:
+                data = f.read()
+            self._count('disk_hits')
+        except OSError:
+            data = self._fetch(name)
+        if data is not None:
+            self._remember(name, data)
+        return data
+
+    def install_archive(self, fileobj) -> int:
+        """Store every icon of this style from a heroicons npm tarball. Returns the number stored."""
+        prefix = f"package/{STYLE}/"
+        count = 0
+        with tarfile.open(fileobj=fileobj, mode='r:gz') as tar:
+            for member in tar:
+                if not member.isfile() or not member.name.startswith(prefix):
+                    continue
+                name = member.name[len(prefix):]
+                if not valid_name(name) or member.size > MAX_ICON_BYTES:
+                    continue
+                self._write(name, tar.extractfile(member).read())
+                count += 1
+        with self._lock:
+            self._missing.clear()
+        return count
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_memory'] = len(self._memory)
+        stats['on_disk'] = sum(1 for n in os.listdir(self.dir) if n.endswith('.svg'))
+        return stats
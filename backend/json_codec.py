@@ -0,0 +1,52 @@
+import json
+import os
+
+# JSON codec shared by every store.
+#
+# Uses orjson when it is installed (several times faster on the large stores
+# with inline base64 data) and falls back to the stdlib otherwise. Files are
+# written compact by default; set Zylo_JSON_PRETTY=1 to get indented files
+# back for hand inspection. Both encoders produce plain JSON, so data written
+# by one is read by the other.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+PRETTY = os.getenv('Zylo_JSON_PRETTY', '0').lower() in ('1', 'true', 'yes')
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def dumpb(data, pretty: bool = PRETTY) -> bytes:
+    """Encode to UTF-8 bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2 if pretty else 0)
+        except TypeError:
+            # orjson is stricter (e.g. non-str dict keys, >64-bit ints); let the stdlib try
+            pass
+    if pretty:
+        return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def dumps(data, pretty: bool = PRETTY) -> str:
+    return dumpb(data, pretty).decode('utf-8')
+
+
+def loads(raw):
+    """Decode str or bytes."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def load_file(path: str):
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def dump_file(path: str, data, pretty: bool = PRETTY) -> None:
+    with open(path, 'wb') as f:
+        f.write(dumpb(data, pretty))
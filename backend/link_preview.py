@@ -0,0 +1,218 @@
+import codecs
+import re
+import ssl
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterable, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Link previews (OpenGraph metadata) for /api/link-preview.
+#
+# When a link is posted every client in the channel asks for its preview at
+# about the same moment. Results are cached by normalized URL (successes for
+# hours, failures for minutes) and concurrent requests for a URL that is still
+# being fetched wait for that one fetch instead of starting their own. Fetches
+# run on a small fixed pool; when it is backed up, new URLs are refused rather
+# than queued behind a slow site.
+#
+# Pages are read in small chunks through an html.parser based extractor that
+# collects og:*, twitter:* and <title> in one pass and stops reading at </head>
+# (or the first body tag), so most previews download a few KB, not 50.
+
+FETCH_TIMEOUT = 5
+MAX_BYTES = 50000
+READ_CHUNK = 8192
+WORKERS = 4
+# Distinct URLs allowed to wait for a worker before new ones are turned away
+MAX_PENDING = 32
+CACHE_ITEMS = 2048
+OK_TTL = 6 * 3600
+ERROR_TTL = 300
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+_TRACKING_PARAMS = re.compile(r'^(?:utm_\w+|fbclid|gclid|mc_eid|igshid)$', re.I)
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str) -> str:
+    """Cache key for a URL: lowercase scheme/host, no default port, fragment or tracking parameters.
+
+    Raises ValueError for URLs that can't be parsed (e.g. a non-numeric port).
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                       if not _TRACKING_PARAMS.match(k)])
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+
+class _HeadDone(Exception):
+    pass
+
+
+class MetadataParser(HTMLParser):
+    """Collects <meta property/name="og:*|twitter:*|description"> and <title> until the head ends."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta: Dict[str, str] = {}
+        self.title: Optional[str] = None
+        self.done = False
+        self._title_parts = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'meta':
+            attrs = dict(attrs)
+            key = (attrs.get('property') or attrs.get('name') or '').strip().lower()
+            content = attrs.get('content')
+            if content is not None and (key.startswith(('og:', 'twitter:')) or key == 'description'):
+                # First occurrence wins, as with a regex search
+                self.meta.setdefault(key, content)
+        elif tag == 'title' and self.title is None:
+            self._title_parts = []
+        elif tag == 'body':
+            self._finish()
+
+    def handle_endtag(self, tag):
+        if tag == 'title' and self._title_parts is not None:
+            self.title = ''.join(self._title_parts).strip()
+            self._title_parts = None
+        elif tag == 'head':
+            self._finish()
+
+    def handle_data(self, data):
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+
+    def _finish(self):
+        # Abandon the rest of the current chunk too, not just later ones
+        self.done = True
+        raise _HeadDone()
+
+
+def extract_metadata(chunks: Iterable[str]) -> MetadataParser:
+    """Feed text chunks to a MetadataParser, stopping once the head is complete."""
+    parser = MetadataParser()
+    try:
+        for chunk in chunks:
+            parser.feed(chunk)
+    except _HeadDone:
+        pass
+    return parser
+
+
+def _read_text(response, limit: int = MAX_BYTES):
+    """Decoded chunks of an HTTP response, up to `limit` bytes in total."""
+    charset = response.headers.get_content_charset() or 'utf-8'
+    try:
+        decoder = codecs.getincrementaldecoder(charset)(errors='ignore')
+    except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    remaining = limit
+    while remaining > 0:
+        # read1: whatever has arrived, so parsing can stop before the next packet
+        chunk = response.read1(min(READ_CHUNK, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield decoder.decode(chunk)
+
+
+def preview_from(parser: MetadataParser, url: str) -> dict:
+    meta = parser.meta
+
+    def first(*keys):
+        for key in keys:
+            if meta.get(key):
+                return meta[key]
+        return None
+
+    return {
+        "success": True,
+        # Fallback to regular title if no og:title
+        "title": first('og:title', 'twitter:title') or parser.title,
+        "description": first('og:description', 'twitter:description', 'description'),
+        "image": first('og:image', 'og:image:url', 'og:image:secure_url', 'twitter:image', 'twitter:image:src'),
+        # Hostname as fallback site_name
+        "site_name": first('og:site_name') or urlsplit(url).hostname,
+    }
+
+
+def fetch_preview(url: str) -> dict:
+    """Download the head of a page and pull out its OpenGraph/Twitter metadata."""
+    req = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+
+    with urllib.request.urlopen(req, timeout=FETCH_TIMEOUT, context=ctx) as response:
+        parser = extract_metadata(_read_text(response))
+    return preview_from(parser, url)
+
+
+class PreviewCache:
+    def __init__(self, fetch: Callable[[str], dict] = fetch_preview, workers: int = WORKERS,
+                 max_pending: int = MAX_PENDING, capacity: int = CACHE_ITEMS):
+        self.fetch = fetch
+        self.max_pending = max_pending
+        self.capacity = capacity
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='link-preview')
+        self._lock = threading.Lock()
+        # key -> (expires at, result)
+        self._cache: OrderedDict = OrderedDict()
+        # key -> future of the fetch in progress
+        self._inflight: Dict[str, object] = {}
+        self._stats = {'hits': 0, 'fetches': 0, 'coalesced': 0, 'rejected': 0}
+
+    def _run(self, key: str, url: str) -> dict:
+        try:
+            result = self.fetch(url)
+            ttl = OK_TTL
+        except Exception as e:
+            print(f"Link preview failed for {url}: {e}")
+            result = {"success": False, "error": str(e)}
+            ttl = ERROR_TTL
+        with self._lock:
+            self._cache[key] = (time.monotonic() + ttl, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.capacity:
+                self._cache.popitem(last=False)
+            self._inflight.pop(key, None)
+        return result
+
+    def get(self, url: str, wait: float = FETCH_TIMEOUT + 1) -> dict:
+        """Preview for `url` (without the "url" field), fetching it at most once at a time."""
+        key = normalize_url(url)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    self._cache.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return cached[1]
+                del self._cache[key]
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats['coalesced'] += 1
+            elif len(self._inflight) >= self.max_pending:
+                self._stats['rejected'] += 1
+                return {"success": False, "error": "Too many previews in progress"}
+            else:
+                future = self._pool.submit(self._run, key, url)
+                self._inflight[key] = future
+                self._stats['fetches'] += 1
+        try:
+            return future.result(timeout=wait)
+        except FutureTimeout:
+            # The fetch carries on and fills the cache for the next request
+            return {"success": False, "error": "Preview timed out"}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, cached=len(self._cache), inflight=len(self._inflight))
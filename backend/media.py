@@ -0,0 +1,86 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from flask import send_file
+
+# Cache-friendly responses for uploaded media.
+#
+# Every file goes out with a strong ETag, so a repeat load with If-None-Match
+# costs a 304 and no body, and with Accept-Ranges so audio/video players can
+# seek with byte-range requests (206, validated against the same ETag through
+# If-Range). Werkzeug does the conditional/range handling once the ETag is set.
+#
+# The ETag never costs a pass over a large file: content-addressed files use
+# the hash in their name, small files are hashed (cheap, and remembered per
+# mtime/size), and anything over HASH_MAX_BYTES uses its mtime and size, which
+# stays the same across restarts.
+#
+# Files whose URL names their content (blobs, hashed cloud files) can never
+# change, so they are cacheable for a year without revalidation. Everything
+# else (avatar.png is overwritten in place) is revalidated on each use.
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+HASH_CACHE_SIZE = 4096
+HASH_MAX_BYTES = 1024 * 1024
+# cloud_<16 hex>.<ext>, written by the cloud upload path
+_CONTENT_ADDRESSED = re.compile(r'^cloud_([0-9a-f]{16})\.[A-Za-z0-9]+$')
+
+
+class ContentHashes:
+    """ETag value per file: see the header. Hashes are remembered until mtime or size changes."""
+
+    def __init__(self, capacity: int = HASH_CACHE_SIZE):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, path: str) -> str:
+        match = _CONTENT_ADDRESSED.match(os.path.basename(path))
+        if match:
+            return match.group(1)
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        if st.st_size > HASH_MAX_BYTES:
+            return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                return entry[1]
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        with self._lock:
+            self._entries[path] = (stamp, digest)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return digest
+
+
+hashes = ContentHashes()
+
+
+def is_content_addressed(filename: str) -> bool:
+    return bool(_CONTENT_ADDRESSED.match(os.path.basename(filename)))
+
+
+def send_media(path: str, mimetype: Optional[str] = None, etag: Optional[str] = None,
+               immutable: Optional[bool] = None):
+    """send_file with a content-hash ETag, 304/Range support and the right Cache-Control.
+
+    `etag` skips hashing when the caller already knows the content hash.
+    `immutable` defaults to whether the file name is content-addressed.
+    """
+    if immutable is None:
+        immutable = is_content_addressed(path)
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=etag or hashes.get(path))
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    return response
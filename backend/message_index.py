@@ -0,0 +1,58 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+# Global message id index.
+#
+# Reactions, receipts, pins, edits and deletes all arrive with a message id.
+# Every store registers its messages here when they are appended or replayed
+# and drops them on delete, so finding a message is one dict lookup whatever
+# the history length:
+#   'community' -> (None, seq)             seq in the community message log
+#   'dm'        -> (conversation key, pos) position in that conversation
+#   'group'     -> (group id, seq)         row in group_messages
+
+COMMUNITY = 'community'
+DM = 'dm'
+GROUP = 'group'
+
+
+class MessageIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Keyed by (store, msg_id): ids are client-supplied, so the same id
+        # in another store must not shadow this one
+        self._entries: Dict[Tuple[str, str], Tuple[object, int]] = {}
+
+    def add(self, msg_id: str, store: str, conversation, ref: int) -> None:
+        if not msg_id:
+            return
+        with self._lock:
+            self._entries[(store, msg_id)] = (conversation, ref)
+
+    def remove(self, msg_id: str, store: str) -> None:
+        if not msg_id:
+            return
+        with self._lock:
+            self._entries.pop((store, msg_id), None)
+
+    def lookup(self, msg_id: str, store: str) -> Optional[Tuple[object, int]]:
+        """(conversation, ref) for an id in that store, or None."""
+        if not msg_id:
+            return None
+        with self._lock:
+            return self._entries.get((store, msg_id))
+
+    def lookup_in(self, msg_id: str, store: str, conversation=None):
+        """The ref of `msg_id` if it lives in that store (and conversation), else None."""
+        entry = self.lookup(msg_id, store)
+        if not entry:
+            return None
+        if conversation is not None and entry[0] != conversation:
+            return None
+        return entry[1]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+index = MessageIndex()
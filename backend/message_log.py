@@ -0,0 +1,362 @@
+import bisect
+import os
+import threading
+from typing import Dict, List, Optional
+
+import json_codec
+import message_index
+from message_index import COMMUNITY
+
+# Append-only, segmented storage for the community room.
+#
+# Every change is one JSON line ("record") appended to the active segment and
+# fsync'd before returning, so posting a message costs O(1) I/O no matter how
+# long the history is. Records are never rewritten in place:
+#   {"lsn": 7, "seq": 3, "op": "put", "msg": {...}}   new message or new version
+#   {"lsn": 8, "seq": 3, "op": "del"}                 tombstone
+# `seq` identifies a message, `lsn` orders records; on replay the record with
+# the highest lsn wins, so segment order never matters.
+#
+# Segments roll over at SEGMENT_MAX_BYTES. MANIFEST.json lists the live
+# segments and is replaced atomically, which lets a background compaction
+# copy live records out of sealed segments and drop the old files safely.
+
+SEGMENT_MAX_BYTES = 4 * 1024 * 1024
+# Compact once this share of the sealed records is dead (superseded or deleted)
+COMPACT_GARBAGE_RATIO = 0.5
+COMPACT_MIN_GARBAGE = 500
+
+
+class MessageLog:
+    def __init__(self, directory: str, segment_max_bytes: int = SEGMENT_MAX_BYTES):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.manifest_path = os.path.join(directory, 'MANIFEST.json')
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._compacting = False
+        # Offset index: seq -> (segment, byte offset, lsn, op) of its latest record
+        self._index: Dict[int, tuple] = {}
+        # Records per segment and how many of them are still live, to know
+        # how much of a segment is garbage
+        self._records: Dict[str, int] = {}
+        self._live: Dict[str, int] = {}
+        self._messages: Dict[int, dict] = {}
+        # Live seqs in order, for paging
+        self._order: List[int] = []
+        self._next_lsn = 1
+        self._next_seq = 1
+
+        manifest = self._read_manifest()
+        self._segments: List[str] = manifest['segments']
+        self._next_segment = manifest['next_segment']
+        # Compaction drops deleted messages, so replay alone could hand their
+        # seqs out again; the manifest remembers how far seqs have gone
+        self._next_seq = manifest.get('next_seq', 1)
+        self._replay()
+        if not self._segments:
+            self._roll()
+        self._active = open(os.path.join(directory, self._segments[-1]), 'ab')
+
+    # ---- manifest / segments ----
+
+    def _read_manifest(self) -> dict:
+        try:
+            return json_codec.load_file(self.manifest_path)
+        except FileNotFoundError:
+            return {'segments': [], 'next_segment': 1}
+
+    def _write_manifest(self) -> None:
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(json_codec.dumpb({'segments': self._segments, 'next_segment': self._next_segment,
+                                      'next_seq': self._next_seq}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.manifest_path)
+
+    def _new_segment_name(self) -> str:
+        name = f"{self._next_segment:06d}.log"
+        self._next_segment += 1
+        return name
+
+    def _roll(self) -> None:
+        """Seal the active segment and start a new one."""
+        name = self._new_segment_name()
+        open(os.path.join(self.directory, name), 'ab').close()
+        self._segments.append(name)
+        self._records[name] = 0
+        self._write_manifest()
+        if getattr(self, '_active', None):
+            self._active.close()
+            self._active = open(os.path.join(self.directory, name), 'ab')
+
+    # ---- replay ----
+
+    def _replay(self) -> None:
+        for name in self._segments:
+            self._records[name] = 0
+            path = os.path.join(self.directory, name)
+            if not os.path.exists(path):
+                continue
+            active = name == self._segments[-1]
+            with open(path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    start, offset = offset, offset + len(line)
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError("unterminated record")
+                        rec = json_codec.loads(line)
+                    except ValueError:
+                        if active:
+                            # Torn write from a crash: everything before it is intact.
+                            # Cut it off so new records don't get appended onto it.
+                            print(f"Message log: truncating torn record in {name} at byte {start}")
+                            f.close()
+                            with open(path, 'r+b') as out:
+                                out.truncate(start)
+                            break
+                        # Sealed segments were fsync'd whole; skip the damaged line
+                        print(f"Message log: skipping corrupt record in sealed segment {name} at byte {start}")
+                        continue
+                    self._records[name] += 1
+                    self._apply(rec, name, start)
+
+    def _apply(self, rec: dict, segment: str, offset: int) -> None:
+        seq, lsn = rec['seq'], rec['lsn']
+        self._next_lsn = max(self._next_lsn, lsn + 1)
+        self._next_seq = max(self._next_seq, seq + 1)
+        current = self._index.get(seq)
+        if current and current[2] > lsn:
+            return
+        if current and current[3] == 'put':
+            self._live[current[0]] -= 1
+        self._index[seq] = (segment, offset, lsn, rec['op'])
+        if rec['op'] == 'put':
+            self._live[segment] = self._live.get(segment, 0) + 1
+            if seq not in self._messages:
+                if self._order and seq < self._order[-1]:
+                    bisect.insort(self._order, seq)
+                else:
+                    self._order.append(seq)
+            self._messages[seq] = rec['msg']
+            message_index.index.add(rec['msg'].get('id'), COMMUNITY, None, seq)
+        else:
+            old = self._messages.pop(seq, None)
+            if old:
+                message_index.index.remove(old.get('id'), COMMUNITY)
+                del self._order[bisect.bisect_left(self._order, seq)]
+
+    # ---- writes ----
+
+    def _write(self, seq: int, op: str, msg: Optional[dict] = None, sync: bool = True) -> None:
+        with self._lock:
+            rec = {'lsn': self._next_lsn, 'seq': seq, 'op': op}
+            if msg is not None:
+                rec['msg'] = msg
+            self._next_lsn += 1
+            line = json_codec.dumpb(rec, pretty=False) + b'\n'
+            offset = self._active.tell()
+            self._active.write(line)
+            if sync:
+                self._active.flush()
+                os.fsync(self._active.fileno())
+            segment = self._segments[-1]
+            self._records[segment] += 1
+            self._apply(rec, segment, offset)
+            if offset + len(line) >= self.segment_max_bytes:
+                self._active.flush()
+                os.fsync(self._active.fileno())
+                self._roll()
+
+    def append(self, msg: dict) -> int:
+        """Persist a new message. Sets and returns its `seq`."""
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            msg['seq'] = seq
+            self._write(seq, 'put', msg)
+            return seq
+
+    def append_many(self, msgs: List[dict]) -> None:
+        """Bulk append with a single fsync at the end (imports and migrations)."""
+        with self._lock:
+            for msg in msgs:
+                msg['seq'] = self._next_seq
+                self._next_seq += 1
+                self._write(msg['seq'], 'put', msg, sync=False)
+            self._active.flush()
+            os.fsync(self._active.fileno())
+
+    def update(self, msg: dict) -> None:
+        """Persist a new version of an existing message (edit, reaction, rename...)."""
+        self._write(msg['seq'], 'put', msg)
+        self.maybe_compact()
+
+    def delete(self, seq: int) -> None:
+        """Write a tombstone; the old records are dropped by the next compaction."""
+        if seq in self._messages:
+            self._write(seq, 'del')
+            self.maybe_compact()
+
+    # ---- reads ----
+
+    def messages(self) -> List[dict]:
+        """All live messages in send order."""
+        with self._lock:
+            return [self._messages[s] for s in self._order]
+
+    def page(self, before: Optional[int] = None, after: Optional[int] = None, limit: int = 50):
+        """One page of live messages, oldest first. Returns (messages, has_more).
+
+        With `after` the page starts right after that seq (delta sync);
+        otherwise it is the newest `limit` messages older than `before`.
+        """
+        with self._lock:
+            order = self._order
+            if after is not None:
+                start = bisect.bisect_right(order, after)
+                end = start + limit
+                return [self._messages[s] for s in order[start:end]], end < len(order)
+            end = bisect.bisect_left(order, before) if before is not None else len(order)
+            start = max(0, end - limit)
+            return [self._messages[s] for s in order[start:end]], start > 0
+
+    def get(self, seq: int) -> Optional[dict]:
+        """The live in-memory message for `seq`."""
+        with self._lock:
+            return self._messages.get(seq)
+
+    def by_id(self, msg_id: str) -> Optional[dict]:
+        seq = message_index.index.lookup_in(msg_id, COMMUNITY)
+        return None if seq is None else self.get(seq)
+
+    def read(self, seq: int) -> Optional[dict]:
+        """Read one message straight from its segment using the offset index."""
+        entry = self._index.get(seq)
+        if not entry or entry[3] != 'put':
+            return None
+        with open(os.path.join(self.directory, entry[0]), 'rb') as f:
+            f.seek(entry[1])
+            return json_codec.loads(f.readline())['msg']
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self._records.values())
+            return {
+                'segments': len(self._segments),
+                'records': total,
+                'live': len(self._messages),
+                'garbage': total - len(self._messages),
+            }
+
+    # ---- compaction ----
+
+    def _sealed_garbage(self):
+        sealed = self._segments[:-1]
+        records = sum(self._records.get(s, 0) for s in sealed)
+        live = sum(self._live.get(s, 0) for s in sealed)
+        return records - live, records
+
+    def maybe_compact(self) -> None:
+        """Start a background compaction if enough of the sealed log is garbage."""
+        with self._lock:
+            if self._compacting:
+                return
+            garbage, records = self._sealed_garbage()
+            if garbage < COMPACT_MIN_GARBAGE or garbage < records * COMPACT_GARBAGE_RATIO:
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, name='message-log-compact', daemon=True).start()
+
+    def compact(self) -> None:
+        """Rewrite sealed segments keeping only the latest live version of each message."""
+        with self._lock:
+            self._compacting = True
+            sealed = list(self._segments[:-1])
+        try:
+            if sealed:
+                self._compact_segments(sealed)
+        except Exception as e:
+            print(f"Message log compaction failed: {e}")
+        finally:
+            self._compacting = False
+
+    def _compact_segments(self, sealed: List[str]) -> None:
+        sealed_set = set(sealed)
+        outputs = []  # [name, file, size, [(seq, lsn, offset), ...]]
+
+        def start_output():
+            with self._lock:
+                name = self._new_segment_name()
+            outputs.append([name, open(os.path.join(self.directory, name), 'wb'), 0, []])
+
+        for name in sealed:
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                for line in f:
+                    try:
+                        rec = json_codec.loads(line)
+                    except ValueError:
+                        continue
+                    with self._lock:
+                        entry = self._index.get(rec['seq'])
+                    # Keep only the record the index still points at, and only puts
+                    if not entry or entry[0] not in sealed_set or entry[2] != rec['lsn'] or rec['op'] != 'put':
+                        continue
+                    if not outputs or outputs[-1][2] >= self.segment_max_bytes:
+                        start_output()
+                    out = outputs[-1]
+                    out[3].append((rec['seq'], rec['lsn'], out[2]))
+                    out[1].write(line)
+                    out[2] += len(line)
+
+        for out in outputs:
+            out[1].flush()
+            os.fsync(out[1].fileno())
+            out[1].close()
+
+        with self._lock:
+            new_names = [o[0] for o in outputs]
+            self._segments = new_names + [s for s in self._segments if s not in sealed_set]
+            self._write_manifest()
+            for name in sealed:
+                self._records.pop(name, None)
+                self._live.pop(name, None)
+            for name, _, _, recs in outputs:
+                self._records[name] = len(recs)
+                self._live[name] = 0
+                for seq, lsn, offset in recs:
+                    entry = self._index.get(seq)
+                    # A newer version may have landed in the active segment meanwhile
+                    if entry and entry[2] == lsn:
+                        self._index[seq] = (name, offset, lsn, 'put')
+                        self._live[name] += 1
+            # Forget tombstones whose records no longer exist anywhere
+            for seq in [s for s, e in self._index.items() if e[0] in sealed_set]:
+                del self._index[seq]
+
+        for name in sealed:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        with self._lock:
+            self._active.close()
+
+
+def import_legacy(log: MessageLog, json_path: str) -> int:
+    """Move an old messages.json into an empty log once. Returns how many were imported."""
+    if not os.path.exists(json_path) or log.stats()['records']:
+        return 0
+    try:
+        legacy = json_codec.load_file(json_path)
+    except Exception as e:
+        print("Could not read messages.json for migration:", e)
+        return 0
+    log.append_many(legacy or [])
+    os.replace(json_path, json_path + '.migrated')
+    return len(legacy or [])
@@ -0,0 +1,143 @@
+import atexit
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+import json_codec
+
+# Write-behind persistence for the whole-file JSON stores.
+#
+# Handlers used to rewrite users.json, explore.json, cloud.json, ... on every
+# mutation, so a burst of reactions meant a burst of full-file rewrites. Now a
+# save only marks the store dirty; a background thread writes each dirty store
+# once per interval (or sooner when too many stores are pending), always
+# serialising the latest state. Several saves between two flushes collapse into
+# one write, which is what the `coalesced` counter reports. Everything pending is
+# flushed at interpreter exit.
+
+FLUSH_INTERVAL = float(os.getenv('Zylo_FLUSH_INTERVAL', '1.0'))
+FLUSH_MAX_PENDING = int(os.getenv('Zylo_FLUSH_MAX_PENDING', '64'))
+
+
+class WriteBehind:
+    def __init__(self, interval: float = FLUSH_INTERVAL, max_pending: int = FLUSH_MAX_PENDING):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        # Serialises flushes so a store is never written by two threads at once
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[str, Callable[[], None]] = {}
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self._counters = {'scheduled': 0, 'coalesced': 0, 'written': 0, 'errors': 0}
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def schedule(self, key: str, writer: Callable[[], None]) -> None:
+        """Mark `key` dirty. `writer` runs on the next flush and should persist the current state."""
+        with self._lock:
+            if key in self._pending:
+                self._counters['coalesced'] += 1
+            self._pending[key] = writer
+            self._counters['scheduled'] += 1
+            full = len(self._pending) >= self.max_pending
+        if self._thread is None or self._stopped:
+            # Not running in the background (scripts, shutdown): write through
+            self.flush()
+        elif full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Write every dirty store now. Returns how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            written = 0
+            for key, writer in pending.items():
+                try:
+                    writer()
+                    written += 1
+                except Exception as e:
+                    print(f"Write-behind flush of {key} failed: {e}")
+                    with self._lock:
+                        self._counters['errors'] += 1
+                        # Keep it dirty unless a newer save already replaced it
+                        self._pending.setdefault(key, writer)
+            with self._lock:
+                self._counters['written'] += written
+            return written
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters, pending=len(self._pending))
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def stop(self) -> None:
+        """Stop the background thread and flush whatever is still pending."""
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self.flush()
+
+
+writer = WriteBehind()
+
+
+def write_json_atomic(path: str, data) -> None:
+    tmp = path + '.tmp'
+    json_codec.dump_file(tmp, data)
+    os.replace(tmp, path)
+
+
+class JsonStore:
+    """A whole-file JSON store cached in memory and persisted through the write-behind writer.
+
+    load() returns the cached value itself; callers change it (or build a new
+    one) and hand it back to save(), which swaps the cache and schedules a write.
+    """
+
+    def __init__(self, path: str, default=list, create: bool = False):
+        self.path = path
+        self.default = default
+        self.create = create
+        self._lock = threading.RLock()
+        self._data = None
+        self._loaded = False
+
+    def load(self):
+        with self._lock:
+            if not self._loaded:
+                self._data = self._read()
+                self._loaded = True
+            return self._data
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            if self.create:
+                write_json_atomic(self.path, self.default())
+            return self.default()
+        try:
+            return json_codec.load_file(self.path)
+        except Exception:
+            return self.default()
+
+    def save(self, data) -> None:
+        with self._lock:
+            self._data = data
+            self._loaded = True
+        writer.schedule(self.path, self._write)
+
+    def _write(self) -> None:
+        with self._lock:
+            write_json_atomic(self.path, self._data)
@@ -0,0 +1,106 @@
+import atexit
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+# Who is online, by socket.
+#
+# Both directions are indexed (username -> sids, sid -> username), so a
+# disconnect finds its user in one lookup and a user with several tabs stays
+# online until the last one closes. last_active timestamps are buffered and
+# handed to `flush` in one batch every LAST_ACTIVE_FLUSH_INTERVAL seconds (and
+# at exit) instead of saving the user record on every disconnect.
+
+LAST_ACTIVE_FLUSH_INTERVAL = float(os.getenv('Zylo_LAST_ACTIVE_FLUSH_INTERVAL', '30'))
+
+
+class PresenceRegistry:
+    def __init__(self, flush: Callable[[Dict[str, int]], None],
+                 interval: float = LAST_ACTIVE_FLUSH_INTERVAL):
+        self.flush_callback = flush
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._sids: Dict[str, Set[str]] = {}
+        self._users: Dict[str, str] = {}
+        # username -> last_active not yet written to the user record
+        self._last_active: Dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def connect(self, sid: str, username: str) -> bool:
+        """Attach a socket to a user. True if the user just came online."""
+        with self._lock:
+            previous = self._users.get(sid)
+            if previous == username:
+                return False
+            if previous is not None:
+                self._detach(sid, previous)
+            self._users[sid] = username
+            sids = self._sids.setdefault(username, set())
+            sids.add(sid)
+            return len(sids) == 1
+
+    def disconnect(self, sid: str) -> Optional[str]:
+        """Detach a socket. Returns the username if that was the user's last one."""
+        with self._lock:
+            username = self._users.pop(sid, None)
+            if username is None:
+                return None
+            return username if self._detach(sid, username) else None
+
+    def _detach(self, sid: str, username: str) -> bool:
+        sids = self._sids.get(username)
+        if sids is not None:
+            sids.discard(sid)
+            if sids:
+                return False
+            del self._sids[username]
+        self._last_active[username] = int(time.time())
+        return True
+
+    def username_for(self, sid: str) -> Optional[str]:
+        return self._users.get(sid)
+
+    def is_online(self, username: str) -> bool:
+        return username in self._sids
+
+    def online(self) -> List[str]:
+        with self._lock:
+            return list(self._sids)
+
+    def last_active(self, username: str) -> Optional[int]:
+        """A last_active that hasn't been flushed to the user record yet."""
+        return self._last_active.get(username)
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._last_active = self._last_active, {}
+        if pending:
+            try:
+                self.flush_callback(pending)
+            except Exception as e:
+                print(f"Error updating last_active: {e}")
+                with self._lock:
+                    for username, ts in pending.items():
+                        self._last_active.setdefault(username, ts)
+                return 0
+        return len(pending)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='presence-flush', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"online": len(self._sids), "sockets": len(self._users), "pending_last_active": len(self._last_active)}
@@ -0,0 +1,155 @@
+import heapq
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, Optional, Tuple
+
+# Login sessions.
+#
+# Sessions live in a dict (token -> session) so validate() is one lookup, and
+# are written through to a backend so they survive restarts: SQLite by default,
+# or nothing at all (MemoryBackend). Expiry is tracked in a min-heap of
+# (expires_at, token); a background thread pops whatever has expired every
+# SWEEP_INTERVAL seconds, so memory stays bounded by the sessions that are
+# actually live. Logging out leaves a stale heap entry behind, which is simply
+# skipped when its time comes.
+
+SWEEP_INTERVAL = float(os.getenv('Zylo_SESSION_SWEEP_INTERVAL', '60'))
+
+# (token, username, created_at, expires_at)
+Row = Tuple[str, str, int, int]
+
+
+class MemoryBackend:
+    """Keeps nothing; sessions end with the process."""
+
+    def load(self, now: int) -> Iterable[Row]:
+        return []
+
+    def put(self, row: Row) -> None:
+        pass
+
+    def delete(self, tokens: Iterable[str]) -> None:
+        pass
+
+
+class SQLiteBackend:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                token TEXT PRIMARY KEY,
+                username TEXT NOT NULL,
+                created_at INTEGER NOT NULL,
+                expires_at INTEGER NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)')
+        self._conn.commit()
+
+    def load(self, now: int) -> Iterable[Row]:
+        with self._lock:
+            self._conn.execute('DELETE FROM sessions WHERE expires_at < ?', (now,))
+            self._conn.commit()
+            return self._conn.execute('SELECT token, username, created_at, expires_at FROM sessions').fetchall()
+
+    def put(self, row: Row) -> None:
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)', row)
+            self._conn.commit()
+
+    def delete(self, tokens: Iterable[str]) -> None:
+        with self._lock:
+            self._conn.executemany('DELETE FROM sessions WHERE token = ?', [(t,) for t in tokens])
+            self._conn.commit()
+
+
+class SessionStore:
+    def __init__(self, backend, ttl: int, sweep_interval: float = SWEEP_INTERVAL):
+        self.backend = backend
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, dict] = {}
+        self._expiry = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        for token, username, created_at, expires_at in backend.load(int(time.time())):
+            self._add(token, {"username": username, "created_at": created_at, "expires_at": expires_at})
+
+    def _add(self, token: str, session: dict) -> None:
+        self._sessions[token] = session
+        heapq.heappush(self._expiry, (session["expires_at"], token))
+
+    def start(self) -> None:
+        """Start the background expiry sweep."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='session-sweep', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Session sweep failed: {e}")
+
+    def create(self, username: str) -> str:
+        token = str(uuid.uuid4())
+        now = int(time.time())
+        session = {"username": username, "created_at": now, "expires_at": now + self.ttl}
+        with self._lock:
+            self._add(token, session)
+        self.backend.put((token, username, now, session["expires_at"]))
+        return token
+
+    def get(self, token: str) -> Optional[dict]:
+        """The live session for `token`, or None."""
+        if not token:
+            return None
+        session = self._sessions.get(token)
+        if session is None:
+            return None
+        if int(time.time()) > session["expires_at"]:
+            self.invalidate(token)
+            return None
+        return session
+
+    def validate(self, token: str) -> Optional[str]:
+        session = self.get(token)
+        return session["username"] if session else None
+
+    def invalidate(self, token: str) -> bool:
+        with self._lock:
+            found = self._sessions.pop(token, None) is not None
+        if found:
+            self.backend.delete([token])
+        return found
+
+    def sweep(self) -> int:
+        """Drop every expired session. Returns how many were removed."""
+        now = int(time.time())
+        expired = []
+        with self._lock:
+            while self._expiry and self._expiry[0][0] < now:
+                expires_at, token = heapq.heappop(self._expiry)
+                session = self._sessions.get(token)
+                if session is not None and session["expires_at"] == expires_at:
+                    del self._sessions[token]
+                    expired.append(token)
+        if expired:
+            self.backend.delete(expired)
+        return len(expired)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"mode": "store", "active": len(self._sessions), "expiry_entries": len(self._expiry)}
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,267 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import json_codec
+
+# Stateless signed session tokens (Zylo_SESSION_MODE=signed).
+#
+# A token carries its own username, issue time, expiry and id, signed with
+# HMAC-SHA256:
+#
+#     v1.<key id>.<base64url payload>.<base64url signature>
+#
+# so any worker process holding the keys can validate it with no shared lookup.
+# Keys come from Zylo_SESSION_KEYS ("kid:secret,kid:secret", newest first) or
+# from data/session_keys.json, which is created on first use and rotated with
+# scripts/rotate_session_key.py: the newest key signs, older ones keep
+# verifying until every token they signed has expired. Processes re-read the
+# key file at most every KEY_RELOAD_INTERVAL seconds.
+#
+# Logout adds the token id to a revocation list until the token would have
+# expired anyway. Each process validates against an in-memory copy and syncs
+# it from the shared table in sessions.db every REVOCATION_SYNC_INTERVAL
+# seconds, so a logout reaches the other processes within that time.
+
+TOKEN_VERSION = 'v1'
+KEY_RELOAD_INTERVAL = 30
+REVOCATION_SYNC_INTERVAL = float(os.getenv('Zylo_REVOCATION_SYNC_INTERVAL', '5'))
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def new_key() -> dict:
+    return {"kid": secrets.token_hex(4), "secret": secrets.token_urlsafe(32), "created_at": int(time.time())}
+
+
+def _write_key_file(path: str, data: dict) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    json_codec.dump_file(tmp, data)
+    os.chmod(tmp, 0o600)
+    os.replace(tmp, path)
+
+
+def rotate_key_file(path: str, ttl: int) -> dict:
+    """Put a new signing key in front and drop keys retired for longer than `ttl`. Returns the new key."""
+    now = int(time.time())
+    try:
+        keys = json_codec.load_file(path).get("keys", [])
+    except (OSError, ValueError):
+        keys = []
+    if keys and not keys[0].get("retired_at"):
+        keys[0]["retired_at"] = now
+    keys = [k for k in keys if k.get("retired_at", now) + ttl >= now]
+    key = new_key()
+    _write_key_file(path, {"keys": [key] + keys})
+    return key
+
+
+class KeyRing:
+    def __init__(self, path: Optional[str] = None, spec: Optional[str] = None):
+        self.path = path
+        self._keys: List[Tuple[str, bytes]] = []
+        self._checked = 0.0
+        self._stamp = None
+        if spec:
+            for item in spec.split(','):
+                kid, _, secret = item.strip().partition(':')
+                if not kid or not secret:
+                    raise ValueError("Zylo_SESSION_KEYS entries must look like kid:secret")
+                self._keys.append((kid, secret.encode('utf-8')))
+            self.path = None
+        else:
+            self._create_if_missing()
+            self._load()
+
+    def _create_if_missing(self) -> None:
+        if os.path.exists(self.path):
+            return
+        # Write the key in full first, then link it into place: link() fails if
+        # the file exists, so when several workers start together exactly one
+        # key wins and nobody ever reads a half-written file
+        tmp = f"{self.path}.{os.getpid()}.{secrets.token_hex(4)}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json_codec.dumpb({"keys": [new_key()]}))
+                f.flush()
+                os.fsync(f.fileno())
+            try:
+                os.link(tmp, self.path)
+            except FileExistsError:
+                pass
+        finally:
+            os.remove(tmp)
+
+    def _load(self) -> None:
+        st = os.stat(self.path)
+        keys = json_codec.load_file(self.path).get("keys", [])
+        if not keys:
+            raise ValueError(f"No session keys in {self.path}")
+        self._keys = [(k["kid"], k["secret"].encode('utf-8')) for k in keys]
+        self._stamp = (st.st_mtime_ns, st.st_size)
+
+    def _maybe_reload(self) -> None:
+        if self.path is None or time.monotonic() - self._checked < KEY_RELOAD_INTERVAL:
+            return
+        self._checked = time.monotonic()
+        try:
+            st = os.stat(self.path)
+            if (st.st_mtime_ns, st.st_size) != self._stamp:
+                self._load()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Keeping current session keys, reload failed: {e}")
+
+    def current(self) -> Tuple[str, bytes]:
+        self._maybe_reload()
+        return self._keys[0]
+
+    def secret(self, kid: str) -> Optional[bytes]:
+        self._maybe_reload()
+        for k, secret in self._keys:
+            if k == kid:
+                return secret
+        return None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class RevocationList:
+    def __init__(self, path: str, sync_interval: float = REVOCATION_SYNC_INTERVAL):
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS revoked_tokens (
+                jti TEXT PRIMARY KEY,
+                expires_at INTEGER NOT NULL
+            )
+        ''')
+        self._conn.commit()
+        # token id -> expires_at
+        self._revoked: Dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.sync()
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self._revoked
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def add(self, jti: str, expires_at: int) -> None:
+        with self._lock:
+            self._conn.execute('INSERT OR IGNORE INTO revoked_tokens VALUES (?, ?)', (jti, expires_at))
+            self._conn.commit()
+            self._revoked[jti] = expires_at
+
+    def sync(self) -> None:
+        """Drop expired entries and pick up revocations made by other processes."""
+        now = int(time.time())
+        with self._lock:
+            self._conn.execute('DELETE FROM revoked_tokens WHERE expires_at < ?', (now,))
+            self._conn.commit()
+            rows = self._conn.execute('SELECT jti, expires_at FROM revoked_tokens').fetchall()
+            self._revoked = dict(rows)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='revocation-sync', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.sync_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Revocation list sync failed: {e}")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+class SignedSessions:
+    """Same interface as session_store.SessionStore, with nothing stored per session."""
+
+    def __init__(self, keys: KeyRing, revoked: RevocationList, ttl: int):
+        self.keys = keys
+        self.revoked = revoked
+        self.ttl = ttl
+
+    def start(self) -> None:
+        self.revoked.start()
+
+    @staticmethod
+    def _sign(secret: bytes, body: str) -> str:
+        return _b64(hmac.new(secret, body.encode('utf-8'), hashlib.sha256).digest())
+
+    def create(self, username: str) -> str:
+        now = int(time.time())
+        payload = {"u": username, "iat": now, "exp": now + self.ttl, "jti": secrets.token_hex(8)}
+        kid, secret = self.keys.current()
+        body = f"{TOKEN_VERSION}.{kid}.{_b64(json_codec.dumpb(payload, pretty=False))}"
+        return f"{body}.{self._sign(secret, body)}"
+
+    def _payload(self, token: str) -> Optional[dict]:
+        """Verified, unexpired payload of `token` (revoked or not), or None."""
+        if not token or not isinstance(token, str):
+            return None
+        parts = token.split('.')
+        if len(parts) != 4 or parts[0] != TOKEN_VERSION:
+            return None
+        secret = self.keys.secret(parts[1])
+        if secret is None:
+            return None
+        body = token.rsplit('.', 1)[0]
+        if not hmac.compare_digest(self._sign(secret, body), parts[3]):
+            return None
+        try:
+            payload = json_codec.loads(_unb64(parts[2]))
+        except ValueError:
+            return None
+        if not isinstance(payload, dict) or int(time.time()) > payload.get("exp", 0):
+            return None
+        return payload
+
+    def get(self, token: str) -> Optional[dict]:
+        payload = self._payload(token)
+        if payload is None or payload.get("jti") in self.revoked:
+            return None
+        return {"username": payload["u"], "created_at": payload["iat"], "expires_at": payload["exp"]}
+
+    def validate(self, token: str) -> Optional[str]:
+        session = self.get(token)
+        return session["username"] if session else None
+
+    def invalidate(self, token: str) -> bool:
+        payload = self._payload(token)
+        if payload is None or payload.get("jti") in self.revoked:
+            return False
+        self.revoked.add(payload["jti"], payload["exp"])
+        return True
+
+    def sweep(self) -> int:
+        before = len(self.revoked)
+        self.revoked.sync()
+        return max(0, before - len(self.revoked))
+
+    def stats(self) -> dict:
+        return {"mode": "signed", "keys": len(self.keys), "revoked": len(self.revoked)}
+
+    def stop(self) -> None:
+        self.revoked.stop()
@@ -0,0 +1,254 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import threading
+from typing import Dict, Optional, Tuple
+
+from flask import request
+from werkzeug.exceptions import NotFound
+from werkzeug.utils import safe_join
+
+import json_codec
+from media import send_media
+
+# Precompressed, fingerprinted frontend assets.
+#
+# `build()` (run via scripts/build_assets.py) walks frontend/ and writes:
+#   * <file>.br / <file>.gz next to a mirror of every text asset, compressed
+#     once at maximum level instead of on every request
+#   * a manifest naming each asset's fingerprinted URL (chat.js ->
+#     chat.3f2a9c1b0d.js), derived from its content
+#   * copies of the HTML pages with same-origin src/href references rewritten
+#     to the fingerprinted URLs
+#
+# StaticAssets serves from that build: fingerprinted URLs never change meaning,
+# so they are cacheable for a year without revalidation; HTML and unhashed URLs
+# are revalidated (ETag, 304). The best encoding the client accepts is picked
+# from Accept-Encoding. An asset edited after the build is detected by its
+# mtime/size and served straight from frontend/ again. So is every built page
+# that references it: its rewritten copy still points at the old fingerprinted
+# URL, which clients may hold as immutable, so the original (unhashed
+# references, revalidated) goes out until the next build. Without a build
+# everything is served from frontend/.
+#
+# brotli is optional; without it only gzip variants are produced.
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+MANIFEST_NAME = 'manifest.json'
+COMPRESSIBLE_EXTENSIONS = {'html', 'css', 'js', 'mjs', 'json', 'map', 'svg', 'txt', 'webmanifest', 'ico'}
+# Compressing tiny files saves nothing once headers are counted
+MIN_COMPRESS_BYTES = 1024
+# Entry points keep their URLs; everything else gets a fingerprinted one too
+UNHASHED_EXTENSIONS = {'html'}
+HASH_LENGTH = 10
+# Preference when the client accepts several encodings equally
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# src="..." / href="..." in HTML, minus the query string (?v=4 is superseded by the hash)
+_REFERENCE = re.compile(r'''(\b(?:src|href)\s*=\s*)(["'])([^"'?#]+)(\?[^"'#]*)?(?=["'#])''', re.I)
+_EXTERNAL = re.compile(r'^(?:[a-z][a-z0-9+.-]*:|//|#|\$\{)', re.I)
+
+mimetypes.add_type('application/manifest+json', '.webmanifest')
+
+
+def _ext(rel: str) -> str:
+    return rel.rsplit('.', 1)[-1].lower() if '.' in posixpath.basename(rel) else ''
+
+
+def hashed_name(rel: str, digest: str) -> str:
+    stem, dot, ext = rel.rpartition('.')
+    if not dot or '/' in ext:
+        return f"{rel}.{digest[:HASH_LENGTH]}"
+    return f"{stem}.{digest[:HASH_LENGTH]}.{ext}"
+
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _compress(data: bytes, target: str) -> Dict[str, int]:
+    """Write the encoded variants of `data` that are worth keeping. Returns encoding -> size."""
+    sizes = {}
+    if len(data) < MIN_COMPRESS_BYTES:
+        return sizes
+    variants = [('gzip', '.gz', lambda d: gzip.compress(d, 9, mtime=0))]
+    if brotli is not None:
+        variants.insert(0, ('br', '.br', lambda d: brotli.compress(d, quality=11)))
+    for encoding, suffix, compress in variants:
+        encoded = compress(data)
+        if len(encoded) < len(data) * 0.9:
+            _write(target + suffix, encoded)
+            sizes[encoding] = len(encoded)
+    return sizes
+
+
+def _rewrite_html(html: str, rel: str, assets: Dict[str, dict], refs: set) -> str:
+    """Point same-origin references at fingerprinted URLs, collecting the assets used in `refs`."""
+    base = posixpath.dirname(rel)
+
+    def replace(match):
+        ref = match.group(3)
+        if _EXTERNAL.match(ref):
+            return match.group(0)
+        target = posixpath.normpath(ref.lstrip('/') if ref.startswith('/') else posixpath.join(base, ref))
+        entry = assets.get(target)
+        if not entry or 'hashed' not in entry:
+            return match.group(0)
+        refs.add(target)
+        return f"{match.group(1)}{match.group(2)}/{entry['hashed']}"
+
+    return _REFERENCE.sub(replace, html)
+
+
+def build(frontend_dir: str, build_dir: str) -> dict:
+    """Precompress and fingerprint frontend_dir into build_dir. Returns a summary."""
+    frontend_dir = os.path.abspath(frontend_dir)
+    staging = build_dir.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    assets: Dict[str, dict] = {}
+    pages = []
+    summary = {'files': 0, 'fingerprinted': 0, 'compressed': 0, 'pages': 0,
+               'raw_bytes': 0, 'gzip_bytes': 0, 'br_bytes': 0}
+    for root, dirs, files in os.walk(frontend_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, frontend_dir).replace(os.sep, '/')
+            st = os.stat(path)
+            entry = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'encodings': {}}
+            assets[rel] = entry
+            summary['files'] += 1
+            if _ext(rel) in UNHASHED_EXTENSIONS:
+                pages.append(rel)
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            entry['hashed'] = hashed_name(rel, hashlib.sha256(data).hexdigest())
+            summary['fingerprinted'] += 1
+            if _ext(rel) in COMPRESSIBLE_EXTENSIONS:
+                entry['encodings'] = _compress(data, os.path.join(staging, rel))
+
+    # Pages last, once every asset they reference has its fingerprint
+    for rel in pages:
+        refs = set()
+        with open(os.path.join(frontend_dir, rel), 'r', encoding='utf-8') as f:
+            data = _rewrite_html(f.read(), rel, assets, refs).encode('utf-8')
+        _write(os.path.join(staging, rel), data)
+        assets[rel]['rewritten'] = True
+        assets[rel]['refs'] = sorted(refs)
+        assets[rel]['encodings'] = _compress(data, os.path.join(staging, rel))
+        summary['pages'] += 1
+
+    for rel, entry in assets.items():
+        if entry['encodings'] and _ext(rel) in COMPRESSIBLE_EXTENSIONS:
+            summary['compressed'] += 1
+            summary['raw_bytes'] += entry['size']
+            summary['gzip_bytes'] += entry['encodings'].get('gzip', entry['size'])
+            summary['br_bytes'] += entry['encodings'].get('br', entry['encodings'].get('gzip', entry['size']))
+
+    json_codec.dump_file(os.path.join(staging, MANIFEST_NAME), {'assets': assets}, pretty=False)
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.replace(staging, build_dir)
+    return summary
+
+
+class StaticAssets:
+    def __init__(self, frontend_dir: str, build_dir: str):
+        self.frontend_dir = os.path.abspath(frontend_dir)
+        self.build_dir = os.path.abspath(build_dir)
+        self._lock = threading.Lock()
+        self._manifest_stamp = None
+        self._assets: Dict[str, dict] = {}
+        # fingerprinted path -> logical path
+        self._hashed: Dict[str, str] = {}
+
+    def _refresh(self) -> None:
+        """Pick up a new build without a restart."""
+        try:
+            st = os.stat(os.path.join(self.build_dir, MANIFEST_NAME))
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+        if stamp == self._manifest_stamp:
+            return
+        with self._lock:
+            assets = {}
+            if stamp is not None:
+                try:
+                    assets = json_codec.load_file(os.path.join(self.build_dir, MANIFEST_NAME)).get('assets', {})
+                except (OSError, ValueError) as e:
+                    print(f"Ignoring unreadable static build manifest: {e}")
+            self._assets = assets
+            self._hashed = {e['hashed']: rel for rel, e in assets.items() if 'hashed' in e}
+            self._manifest_stamp = stamp
+
+    def _current(self, rel: str, entry: dict) -> bool:
+        try:
+            st = os.stat(os.path.join(self.frontend_dir, rel))
+        except OSError:
+            return False
+        return (st.st_mtime_ns, st.st_size) == (entry['mtime_ns'], entry['size'])
+
+    def resolve(self, path: str) -> Tuple[str, Optional[dict], bool]:
+        """Map a request path to (logical path, build entry or None if unusable, immutable)."""
+        self._refresh()
+        rel = posixpath.normpath(path).lstrip('/')
+        logical = self._hashed.get(rel)
+        if logical is not None:
+            entry = self._assets[logical]
+            current = self._current(logical, entry)
+            return logical, entry if current else None, current
+        entry = self._assets.get(rel)
+        if not entry or not self._current(rel, entry):
+            return rel, None, False
+        # A page is only as fresh as the assets its rewritten copy points at
+        for ref in entry.get('refs', ()):
+            ref_entry = self._assets.get(ref)
+            if ref_entry is None or not self._current(ref, ref_entry):
+                return rel, None, False
+        return rel, entry, False
+
+    @staticmethod
+    def _pick_encoding(available) -> Optional[Tuple[str, str]]:
+        best, best_q = None, 0
+        for encoding, suffix in ENCODINGS:
+            q = request.accept_encodings[encoding] if encoding in available else 0
+            if q > best_q:
+                best, best_q = (encoding, suffix), q
+        return best
+
+    def send(self, path: str):
+        """Response for a frontend file, e.g. send('files/js/chat.js')."""
+        rel, entry, immutable = self.resolve(path)
+        source = safe_join(self.frontend_dir, rel)
+        if source is None or not os.path.isfile(source):
+            raise NotFound()
+        # Named explicitly so .br/.gz variants aren't typed by their suffix
+        mimetype = mimetypes.guess_type(rel)[0] or 'application/octet-stream'
+        if entry is None:
+            return send_media(source, mimetype=mimetype, immutable=immutable)
+
+        built = os.path.join(self.build_dir, rel)
+        chosen = self._pick_encoding(entry['encodings'])
+        if chosen:
+            path = built + chosen[1]
+        else:
+            path = built if entry.get('rewritten') else source
+        response = send_media(path, mimetype=mimetype, immutable=immutable)
+        if entry['encodings']:
+            response.vary.add('Accept-Encoding')
+        if chosen:
+            response.headers['Content-Encoding'] = chosen[0]
+        return response
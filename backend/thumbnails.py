@@ -0,0 +1,188 @@
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+# Responsive image variants for uploads.
+#
+# When an image is uploaded (avatar, banner, explore post, group icon, chat
+# upload) a small worker pool renders WebP copies at fixed sizes into a disk
+# cache. /uploads/...?size=64 then serves the variant instead of the original,
+# so a member list downloads 64px avatars rather than full photos. Variants are
+# keyed by the source path, its mtime and size, so overwriting avatar.png
+# naturally produces fresh ones. A request never waits for rendering: until
+# the variant exists the original is served with a short-lived cache header.
+# Each source also has a small record (sources/<hash of path>) naming its
+# current key, so the previous version's variants are removed once the new
+# ones are written, and a sweep at startup drops variants of deleted sources.
+#
+# Pillow (in requirements.txt) is needed to render; without it nothing is
+# generated and the originals are served as before.
+
+try:
+    from PIL import Image, ImageOps
+except Exception:  # pragma: no cover
+    Image = None
+    ImageOps = None
+
+SIZES = (64, 256, 1024)
+WORKERS = int(os.getenv('Zylo_THUMB_WORKERS', '2'))
+WEBP_QUALITY = 80
+# Animated and vector formats are left alone
+SOURCE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'bmp', 'tif', 'tiff'}
+
+
+class Thumbnailer:
+    def __init__(self, cache_dir: str, workers: int = WORKERS):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='thumbnails')
+        self._lock = threading.Lock()
+        # cache key -> future rendering every size of that source
+        self._pending: Dict[str, object] = {}
+        if self.enabled:
+            self._pool.submit(self.sweep)
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None
+
+    def eligible(self, path: str) -> bool:
+        return self.enabled and path.rsplit('.', 1)[-1].lower() in SOURCE_EXTENSIONS
+
+    def _key(self, path: str) -> Optional[str]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        raw = f"{os.path.abspath(path)}\0{st.st_mtime_ns}\0{st.st_size}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _variant_path(self, key: str, size: int) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}_{size}.webp")
+
+    def _done_path(self, key: str) -> str:
+        # Marks a source as rendered, so sizes it was too small for aren't retried
+        return os.path.join(self.cache_dir, key[:2], f"{key}.done")
+
+    def _source_record(self, path: str) -> str:
+        digest = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, 'sources', digest)
+
+    def _remove_key(self, key: str) -> None:
+        for out in [self._variant_path(key, size) for size in SIZES] + [self._done_path(key)]:
+            try:
+                os.remove(out)
+            except OSError:
+                pass
+
+    def _recorded_key(self, record: str) -> Tuple[Optional[str], Optional[str]]:
+        """(source path, key) stored in a source record."""
+        try:
+            with open(record, 'r', encoding='utf-8') as f:
+                source, _, key = f.read().partition('\n')
+            return source, key or None
+        except OSError:
+            return None, None
+
+    def _set_current(self, path: str, key: str) -> None:
+        """Record `key` as the source's current version and drop the previous one's variants."""
+        record = self._source_record(path)
+        _, previous = self._recorded_key(record)
+        os.makedirs(os.path.dirname(record), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(record), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(f"{os.path.abspath(path)}\n{key}")
+        os.replace(tmp, record)
+        if previous and previous != key:
+            self._remove_key(previous)
+
+    def discard(self, path: str) -> None:
+        """Remove the variants of a source that is being deleted."""
+        record = self._source_record(path)
+        _, key = self._recorded_key(record)
+        if key:
+            self._remove_key(key)
+        try:
+            os.remove(record)
+        except OSError:
+            pass
+
+    def sweep(self) -> int:
+        """Drop variants whose source file no longer exists. Returns how many sources were dropped."""
+        directory = os.path.join(self.cache_dir, 'sources')
+        dropped = 0
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return 0
+        for name in names:
+            source, _ = self._recorded_key(os.path.join(directory, name))
+            if source and not os.path.exists(source):
+                self.discard(source)
+                dropped += 1
+        return dropped
+
+    def submit(self, path: str):
+        """Queue rendering of all sizes for an image. Returns the future, or None if not applicable."""
+        if not self.eligible(path):
+            return None
+        key = self._key(path)
+        if key is None:
+            return None
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pool.submit(self._render, path, key)
+                self._pending[key] = future
+                future.add_done_callback(lambda _f, k=key: self._forget(k))
+            return future
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def _render(self, path: str, key: str) -> None:
+        try:
+            with Image.open(path) as img:
+                img = ImageOps.exif_transpose(img)
+                if img.mode not in ('RGB', 'RGBA'):
+                    img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+                for size in SIZES:
+                    out = self._variant_path(key, size)
+                    if os.path.exists(out) or max(img.size) <= size:
+                        # Never upscale; the original is served for sizes it already fits
+                        continue
+                    variant = img.copy()
+                    variant.thumbnail((size, size), Image.LANCZOS)
+                    os.makedirs(os.path.dirname(out), exist_ok=True)
+                    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(out), suffix='.tmp')
+                    with os.fdopen(fd, 'wb') as f:
+                        variant.save(f, 'WEBP', quality=WEBP_QUALITY, method=4)
+                    os.replace(tmp, out)
+            os.makedirs(os.path.dirname(self._done_path(key)), exist_ok=True)
+            open(self._done_path(key), 'w').close()
+            self._set_current(path, key)
+        except Exception as e:
+            print(f"Thumbnail generation failed for {path}: {e}")
+
+    def variant(self, path: str, size: int) -> Tuple[Optional[str], bool]:
+        """(path of the `size` variant or None, whether that answer is final).
+
+        None means the original should be served: final when there will never
+        be a variant (no Pillow, not an image, already small enough), not final
+        while it is still being rendered in the background.
+        """
+        if size not in SIZES or not self.eligible(path):
+            return None, True
+        key = self._key(path)
+        if key is None:
+            return None, True
+        out = self._variant_path(key, size)
+        if os.path.exists(out):
+            return out, True
+        if os.path.exists(self._done_path(key)):
+            return None, True
+        return None, self.submit(path) is None
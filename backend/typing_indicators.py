@@ -0,0 +1,71 @@
+import os
+import threading
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+# Typing indicator state.
+#
+# Typing events go to the conversation they belong to (a DM partner's tabs, a
+# group channel's open viewers, the community), never to every socket. A user typing in one
+# conversation produces at most one "typing" event per THROTTLE seconds - often
+# enough to keep the client's indicator (shown for 2.5 s per event) steady -
+# and one "stop_typing" when they say they stopped, disconnect, or go quiet for
+# TIMEOUT seconds. Rooms are opaque to the tracker; app.py passes
+# (socket.io room, context sent with the event) pairs.
+
+THROTTLE = float(os.getenv('Zylo_TYPING_THROTTLE', '2'))
+TIMEOUT = float(os.getenv('Zylo_TYPING_TIMEOUT', '5'))
+
+# (username, room)
+Key = Tuple[str, Hashable]
+
+
+class TypingTracker:
+    def __init__(self, throttle: float = THROTTLE, timeout: float = TIMEOUT):
+        self.throttle = throttle
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # key -> [last "typing" sent, stop deadline]
+        self._active: Dict[Key, List[float]] = {}
+        self._counters = {'received': 0, 'sent': 0, 'throttled': 0, 'timed_out': 0}
+
+    def start(self, username: str, room: Hashable, now: Optional[float] = None) -> bool:
+        """Record a keystroke. True if a "typing" event should go out."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._counters['received'] += 1
+            state = self._active.get((username, room))
+            if state is not None and now - state[0] < self.throttle:
+                state[1] = now + self.timeout
+                self._counters['throttled'] += 1
+                return False
+            self._active[(username, room)] = [now, now + self.timeout]
+            self._counters['sent'] += 1
+            return True
+
+    def stop(self, username: str, room: Hashable) -> bool:
+        """True if the user was typing there, i.e. a "stop_typing" should go out."""
+        with self._lock:
+            return self._active.pop((username, room), None) is not None
+
+    def stop_all(self, username: str) -> List[Hashable]:
+        """Rooms the user was typing in (on disconnect)."""
+        with self._lock:
+            keys = [k for k in self._active if k[0] == username]
+            for key in keys:
+                del self._active[key]
+            return [room for _, room in keys]
+
+    def expired(self, now: Optional[float] = None) -> List[Key]:
+        """Pop typers whose last keystroke is older than the timeout."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            keys = [k for k, (_, deadline) in self._active.items() if deadline <= now]
+            for key in keys:
+                del self._active[key]
+            self._counters['timed_out'] += len(keys)
+            return keys
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters, active=len(self._active))
@@ -0,0 +1,148 @@
+import os
+import threading
+from typing import Dict, List, Optional
+
+import json_codec
+import persistence
+
+# users.json kept in memory with hash indexes.
+#
+# Login, profile reads and the friends endpoints used to re-read users.json and
+# scan it for every request. The repository loads the file once and keeps
+# three indexes (exact username, lowercase email, lowercase usertag) next to the
+# list. Writers mutate the user dicts in place and call save(), which re-indexes
+# only those users and schedules a write-behind flush of the file.
+
+
+def _lower(value) -> str:
+    return (value or '').strip().lower()
+
+
+class UserRepository:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._users: Optional[List[dict]] = None
+        self._by_name: Dict[str, dict] = {}
+        self._by_name_lower: Dict[str, dict] = {}
+        self._by_email: Dict[str, dict] = {}
+        self._by_tag: Dict[str, dict] = {}
+        # id(user) -> the keys it is currently indexed under
+        self._keys: Dict[int, tuple] = {}
+
+    # ---- loading / indexing ----
+
+    def _load(self) -> List[dict]:
+        if self._users is None:
+            users = []
+            if os.path.exists(self.path):
+                users = json_codec.load_file(self.path)
+            self._users = users
+            self._reindex_all()
+        return self._users
+
+    def _reindex_all(self) -> None:
+        self._by_name, self._by_name_lower, self._by_email, self._by_tag, self._keys = {}, {}, {}, {}, {}
+        # Walk backwards so the first user in the file wins on duplicate keys,
+        # matching the old linear scans
+        for user in reversed(self._users or []):
+            self._index(user)
+
+    def _index(self, user: dict) -> None:
+        keys = (user.get('username'), _lower(user.get('username')), _lower(user.get('email')), _lower(user.get('usertag')))
+        name, lname, email, tag = keys
+        if name:
+            self._by_name[name] = user
+        if lname:
+            self._by_name_lower[lname] = user
+        if email:
+            self._by_email[email] = user
+        if tag:
+            self._by_tag[tag] = user
+        self._keys[id(user)] = keys
+
+    def _unindex(self, user: dict) -> None:
+        keys = self._keys.pop(id(user), None)
+        if not keys:
+            return
+        for index, key in zip((self._by_name, self._by_name_lower, self._by_email, self._by_tag), keys):
+            if key and index.get(key) is user:
+                del index[key]
+
+    def invalidate(self) -> None:
+        """Drop the cache; the next access reloads users.json."""
+        with self._lock:
+            self._users = None
+
+    # ---- reads ----
+
+    def all(self) -> List[dict]:
+        """The live user list. Call save() after changing anything in it."""
+        with self._lock:
+            return self._load()
+
+    def count(self) -> int:
+        return len(self.all())
+
+    def get(self, username: str, ignore_case: bool = False) -> Optional[dict]:
+        """Username match, exact unless ignore_case is set."""
+        with self._lock:
+            self._load()
+            if ignore_case:
+                return self._by_name_lower.get(_lower(username))
+            return self._by_name.get(username)
+
+    def by_email(self, email: str) -> Optional[dict]:
+        with self._lock:
+            self._load()
+            return self._by_email.get(_lower(email))
+
+    def find(self, identifier: str) -> Optional[dict]:
+        """Lookup by username, email or usertag (with or without @), case-insensitive."""
+        query = _lower(identifier)
+        if not query:
+            return None
+        query_tag = query if query.startswith('@') else f"@{query}"
+        with self._lock:
+            self._load()
+            return self._by_name_lower.get(query) or self._by_email.get(query) or self._by_tag.get(query_tag)
+
+    # ---- writes ----
+
+    def add(self, user: dict) -> None:
+        with self._lock:
+            self._load().append(user)
+            self._index(user)
+            self._persist()
+
+    def save(self, *users: dict) -> None:
+        """Re-index users that were changed in place and persist."""
+        with self._lock:
+            self._load()
+            for user in users:
+                self._unindex(user)
+                self._index(user)
+            self._persist()
+
+    def remove(self, username: str) -> bool:
+        with self._lock:
+            user = self.get(username)
+            if user is None:
+                return False
+            self._users = [u for u in self._users if u is not user]
+            self._unindex(user)
+            self._persist()
+            return True
+
+    def replace_all(self, users: List[dict]) -> None:
+        with self._lock:
+            self._users = users
+            self._reindex_all()
+            self._persist()
+
+    def _persist(self) -> None:
+        persistence.writer.schedule(self.path, self._write)
+
+    def _write(self) -> None:
+        with self._lock:
+            persistence.write_json_atomic(self.path, self._users)
@@ -0,0 +1,86 @@
+import os
+import time
+import zipfile
+from typing import Iterable, Iterator, Tuple
+
+# Streaming ZIP archives.
+#
+# The archive is produced as a generator of byte chunks: each file is read and
+# compressed a piece at a time and whatever the zip writer produced is yielded
+# straight away, so the first bytes go out immediately and memory stays at
+# roughly one chunk per download however large the archive gets. zipfile
+# handles the unseekable output by writing data descriptors after each entry.
+#
+# Media and archives are already compressed; deflating them again only costs
+# CPU, so those entries are stored as-is.
+
+CHUNK_SIZE = 64 * 1024
+STORED_EXTENSIONS = {
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'avif', 'heic',
+    'mp4', 'mov', 'webm', 'mkv', 'avi', 'm4v',
+    'mp3', 'm4a', 'aac', 'ogg', 'opus', 'flac',
+    'zip', 'gz', 'tgz', 'bz2', 'xz', '7z', 'rar', 'zst',
+}
+
+
+class _Sink:
+    """Write-only buffer the zip writer appends to; drained after every chunk."""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def compression_for(name: str) -> int:
+    ext = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def _unique(name: str, used: set) -> str:
+    candidate, n = name, 1
+    stem, dot, ext = name.rpartition('.')
+    while candidate in used:
+        candidate = f"{stem} ({n}).{ext}" if dot else f"{name} ({n})"
+        n += 1
+    used.add(candidate)
+    return candidate
+
+
+def iter_zip(entries: Iterable[Tuple[str, str]]) -> Iterator[bytes]:
+    """Yield a ZIP archive of (local path, name in archive) pairs chunk by chunk."""
+    sink = _Sink()
+    used = set()
+    with zipfile.ZipFile(sink, 'w') as zf:
+        for path, arcname in entries:
+            try:
+                st = os.stat(path)
+                info = zipfile.ZipInfo(_unique(arcname or os.path.basename(path), used),
+                                       date_time=time.localtime(st.st_mtime)[:6])
+                info.compress_type = compression_for(info.filename)
+                info.file_size = st.st_size
+                with open(path, 'rb') as src, zf.open(info, 'w', force_zip64=st.st_size > 0x7fffffff) as dst:
+                    for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                        dst.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            except OSError as e:
+                print(f"Failed to add {arcname} to zip: {e}")
+            data = sink.drain()
+            if data:
+                yield data
+    # Central directory
+    data = sink.drain()
+    if data:
+        yield data
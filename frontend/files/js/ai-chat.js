@@ -504,6 +504,27 @@ class AIChatManager {
             // Get selected sub-model
             const modelKey = session.model;
             const selectedSubModel = localStorage.getItem(`ai_model_${modelKey}`) || 'gemma:1b';
+            const requestBody = JSON.stringify({
+                model: selectedSubModel,
+                messages: session.messages.map(m => ({
+                    role: m.role,
+                    content: m.role === 'user' && m.attachments && m.attachments.length > 0 
+                        ? `${m.attachments.map(a => `[Attachment: ${a.originalName}]`).join('\n')}\n\n${m.content}`
+                        : m.content
+                })), // Send full history with attachment context
+                persona: options.persona || modelKey,
+                mode: options.mode || 'Thinking',
+                sessionId: session.id
+            });
+
+            // Prefer the streamed reply; fall back to the one-shot endpoint if streaming is unavailable
+            const streamed = await this.streamReply(session.model, container, requestBody);
+            if (streamed) {
+                session.messages.push({ role: 'assistant', content: streamed.error ? 'Error: ' + streamed.error : streamed.reply });
+                this.saveSession(session);
+                if (streamed.error) this.renderSessionContent(session, container);
+                return;
+            }
             
             const response = await fetch('/api/ai/chat', {
                 method: 'POST',
@@ -511,18 +532,7 @@ class AIChatManager {
                     'Content-Type': 'application/json',
                     'Authorization': `Bearer ${localStorage.getItem('session_token')}`
                 },
-                body: JSON.stringify({
-                    model: selectedSubModel,
-                    messages: session.messages.map(m => ({
-                        role: m.role,
-                        content: m.role === 'user' && m.attachments && m.attachments.length > 0 
-                            ? `${m.attachments.map(a => `[Attachment: ${a.originalName}]`).join('\n')}\n\n${m.content}`
-                            : m.content
-                    })), // Send full history with attachment context
-                    persona: options.persona || modelKey,
-                    mode: options.mode || 'Thinking',
-                    sessionId: session.id
-                })
+                body: requestBody
             });
             
             const data = await response.json();
@@ -583,6 +593,82 @@ class AIChatManager {
         }
     }
 
+    // Read /api/ai/chat/stream (Server-Sent Events) and render thinking and answer
+    // tokens as they arrive. Returns { reply, error }, or null if streaming is unavailable.
+    async streamReply(model, container, requestBody) {
+        let response;
+        try {
+            response = await fetch('/api/ai/chat/stream', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Authorization': `Bearer ${localStorage.getItem('session_token')}`
+                },
+                body: requestBody
+            });
+        } catch (e) {
+            return null;
+        }
+        if (!response.ok || !response.body || !(response.headers.get('Content-Type') || '').startsWith('text/event-stream')) return null;
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '', thinking = '', answer = '', error = null;
+        let thoughtEl = null, thoughtContent = null, proseEl = null, pending = false;
+
+        // Re-render at most once per frame however fast tokens come in
+        const render = () => {
+            pending = false;
+            if (thoughtContent) thoughtContent.innerHTML = this.simpleMarkdown(thinking);
+            if (proseEl) proseEl.innerHTML = this.simpleMarkdown(answer);
+            container.scrollTop = container.scrollHeight;
+        };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let end;
+            while ((end = buffer.indexOf('\n\n')) >= 0) {
+                const line = buffer.slice(0, end).split('\n').find(l => l.startsWith('data: '));
+                buffer = buffer.slice(end + 2);
+                if (!line) continue;
+                const event = JSON.parse(line.slice(6));
+                if (event.type === 'thinking') {
+                    if (!thoughtEl) {
+                        this.hideTyping(container);
+                        thoughtEl = document.createElement('div');
+                        thoughtEl.className = 'mb-2 max-w-[85%] ml-[54px] flex items-start gap-3';
+                        thoughtEl.innerHTML = `<details class="ai-thought" style="flex:1" open><summary class="ai-thought-header"><i data-feather="cpu" class="w-4 h-4"></i> Thinking Process</summary><div class="ai-thought-content"></div></details>`;
+                        container.appendChild(thoughtEl);
+                        thoughtContent = thoughtEl.querySelector('.ai-thought-content');
+                        if(window.feather) feather.replace();
+                    }
+                    thinking += event.text;
+                } else if (event.type === 'answer') {
+                    if (!proseEl) {
+                        this.hideTyping(container);
+                        if (thoughtEl) thoughtEl.querySelector('details').open = false;
+                        proseEl = this.appendMessageToDOM(model, 'assistant', '', container).querySelector('.prose');
+                    }
+                    answer += event.text;
+                } else if (event.type === 'error') {
+                    error = event.error;
+                } else if (event.type === 'done') {
+                    console.debug(`AI stream: first token ${event.ttft_ms} ms, first answer token ${event.first_answer_ms} ms`);
+                }
+                if (!pending) {
+                    pending = true;
+                    requestAnimationFrame(render);
+                }
+            }
+        }
+        this.hideTyping(container);
+        render();
+        if (error) return { error };
+        return { reply: thinking ? `<think>${thinking}</think>\n\n${answer}` : answer };
+    }
+
     appendMessageToDOM(model, role, content, container, attachments = []) {
         const div = document.createElement('div');
         const isUser = role === 'user';
@@ -688,6 +688,10 @@ async function appendCommunityMessage(data) {
     if (data.id && chatMessagesCommunity.querySelector(`[data-msg-id="${data.id}"]`)) {
         return;
     }
+    // Reconnect cursor; held back while a catch-up is pending so missed messages aren't skipped
+    if (!communityHistory.syncing && data.seq > (communityHistory.after || 0)) {
+        communityHistory.after = data.seq;
+    }
     
     const msgElement = await createDiscordMessage(data);
     chatMessagesCommunity.appendChild(msgElement);
@@ -1117,6 +1121,68 @@ async function startVoiceRecording(context) {
 
 // ...
 
+// DM history is paged: the newest page on open, older pages as the user scrolls up,
+// and only what arrived after the last seen seq when the socket reconnects
+var DM_PAGE_SIZE = 50;
+var dmHistory = { peer: null, before: null, after: null, hasMore: false, loading: false, syncing: false };
+
+function dmHistoryUrl(peerUsername, cursor = '') {
+    const me = localStorage.getItem('savedUsername') || 'User';
+    return `/api/dm/history?userA=${encodeURIComponent(me)}&userB=${encodeURIComponent(peerUsername)}&limit=${DM_PAGE_SIZE}${cursor}`;
+}
+
+async function loadOlderDMs(peerUsername) {
+    const container = document.getElementById('friendsChatMessages');
+    const state = dmHistory;
+    if (!container || state.peer !== peerUsername || !state.hasMore || state.loading || state.before == null) return;
+    state.loading = true;
+    try {
+        const res = await fetch(dmHistoryUrl(peerUsername, `&before=${state.before}`));
+        const data = await res.json();
+        if (dmHistory !== state) return; // switched conversation meanwhile
+        // Prepend newest-first above the current top, keeping the view where it was
+        const previousHeight = container.scrollHeight;
+        for (const m of (data.messages || []).slice().reverse()) {
+            if (m.id && container.querySelector(`[data-msg-id="${m.id}"]`)) continue;
+            const el = await createDiscordMessage({ ...m, username: m.from });
+            container.insertBefore(el, container.firstChild);
+        }
+        container.scrollTop += container.scrollHeight - previousHeight;
+        state.before = data.before;
+        state.hasMore = !!data.hasMore;
+    } catch (e) {
+        console.log('Error loading older messages:', e);
+    } finally {
+        state.loading = false;
+    }
+}
+
+// Fetch what the open conversation missed while the socket was down
+async function syncOpenDM() {
+    const container = document.getElementById('friendsChatMessages');
+    const state = dmHistory;
+    if (!container || !state.peer) return;
+    try {
+        let more = true;
+        while (more && dmHistory === state) {
+            const res = await fetch(dmHistoryUrl(state.peer, `&after=${state.after || 0}`));
+            const data = await res.json();
+            if (dmHistory !== state) return;
+            const msgs = data.messages || [];
+            for (const m of msgs) {
+                if (m.id && (processedMessageIds.has(m.id) || container.querySelector(`[data-msg-id="${m.id}"]`))) continue;
+                if (m.id) processedMessageIds.add(m.id);
+                container.appendChild(await createDiscordMessage({ ...m, username: m.from }));
+            }
+            if (data.after != null) state.after = data.after;
+            more = !!data.hasMore && msgs.length > 0;
+        }
+        container.scrollTop = container.scrollHeight;
+    } finally {
+        state.syncing = false;
+    }
+}
+
 // OPEN DM
 async function openDM(peerUsername) {
     if(typeof window.activeFriendChat !== 'undefined') window.activeFriendChat = peerUsername; // Uses global if available
@@ -1163,13 +1229,20 @@ async function openDM(peerUsername) {
     if (!msgsContainer) return;
     msgsContainer.innerHTML = '<div class="text-center p-4 text-discord-gray-400">Loading history...</div>';
 
-    const me = localStorage.getItem('savedUsername') || 'User';
+    const state = dmHistory = { peer: peerUsername, before: null, after: null, hasMore: false, loading: false, syncing: false };
     try {
-        const res = await fetch(`/api/dm/history?userA=${encodeURIComponent(me)}&userB=${encodeURIComponent(peerUsername)}`);
+        const res = await fetch(dmHistoryUrl(peerUsername));
         const result = await res.json();
+        if (dmHistory !== state) return; // switched conversation meanwhile
         const msgs = result.success ? result.messages : (Array.isArray(result) ? result : []);
+        state.before = result.before;
+        state.after = result.after;
+        state.hasMore = !!result.hasMore;
 
         msgsContainer.innerHTML = '';
+        msgsContainer.onscroll = () => {
+            if (msgsContainer.scrollTop < 80) loadOlderDMs(peerUsername);
+        };
         if (msgs.length === 0) {
             msgsContainer.innerHTML = '<div class="text-center p-4 text-discord-gray-400">No messages yet. Start the conversation!</div>';
         }
@@ -1194,6 +1267,24 @@ if (typeof socket !== 'undefined') {
         setTimeout(() => { activeTypers.delete(data.username); }, 2500);
     });
 
+    socket.on("stop_typing", (data) => {
+        activeTypers.delete(data.username);
+    });
+
+    // Catch up on reconnect with cursor requests instead of reloading whole histories
+    var socketWasDisconnected = false;
+    socket.on('disconnect', () => {
+        socketWasDisconnected = true;
+        dmHistory.syncing = true;
+        communityHistory.syncing = true;
+    });
+    socket.on('connect', () => {
+        if (!socketWasDisconnected) return;
+        socketWasDisconnected = false;
+        syncOpenDM().catch(e => console.log('DM catch-up failed:', e));
+        syncCommunityMessages().catch(e => console.log('Community catch-up failed:', e));
+    });
+
     socket.on("receive_message", async (data) => {
         await appendCommunityMessage(data);
         // Play receive sound
@@ -1203,6 +1294,11 @@ if (typeof socket !== 'undefined') {
     socket.on('receive_dm', async (data) => {
         const me = localStorage.getItem('savedUsername') || '';
         const { from, to } = data || {};
+        // Advance the reconnect cursor of the open conversation, but not while a
+        // catch-up is pending: that would skip the messages missed before it
+        if (data && !dmHistory.syncing && data.seq > (dmHistory.after || 0) && (from === dmHistory.peer || to === dmHistory.peer)) {
+            dmHistory.after = data.seq;
+        }
         // activeFriendChat might be global property on window
         const currentActive = window.activeFriendChat || activeFriendChat;
 
@@ -1339,33 +1435,41 @@ function removeAttachment(index) {
 }
 window.removeAttachment = removeAttachment;
 
+// The community feed is paged: the newest page on load, older pages as the user
+// scrolls up, and since_seq=<highest seq seen> when the socket reconnects
+var COMMUNITY_PAGE_SIZE = 50;
+var communityHistory = { loaded: false, before: null, after: null, hasMore: false, loading: false, syncing: false };
+
+async function renderCommunityMessage(msg, insertBefore = null) {
+    if (msg.id && processedMessageIds.has(msg.id)) return;
+    // Ensure ID exists
+    if (!msg.id) msg.id = `msg_${msg.timestamp || Date.now()}_${Math.random()}`;
+    processedMessageIds.add(msg.id);
+
+    const el = await createDiscordMessage(msg);
+    if (el) {
+        el.setAttribute('data-msg-id', msg.id);
+        chatMessagesCommunity.insertBefore(el, insertBefore);
+    }
+}
+
 // Load Community Messages from Backend
 async function loadCommunityMessages() {
     if (!chatMessagesCommunity) return;
     try {
-        const res = await fetch('/api/messages');
+        const res = await fetch(`/api/messages?limit=${COMMUNITY_PAGE_SIZE}`);
         const data = await res.json();
-        
-        if (Array.isArray(data)) {
-            // Sort by timestamp
-            data.sort((a, b) => (a.timestamp || a.ts) - (b.timestamp || b.ts));
-            
+
+        if (data.success) {
+            communityHistory = { loaded: true, before: data.before, after: data.after, hasMore: !!data.hasMore, loading: false, syncing: false };
             chatMessagesCommunity.innerHTML = '';
             processedMessageIds.clear(); // Clear tracked IDs to allow re-render
-            
-            for (const msg of data) {
-                 if (msg.id && processedMessageIds.has(msg.id)) continue;
-                 
-                 // Ensure ID exists
-                 if (!msg.id) msg.id = `msg_${msg.timestamp || Date.now()}_${Math.random()}`;
-                 
-                 processedMessageIds.add(msg.id);
-                 
-                 const el = await createDiscordMessage(msg);
-                 if (el) {
-                    el.setAttribute('data-msg-id', msg.id);
-                    chatMessagesCommunity.appendChild(el);
-                 }
+            chatMessagesCommunity.onscroll = () => {
+                if (chatMessagesCommunity.scrollTop < 80) loadOlderCommunityMessages();
+            };
+
+            for (const msg of data.messages || []) {
+                await renderCommunityMessage(msg);
             }
             chatMessagesCommunity.scrollTop = chatMessagesCommunity.scrollHeight;
             if (window.feather) feather.replace();
@@ -1374,6 +1478,57 @@ async function loadCommunityMessages() {
         console.error("Failed to load community messages:", e);
     }
 }
+
+async function loadOlderCommunityMessages() {
+    const state = communityHistory;
+    if (!state.hasMore || state.loading || state.before == null) return;
+    state.loading = true;
+    try {
+        const res = await fetch(`/api/messages?limit=${COMMUNITY_PAGE_SIZE}&before=${state.before}`);
+        const data = await res.json();
+        if (communityHistory !== state) return; // reloaded meanwhile
+        // Prepend newest-first above the current top, keeping the view where it was
+        const previousHeight = chatMessagesCommunity.scrollHeight;
+        for (const msg of (data.messages || []).slice().reverse()) {
+            await renderCommunityMessage(msg, chatMessagesCommunity.firstChild);
+        }
+        chatMessagesCommunity.scrollTop += chatMessagesCommunity.scrollHeight - previousHeight;
+        state.before = data.before;
+        state.hasMore = !!data.hasMore;
+        if (window.feather) feather.replace();
+    } catch (e) {
+        console.error("Failed to load older community messages:", e);
+    } finally {
+        state.loading = false;
+    }
+}
+
+// Fetch what the feed missed while the socket was down
+async function syncCommunityMessages() {
+    const state = communityHistory;
+    if (!chatMessagesCommunity || !state.loaded) {
+        state.syncing = false; // never shown: the next load fetches the newest page anyway
+        return;
+    }
+    try {
+        let more = true;
+        while (more && communityHistory === state) {
+            const res = await fetch(`/api/messages?limit=${COMMUNITY_PAGE_SIZE}&since_seq=${state.after || 0}`);
+            const data = await res.json();
+            if (communityHistory !== state) return;
+            const msgs = data.messages || [];
+            for (const msg of msgs) {
+                await renderCommunityMessage(msg);
+            }
+            if (data.after != null) state.after = data.after;
+            more = !!data.hasMore && msgs.length > 0;
+        }
+        chatMessagesCommunity.scrollTop = chatMessagesCommunity.scrollHeight;
+        if (window.feather) feather.replace();
+    } finally {
+        state.syncing = false;
+    }
+}
 window.loadCommunityMessages = loadCommunityMessages;
 
 // Init Load
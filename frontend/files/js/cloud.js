@@ -152,19 +152,14 @@ async function uploadCloudFile(files) {
         }
         activeUploads.add(fileSignature);
 
-        const reader = new FileReader();
-        reader.onload = async (e) => {
+        // Send the raw file as multipart so the server can stream it to disk
+        const form = new FormData();
+        form.append('username', username);
+        form.append('fileType', file.type);
+        form.append('file', file, file.name);
+        (async () => {
             try {
-                await fetch('/api/cloud/upload', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({
-                        username,
-                        fileName: file.name,
-                        fileType: file.type,
-                        fileData: e.target.result
-                    })
-                });
+                await fetch('/api/cloud/upload', { method: 'POST', body: form });
                 loadCloudFiles(); // Refresh list
             } catch (err) {
                 console.error('Upload failed:', err);
@@ -174,8 +169,7 @@ async function uploadCloudFile(files) {
                 // We keep it for a short while to ensure the second event of a double-fire is blocked
                 setTimeout(() => activeUploads.delete(fileSignature), 2000);
             }
-        };
-        reader.readAsDataURL(file);
+        })();
     }
 
     if (progress) setTimeout(() => progress.classList.add('hidden'), 2000);
@@ -277,8 +277,18 @@ function loadGroupMembers(group) {
     if (countEl) countEl.textContent = `${members.length} members`;
 }
 
+// Channel history is paged: the newest page on open, older pages as the user scrolls up.
+// `var`, not `let`/`const`: this file is loaded twice by mainapp.html
+var GROUP_PAGE_SIZE = 50;
+var groupHistory = { before: null, hasMore: false, loading: false };
+
 async function loadGroupMessages(group, channelId) {
     activeChannelId = channelId;
+    groupHistory = { before: null, hasMore: false, loading: false };
+    // Per-channel room, so typing indicators only reach people viewing this channel
+    if (typeof socket !== 'undefined' && socket) {
+        socket.emit('join_channel', { groupId: group.id, channel: channelId, username: localStorage.getItem('username') });
+    }
     const container = document.getElementById('groupChatMessages');
     if (!container) return;
 
@@ -295,11 +305,16 @@ async function loadGroupMessages(group, channelId) {
     if (input) input.placeholder = `Message #${displayTitle}`;
 
     try {
-        const res = await fetch(`/api/groups/${group.id}/messages?channel=${channelId}`);
+        const res = await fetch(`/api/groups/${group.id}/messages?channel=${encodeURIComponent(channelId)}&limit=${GROUP_PAGE_SIZE}`);
         const data = await res.json();
+        if (activeChannelId !== channelId) return; // switched channel meanwhile
         const messages = data.messages || [];
+        groupHistory = { before: data.before, hasMore: !!data.hasMore, loading: false };
 
         container.innerHTML = '';
+        container.onscroll = () => {
+            if (container.scrollTop < 80) loadOlderGroupMessages(group, channelId);
+        };
         for (const msg of messages) {
             await appendGroupMessage(msg);
         }
@@ -320,6 +335,27 @@ async function loadGroupMessages(group, channelId) {
     }
 }
 
+async function loadOlderGroupMessages(group, channelId) {
+    const container = document.getElementById('groupChatMessages');
+    if (!container || !groupHistory.hasMore || groupHistory.loading || groupHistory.before == null) return;
+    groupHistory.loading = true;
+    try {
+        const res = await fetch(`/api/groups/${group.id}/messages?channel=${encodeURIComponent(channelId)}&limit=${GROUP_PAGE_SIZE}&before=${groupHistory.before}`);
+        const data = await res.json();
+        if (activeChannelId !== channelId) return;
+        // Prepend newest-first above the current top, keeping the view where it was
+        const previousHeight = container.scrollHeight;
+        for (const msg of (data.messages || []).slice().reverse()) {
+            await appendGroupMessage(msg, container.firstChild);
+        }
+        container.scrollTop += container.scrollHeight - previousHeight;
+        groupHistory = { before: data.before, hasMore: !!data.hasMore, loading: false };
+    } catch (error) {
+        console.log('Error loading older messages:', error);
+        groupHistory.loading = false;
+    }
+}
+
 function switchGroupChannel(group, channelId) {
     // Re-render channel list to update active states
     loadGroupChannels(group, channelId);
@@ -328,7 +364,7 @@ function switchGroupChannel(group, channelId) {
     loadGroupMessages(group, channelId);
 }
 
-async function appendGroupMessage(msg) {
+async function appendGroupMessage(msg, insertBefore = null) {
     const container = document.getElementById('groupChatMessages');
     if (!container || !window.createDiscordMessage) return;
 
@@ -366,8 +402,12 @@ async function appendGroupMessage(msg) {
         }
     });
 
-    container.appendChild(el);
-    container.scrollTop = container.scrollHeight;
+    if (insertBefore) {
+        container.insertBefore(el, insertBefore);
+    } else {
+        container.appendChild(el);
+        container.scrollTop = container.scrollHeight;
+    }
     if (window.feather) feather.replace();
 }
 window.appendGroupMessage = appendGroupMessage;
@@ -0,0 +1,99 @@
+"""Compare JSON encodings for the on-disk stores.
+
+Builds a synthetic store of 100k community-style messages (a share of them
+with inline base64 attachments, like groups.json used to carry) and times a
+full save and load with:
+
+  * stdlib json, indent=2   - how the stores were written before
+  * stdlib json, compact    - json_codec without orjson
+  * orjson, compact         - json_codec with orjson installed (skipped if missing)
+
+Usage: python scripts/bench_json_codec.py [--messages N] [--repeat R]
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+import json_codec  # noqa: E402
+
+
+def make_messages(n):
+    rnd = random.Random(42)
+    users = [f"user{i}" for i in range(200)]
+    blob = base64.b64encode(os.urandom(3 * 1024)).decode('ascii')
+    msgs = []
+    for i in range(n):
+        msg = {
+            'id': f"{i:08x}",
+            'seq': i + 1,
+            'username': rnd.choice(users),
+            'message': ' '.join(rnd.choice(('hey', 'ok', 'lol', 'see you', 'nice one', 'zylo')) for _ in range(rnd.randint(1, 12))),
+            'timestamp': 1700000000 + i,
+            'reactions': {'👍': rnd.sample(users, rnd.randint(0, 3))},
+        }
+        if i % 50 == 0:
+            msg['fileName'] = f"image{i}.png"
+            msg['fileType'] = 'image/png'
+            msg['fileData'] = 'data:image/png;base64,' + blob
+        msgs.append(msg)
+    return msgs
+
+
+def bench(label, save, load, data, repeat):
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        save_times, load_times = [], []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            save(path, data)
+            save_times.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            loaded = load(path)
+            load_times.append(time.perf_counter() - t0)
+        assert len(loaded) == len(data)
+        size = os.path.getsize(path)
+    finally:
+        os.remove(path)
+    print(f"{label:<24} save {min(save_times) * 1000:8.1f} ms   load {min(load_times) * 1000:8.1f} ms   {size / 1e6:8.2f} MB")
+
+
+def stdlib_pretty_save(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+
+
+def stdlib_load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def stdlib_compact_save(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'), ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data = make_messages(args.messages)
+    print(f"{args.messages} messages, best of {args.repeat}")
+    bench('stdlib, indent=2', stdlib_pretty_save, stdlib_load, data, args.repeat)
+    bench('stdlib, compact', stdlib_compact_save, stdlib_load, data, args.repeat)
+    if json_codec.orjson is not None:
+        bench('orjson, compact', lambda p, d: json_codec.dump_file(p, d, pretty=False), json_codec.load_file, data, args.repeat)
+    else:
+        print("orjson, compact          skipped (pip install orjson)")
+
+
+if __name__ == '__main__':
+    main()
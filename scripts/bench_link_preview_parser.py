@@ -0,0 +1,110 @@
+"""Compare the streaming link preview extractor with the previous regex one.
+
+The previous code read the first 50 KB of every page, decoded it, and ran two
+case-insensitive regexes over the whole string per OpenGraph tag. The current
+code (backend/link_preview.py) feeds 8 KB chunks to an html.parser extractor
+and stops at </head>. For a few synthetic pages plus frontend/mainapp.html
+this prints bytes read and CPU time per page, and checks that both approaches
+extract the same metadata.
+
+Usage: python scripts/bench_link_preview_parser.py
+"""
+import os
+import re
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+from link_preview import MAX_BYTES, READ_CHUNK, extract_metadata, preview_from  # noqa: E402
+
+URL = 'https://example.com/post/1'
+ROUNDS = 100
+REPEATS = 5
+
+
+def regex_preview(raw, url):
+    """The extraction link_preview used before, verbatim apart from the inputs."""
+    html = raw[:MAX_BYTES].decode('utf-8', errors='ignore')
+
+    def get_og_content(tag_name):
+        pattern = rf'<meta[^>]*property=["\']og:{tag_name}["\'][^>]*content=["\']([^"\']*)["\']'
+        match = re.search(pattern, html, re.IGNORECASE)
+        if not match:
+            pattern = rf'<meta[^>]*content=["\']([^"\']*)["\'][^>]*property=["\']og:{tag_name}["\']'
+            match = re.search(pattern, html, re.IGNORECASE)
+        return match.group(1) if match else None
+
+    title = get_og_content('title')
+    description = get_og_content('description')
+    image = get_og_content('image')
+    site_name = get_og_content('site_name')
+    if not title:
+        title_match = re.search(r'<title[^>]*>([^<]*)</title>', html, re.IGNORECASE)
+        if title_match:
+            title = title_match.group(1).strip()
+    return {"title": title, "description": description, "image": image, "site_name": site_name or 'example.com'}
+
+
+def streaming_preview(raw, url):
+    """Returns (preview, bytes read), reading the way fetch_preview does."""
+    consumed = [0]
+
+    def chunks():
+        for start in range(0, min(len(raw), MAX_BYTES), READ_CHUNK):
+            chunk = raw[start:min(start + READ_CHUNK, MAX_BYTES)]
+            consumed[0] += len(chunk)
+            yield chunk.decode('utf-8', errors='ignore')
+
+    preview = preview_from(extract_metadata(chunks()), url)
+    return preview, consumed[0]
+
+
+def article(head_scripts, body_kb, swapped=False, og=True):
+    metas = [('og:title', 'Ten things about caching'), ('og:description', 'A long read on HTTP caches'),
+             ('og:image', 'https://example.com/cover.jpg'), ('og:site_name', 'Example Blog'),
+             ('twitter:card', 'summary_large_image'), ('twitter:title', 'Ten things')] if og else []
+    tags = ''.join(
+        f'<meta content="{v}" property="{k}">' if swapped else f'<meta property="{k}" content="{v}">'
+        for k, v in metas)
+    scripts = ''.join(f'<script>window.cfg{i} = {{"k": "{"x" * 900}"}};</script>\n' for i in range(head_scripts))
+    body = '<p>' + 'Lorem ipsum dolor sit amet. ' * (body_kb * 36) + '</p>'
+    return (f'<!doctype html><html><head><meta charset="utf-8"><title>Caching | Example</title>{scripts}'
+            f'<link rel="stylesheet" href="/s.css">{tags}</head><body>{body}</body></html>').encode('utf-8')
+
+
+def timed(fn, *args):
+    """Result and best-of-REPEATS microseconds per call."""
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            result = fn(*args)
+        elapsed = (time.perf_counter() - start) / ROUNDS * 1e6
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    pages = {
+        'small head, 300 KB body': article(2, 300),
+        'metas after 20 KB of scripts': article(20, 300),
+        'content-before-property': article(2, 100, swapped=True),
+        'no OpenGraph tags': article(2, 300, og=False),
+    }
+    mainapp = os.path.join(BACKEND_DIR, '..', 'frontend', 'mainapp.html')
+    if os.path.exists(mainapp):
+        with open(mainapp, 'rb') as f:
+            pages['frontend/mainapp.html'] = f.read()
+
+    print(f"{'page':32}{'regex bytes':>13}{'regex us':>10}{'stream bytes':>14}{'stream us':>11}  same")
+    for name, raw in pages.items():
+        old, old_us = timed(regex_preview, raw, URL)
+        (new, new_bytes), new_us = timed(streaming_preview, raw, URL)
+        same = all((old[k] or None) == (new[k] or None) for k in ('title', 'description', 'image'))
+        print(f"{name:32}{min(len(raw), MAX_BYTES):>13,}{old_us:>10.0f}{new_bytes:>14,}{new_us:>11.0f}  {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Precompress and fingerprint the frontend for serving (see backend/static_assets.py).
+
+Writes backend/static_build (or $Zylo_STATIC_BUILD_DIR); a running server
+picks the new build up on its next request. Afterwards it simulates a browser
+loading a page (mainapp.html by default) and everything it references, cold
+and then again with a warm cache, and compares the bytes on the wire with
+serving the plain frontend/ directory:
+
+    python scripts/build_assets.py [--out DIR] [--page mainapp.html] [--no-report]
+"""
+import argparse
+import gzip
+import os
+import posixpath
+import re
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+from flask import Flask, send_from_directory  # noqa: E402
+import static_assets  # noqa: E402
+from static_assets import StaticAssets  # noqa: E402
+
+FRONTEND_DIR = os.path.join(BACKEND_DIR, '..', 'frontend')
+DEFAULT_BUILD_DIR = os.getenv('Zylo_STATIC_BUILD_DIR', os.path.join(BACKEND_DIR, 'static_build'))
+ACCEPT_ENCODING = 'br, gzip, deflate'
+# Same-origin references a browser fetches while loading the page
+_REFERENCE = re.compile(r'''\b(?:src|href)\s*=\s*["']([^"'#]+)["']''', re.I)
+
+
+def make_client(handler):
+    app = Flask(__name__)
+    app.add_url_rule('/<path:path>', 'frontend', handler)
+    return app.test_client()
+
+
+def wire_bytes(response):
+    """Status line + headers + body, roughly as sent over HTTP/1.1."""
+    headers = sum(len(k) + len(v) + 4 for k, v in response.headers.items())
+    return 17 + headers + 2 + len(response.get_data())
+
+
+def references(html, page):
+    base = posixpath.dirname(page)
+    seen = []
+    for ref in _REFERENCE.findall(html):
+        if re.match(r'^(?:[a-z][a-z0-9+.-]*:|//|\$\{)', ref, re.I) or not ref.strip():
+            continue
+        path = ref.split('?', 1)[0]
+        url = '/' + posixpath.normpath(path.lstrip('/') if path.startswith('/') else posixpath.join(base, path))
+        query = ref[len(path):]
+        if url + query not in seen:
+            seen.append(url + query)
+    return seen
+
+
+def decode(response):
+    body = response.get_data()
+    encoding = response.headers.get('Content-Encoding')
+    if encoding == 'gzip':
+        body = gzip.decompress(body)
+    elif encoding == 'br':
+        body = static_assets.brotli.decompress(body)
+    return body.decode('utf-8')
+
+
+def cached_without_request(response):
+    cache_control = response.headers.get('Cache-Control', '')
+    return 'immutable' in cache_control or ('max-age=' in cache_control and 'max-age=0' not in cache_control)
+
+
+def load(client, page, cache=None):
+    """Fetch page and its references. `cache` holds responses from an earlier visit."""
+    total, requests, results = 0, 0, {}
+    urls = ['/' + page]
+    i = 0
+    while i < len(urls):
+        url = urls[i]
+        i += 1
+        headers = {'Accept-Encoding': ACCEPT_ENCODING}
+        previous = cache.get(url) if cache else None
+        if previous is not None and cached_without_request(previous):
+            response = previous
+        else:
+            if previous is not None:
+                if previous.headers.get('ETag'):
+                    headers['If-None-Match'] = previous.headers['ETag']
+                if previous.headers.get('Last-Modified'):
+                    headers['If-Modified-Since'] = previous.headers['Last-Modified']
+            response = client.get(url, headers=headers)
+            requests += 1
+            total += wire_bytes(response)
+            if response.status_code == 304:
+                response = previous
+        results[url] = response
+        if url == urls[0] and response.status_code == 200:
+            urls.extend(u for u in references(decode(response), page) if u not in urls)
+    return total, requests, results
+
+
+def report(build_dir, page):
+    plain = make_client(lambda path: send_from_directory(os.path.abspath(FRONTEND_DIR), path))
+    assets = StaticAssets(FRONTEND_DIR, build_dir)
+    built = make_client(assets.send)
+
+    rows = []
+    for label, client in (('plain frontend/', plain), ('static build', built)):
+        cold, cold_requests, cache = load(client, page)
+        warm, warm_requests, _ = load(client, page, cache)
+        rows.append((label, cold, cold_requests, warm, warm_requests))
+
+    print(f"\n{page}: bytes on the wire (headers + body), Accept-Encoding: {ACCEPT_ENCODING}")
+    print(f"{'':18}{'cold':>14}{'requests':>10}{'warm':>14}{'requests':>10}")
+    for label, cold, cold_requests, warm, warm_requests in rows:
+        print(f"{label:18}{cold:>14,}{cold_requests:>10}{warm:>14,}{warm_requests:>10}")
+    (_, cold_a, _, warm_a, _), (_, cold_b, _, warm_b, _) = rows
+    print(f"saved: cold {100 * (cold_a - cold_b) / cold_a:.1f}%, warm {100 * (warm_a - warm_b) / max(warm_a, 1):.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', default=DEFAULT_BUILD_DIR, help='build directory')
+    parser.add_argument('--page', default='mainapp.html', help='page to simulate loading')
+    parser.add_argument('--no-report', action='store_true', help='skip the cold/warm load comparison')
+    args = parser.parse_args()
+
+    summary = static_assets.build(FRONTEND_DIR, args.out)
+    print(f"Built {summary['files']} files into {args.out}: {summary['fingerprinted']} fingerprinted, "
+          f"{summary['pages']} pages rewritten, {summary['compressed']} precompressed")
+    print(f"Text assets: {summary['raw_bytes']:,} bytes raw, {summary['gzip_bytes']:,} gzip, "
+          f"{summary['br_bytes']:,} best" + ('' if static_assets.brotli else ' (install brotli for .br variants)'))
+    if not args.no_report:
+        report(args.out, args.page)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Move inline base64 attachments out of stored messages into the blob store.
+
+Walks the community message log, every DM conversation and all group
+messages, writes each `fileData` data URL to backend/uploads/blobs (once per
+unique content) and replaces it with a /blobs/<sha>.<ext> reference.
+Run it with the server stopped:
+
+    python scripts/migrate_inline_blobs.py [--dry-run]
+
+--dry-run only reads the data files: it does not open the stores, so it never
+imports or renames legacy JSON files, or repairs torn records.
+"""
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+import json_codec  # noqa: E402
+from blob_store import BlobStore, parse_data_url  # noqa: E402
+from dm_store import DMStore, import_legacy as import_legacy_dms  # noqa: E402
+from message_log import MessageLog, import_legacy  # noqa: E402
+
+DATA_DIR = os.path.join(BACKEND_DIR, 'data')
+UPLOADS_DIR = os.path.join(BACKEND_DIR, 'uploads')
+
+
+def is_inline(msg):
+    try:
+        parse_data_url(msg.get('fileData'))
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def _load_json(path):
+    try:
+        return json_codec.load_file(path) or []
+    except (OSError, ValueError):
+        return []
+
+
+def _json_lines(path):
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                yield json_codec.loads(line)
+            except ValueError:
+                continue
+
+
+def read_community():
+    """Live community messages: the latest put per seq in the log, else messages.json."""
+    log_dir = os.path.join(DATA_DIR, 'messages_log')
+    manifest = _load_json(os.path.join(log_dir, 'MANIFEST.json')) or {}
+    latest = {}
+    for name in manifest.get('segments', []):
+        path = os.path.join(log_dir, name)
+        if not os.path.exists(path):
+            continue
+        for rec in _json_lines(path):
+            if rec.get('seq') not in latest or latest[rec['seq']]['lsn'] < rec.get('lsn', 0):
+                latest[rec['seq']] = rec
+    if latest:
+        return [r['msg'] for r in latest.values() if r.get('op') == 'put']
+    return _load_json(os.path.join(DATA_DIR, 'messages.json'))
+
+
+def read_dms():
+    """Every DM in the conversation shards, else dms.json."""
+    msgs = []
+    for path in glob.glob(os.path.join(DATA_DIR, 'dms', '*.jsonl')):
+        msgs.extend(m for m in _json_lines(path) if '_meta' not in m)
+    return msgs or _load_json(os.path.join(DATA_DIR, 'dms.json'))
+
+
+def read_groups():
+    """Every group message in users.db (opened read-only), else groups.json."""
+    db_path = os.path.join(DATA_DIR, 'users.db')
+    msgs = []
+    if os.path.exists(db_path):
+        # Without a WAL file nothing is pending, and immutable keeps SQLite
+        # from creating one (or a -shm) next to the database
+        flags = 'mode=ro' if os.path.exists(db_path + '-wal') else 'mode=ro&immutable=1'
+        conn = sqlite3.connect(f"file:{db_path}?{flags}", uri=True)
+        try:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'groups'").fetchone() and \
+                    conn.execute('SELECT 1 FROM groups LIMIT 1').fetchone():
+                return [json_codec.loads(r[0]) for r in conn.execute('SELECT data FROM group_messages')]
+        finally:
+            conn.close()
+    for group in _load_json(os.path.join(DATA_DIR, 'groups.json')):
+        msgs.extend(group.get('messages') or [])
+    return msgs
+
+
+def dry_run():
+    counts = {
+        'community': sum(map(is_inline, read_community())),
+        'dms': sum(map(is_inline, read_dms())),
+        'groups': sum(map(is_inline, read_groups())),
+    }
+    print(f"Found {counts['community']} community, {counts['dms']} DM and {counts['groups']} group attachments")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dry-run', action='store_true', help='only count inline attachments')
+    args = parser.parse_args()
+    if args.dry_run:
+        dry_run()
+        return
+
+    # Imported here: importing it migrates a legacy groups.json
+    import database
+
+    blobs = BlobStore(os.path.join(UPLOADS_DIR, 'blobs'))
+    counts = {'community': 0, 'dms': 0, 'groups': 0}
+
+    log = MessageLog(os.path.join(DATA_DIR, 'messages_log'))
+    import_legacy(log, os.path.join(DATA_DIR, 'messages.json'))
+    for msg in log.messages():
+        if is_inline(msg):
+            counts['community'] += 1
+            if blobs.externalize(msg):
+                log.update(msg)
+    log.close()
+
+    dms = DMStore(os.path.join(DATA_DIR, 'dms'))
+    import_legacy_dms(dms, os.path.join(DATA_DIR, 'dms.json'))
+    for key in dms.keys():
+        changed = False
+        for msg in dms.conversation(*key):
+            if is_inline(msg):
+                counts['dms'] += 1
+                changed = blobs.externalize(msg) or changed
+        if changed:
+            dms.save_conversation(*key)
+
+    for seq, msg in list(database.iter_group_messages()):
+        if is_inline(msg):
+            counts['groups'] += 1
+            if blobs.externalize(msg):
+                database.update_group_message(seq, msg)
+
+    print(f"Moved {counts['community']} community, {counts['dms']} DM and {counts['groups']} group attachments")
+
+
+if __name__ == '__main__':
+    main()
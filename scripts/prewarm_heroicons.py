@@ -0,0 +1,50 @@
+"""Fill the local Heroicons store so /api/proxy/heroicons never needs the network.
+
+Downloads the heroicons npm package once and unpacks every outline icon into
+backend/data/icons (see backend/icon_cache.py). On a machine without outbound
+access, download the tarball elsewhere and pass it with --archive:
+
+    python scripts/prewarm_heroicons.py [--archive heroicons-2.0.18.tgz]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+from icon_cache import ARCHIVE_URL, IconCache  # noqa: E402
+
+DEFAULT_CACHE_DIR = os.path.join(BACKEND_DIR, 'data', 'icons')
+
+
+def download(url, target):
+    import requests
+    with requests.get(url, stream=True, timeout=30) as resp:
+        resp.raise_for_status()
+        for chunk in resp.iter_content(64 * 1024):
+            target.write(chunk)
+    target.seek(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--archive', help=f'local copy of {ARCHIVE_URL}')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='icon store directory')
+    args = parser.parse_args()
+
+    cache = IconCache(args.cache_dir, offline=True)
+    if args.archive:
+        with open(args.archive, 'rb') as f:
+            count = cache.install_archive(f)
+    else:
+        print(f"Downloading {ARCHIVE_URL}")
+        with tempfile.TemporaryFile() as f:
+            download(ARCHIVE_URL, f)
+            count = cache.install_archive(f)
+    print(f"Stored {count} icons in {cache.dir}")
+
+
+if __name__ == '__main__':
+    main()
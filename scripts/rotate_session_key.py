@@ -0,0 +1,34 @@
+"""Rotate the signing key for signed session tokens (Zylo_SESSION_MODE=signed).
+
+Adds a new key to backend/data/session_keys.json that signs every token from
+now on. The previous key keeps verifying until tokens it signed have expired;
+keys retired longer than --ttl-hours ago are dropped. Running servers pick the
+change up within 30 seconds, no restart needed. Not used when the keys come
+from Zylo_SESSION_KEYS.
+
+    python scripts/rotate_session_key.py [--ttl-hours 24]
+"""
+import argparse
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+from session_tokens import rotate_key_file  # noqa: E402
+
+DEFAULT_KEY_FILE = os.path.join(BACKEND_DIR, 'data', 'session_keys.json')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--key-file', default=DEFAULT_KEY_FILE, help='session key file')
+    parser.add_argument('--ttl-hours', type=float, default=24, help='session lifetime (SESSION_EXPIRY_HOURS)')
+    args = parser.parse_args()
+
+    key = rotate_key_file(args.key_file, int(args.ttl_hours * 3600))
+    print(f"New signing key {key['kid']} written to {args.key_file}")
+
+
+if __name__ == '__main__':
+    main()